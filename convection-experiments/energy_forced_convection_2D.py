@@ -2,6 +2,7 @@ from matplotlib import pyplot as plt
 from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
 from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
 from moist_euler_dg.euler_2D import Euler2D
+from moist_euler_dg.forcing import EnergyForcing
 import numpy as np
 import time
 import os
@@ -90,18 +91,13 @@ def initial_condition(solver):
     return u, w, density, s, qw
 
 
-def energy_forcing(solver, state, dstatedt):
-    u, w, h, s, q, T, mu, p, ie = solver.get_vars(state)
-    dudt, dwdt, dhdt, dsdt, dqdt, *_ = solver.get_vars(dstatedt)
-
+def energy_forcing_profile(solver):
+    # heats the lower half and cools the upper half, applied as dsdt = E / dEds with dEds = h * T
     max_E_forcing = 1.0 # Watts / m^3
-    E_forcing = -max_E_forcing * 2 * ((solver.zs / solver.zs.max()) - 0.5)
+    return -max_E_forcing * 2 * ((solver.zs / solver.zs.max()) - 0.5)
 
-    dEds = h * T
-    # dEdt = dEds * dsdt =
-    s_forcing = E_forcing / dEds
 
-    dsdt += s_forcing
+energy_forcing = EnergyForcing(energy_forcing_profile)
 
 
 def energy_growth_from_forcing(solver):
@@ -110,7 +106,7 @@ def energy_growth_from_forcing(solver):
         state = solver.state
 
         dstatedt = np.zeros_like(state)
-        solver.forcing(solver, state, dstatedt)
+        solver.apply_forcing(state, dstatedt)
 
         u, w, h, s, q, T, mu, p, ie = solver.get_vars(state)
         u, w = solver.cov_to_phy(u, w)
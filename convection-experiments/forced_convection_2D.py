@@ -2,6 +2,7 @@ from matplotlib import pyplot as plt
 from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
 from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
 from moist_euler_dg.euler_2D import Euler2D
+from moist_euler_dg.forcing import TemperatureForcing, VerticalDiffusion, RayleighDamping, top_sponge
 import numpy as np
 import time
 import os
@@ -31,6 +32,11 @@ parser.add_argument('--nx', type=int, help='Number of cells in horizontal')
 parser.add_argument('--nz', type=int, help='Number of cells in vertical')
 parser.add_argument('--nproc', type=int, help='Number of procs', default=1)
 parser.add_argument('--plot', action='store_true')
+parser.add_argument('--diffusion', choices=['explicit', 'implicit'], help='Boundary layer diffusion mode', default='explicit')
+parser.add_argument('--multirate', choices=['strang', 'lie', 'hold'], help='Subcycle the dynamics within each forcing step')
+parser.add_argument('--top-bc', choices=['wall', 'outflow'], help='Top boundary condition', default='wall')
+parser.add_argument('--restart-time', type=float, help='Continue from the restart files written at this time (s)')
+parser.add_argument('--sponge-depth', type=float, help='Depth of a Rayleigh damping layer below the top (m)', default=0.0)
 args = parser.parse_args()
 
 # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
@@ -147,45 +153,26 @@ def initial_condition(solver):
     return u, w, density, s, qw
 
 
-def diffusive_forcing(solver, state, dstatedt):
-    u, w, h, s, q, T, mu, p, ie = solver.get_vars(state)
-    dudt, dwdt, dhdt, dsdt, dqdt, *_ = solver.get_vars(dstatedt)
-
-    # internal cooling
+def internal_cooling(solver):
+    # cooling rate above the boundary layer, increasing quadratically with height
     y = (solver.zs - boundary_layer_top) / (solver.zs.max() - boundary_layer_top)
-    T_forcing = -cooling_rate * y**2 * (solver.zs >= boundary_layer_top)  # constantly cool at a rate of 1K per day
-    s_forcing = T_forcing * solver.cvd / T  # convert temperature forcing to entropy forcing
-
-    # forcing in boundary layer
-    # forcing in boundary layer
-    K = Ksurf * (1.0 - (solver.zs / boundary_layer_top)) ** 2 * (solver.zs <= boundary_layer_top)
-
-    def ddz(arr):
-        out = solver.ddz(arr)
+    return -cooling_rate * y**2 * (solver.zs >= boundary_layer_top)
 
-        ip = solver.ip_vert_int
-        im = solver.im_vert_int
 
-        num_flux = 0.5 * (arr[ip] + arr[im])
-        out[ip] += (num_flux - arr[ip]) * solver.norm_grad_zeta[ip] / solver.weights_z[-1]
-        out[im] -= (num_flux - arr[im]) * solver.norm_grad_zeta[im] / solver.weights_z[-1]
+def boundary_layer_diffusivity(solver):
+    # diffusion applied within boundary layer
+    return Ksurf * (1.0 - (solver.zs / boundary_layer_top)) ** 2 * (solver.zs <= boundary_layer_top)
 
-        return out
 
-    # F = ddz(T)  # diffusive flux
-    # # bottom boundary condition
-    # ip = solver.ip_vert_ext
-    # F[ip] += (SST - T[ip]) * solver.norm_grad_zeta[ip] / solver.weights_z[-1]
-    # T_forcing = -ddz(K * F)
-    # s_forcing += T_forcing * solver.cvd / T
-
-    F = ddz(s)  # diffusive flux
-    # bottom boundary condition
-    ip = solver.ip_vert_ext
-    F[ip] += (s0 - s[ip]) * solver.norm_grad_zeta[ip] / solver.weights_z[-1]
-    s_forcing = -ddz(K * F)
-
-    dsdt += s_forcing
+# entropy diffusion towards the initial surface entropy. The old diffusive_forcing callback overwrote its
+# internal cooling tendency, add TemperatureForcing(internal_cooling) to the list to switch the cooling on
+diffusion = VerticalDiffusion(boundary_layer_diffusivity, mode=args.diffusion)
+forcing = [diffusion]
+if args.sponge_depth > 0:
+    # damp the velocities towards rest, exactly after each step so the time step is not limited
+    forcing.append(RayleighDamping(
+        top_sponge(domain_height, args.sponge_depth, 0.05), reference={'u': 0.0, 'w': 0.0}, split=True
+    ))
 
 
 
@@ -197,17 +184,20 @@ energy_list = []
 conservation_data_fp = os.path.join(data_dir, 'conservation_data.npy')
 
 if run_model:
-    solver = FortranThreePhaseEuler2D(xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=nproc, forcing=diffusive_forcing)
+    solver = FortranThreePhaseEuler2D(xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=nproc, top_bc=args.top_bc, forcing=forcing)
     u, v, density, s, qw = initial_condition(solver)
 
-    s0 = np.copy(s[solver.ip_vert_ext])
-    s1 = np.copy(s[solver.im_vert_ext])
+    diffusion.s_surface = np.copy(s[solver.ip_vert_ext])
 
     np.random.seed(42 + rank)
     noise = 2 * (np.random.random(density.shape) - 0.5)
     density += 0.01 * density * noise
     solver.set_initial_condition(u, v, density, s, qw)
 
+    if args.restart_time is not None:
+        history = solver.load_restart(solver.get_filepath(data_dir, exp_name_short, time=args.restart_time, ext='npz'))
+        time_list, energy_list = list(history['time_list']), list(history['energy_list'])
+
     # print('T range:', solver.T.min(), solver.T.max())
     # print('p range:', solver.p.min(), solver.p.max())
     # print('rho range:', solver.h.min(), solver.h.max())
@@ -218,17 +208,23 @@ if run_model:
     # plt.show()
     # exit(0)
 
-    time_list.append(solver.time)
-    energy_list.append(solver.energy())
+    if args.restart_time is None:
+        time_list.append(solver.time)
+        energy_list.append(solver.energy())
 
     for i, tend in enumerate(tends):
+        if args.restart_time is not None and tend <= args.restart_time:
+            continue
         t0 = time.time()
         while solver.time < tend:
             dt = solver.get_dt()
 
             time_list.append(solver.time)
             energy_list.append(solver.energy())
-            solver.time_step(dt=dt)
+            if args.multirate is None:
+                solver.time_step(dt=dt)
+            else:
+                solver.multirate_step(dt, splitting=args.multirate)
 
         t1 = time.time()
 
@@ -239,6 +235,9 @@ if run_model:
             print("Wall time:", time.time() - t0, '\n')
 
         solver.save(solver.get_filepath(data_dir, exp_name_short))
+        solver.save_restart(
+            solver.get_filepath(data_dir, exp_name_short, ext='npz'), time_list=time_list, energy_list=energy_list
+        )
 
     if rank == 0:
         print('Relative energy change:', (energy_list[-1] - energy_list[0]) / energy_list[0])
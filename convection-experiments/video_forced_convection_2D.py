@@ -2,6 +2,7 @@ from matplotlib import pyplot as plt
 from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
 from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
 from moist_euler_dg.euler_2D import Euler2D
+from moist_euler_dg.forcing import TemperatureForcing, VerticalDiffusion
 import numpy as np
 import time
 import os
@@ -31,6 +32,7 @@ parser.add_argument('--nx', type=int, help='Number of cells in horizontal')
 parser.add_argument('--nz', type=int, help='Number of cells in vertical')
 parser.add_argument('--nproc', type=int, help='Number of procs', default=1)
 parser.add_argument('--plot', action='store_true')
+parser.add_argument('--diffusion', choices=['explicit', 'implicit'], help='Boundary layer diffusion mode', default='explicit')
 args = parser.parse_args()
 
 # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
@@ -152,45 +154,21 @@ def initial_condition(solver):
     return u, w, density, s, qw
 
 
-def diffusive_forcing(solver, state, dstatedt):
-    u, w, h, s, q, T, mu, p, ie = solver.get_vars(state)
-    dudt, dwdt, dhdt, dsdt, dqdt, *_ = solver.get_vars(dstatedt)
-
-    # internal cooling
+def internal_cooling(solver):
+    # cooling rate above the boundary layer, increasing quadratically with height
     y = (solver.zs - boundary_layer_top) / (solver.zs.max() - boundary_layer_top)
-    T_forcing = -cooling_rate * y**2 * (solver.zs >= boundary_layer_top)  # constantly cool at a rate of 1K per day
-    s_forcing = T_forcing * solver.cvd / T  # convert temperature forcing to entropy forcing
-
-    # forcing in boundary layer
-    # forcing in boundary layer
-    K = Ksurf * (1.0 - (solver.zs / boundary_layer_top)) ** 2 * (solver.zs <= boundary_layer_top)
-
-    def ddz(arr):
-        out = solver.ddz(arr)
-
-        ip = solver.ip_vert_int
-        im = solver.im_vert_int
-
-        num_flux = 0.5 * (arr[ip] + arr[im])
-        out[ip] += (num_flux - arr[ip]) * solver.norm_grad_zeta[ip] / solver.weights_z[-1]
-        out[im] -= (num_flux - arr[im]) * solver.norm_grad_zeta[im] / solver.weights_z[-1]
+    return -cooling_rate * y**2 * (solver.zs >= boundary_layer_top)
 
-        return out
 
-    # F = ddz(T)  # diffusive flux
-    # # bottom boundary condition
-    # ip = solver.ip_vert_ext
-    # F[ip] += (SST - T[ip]) * solver.norm_grad_zeta[ip] / solver.weights_z[-1]
-    # T_forcing = -ddz(K * F)
-    # s_forcing += T_forcing * solver.cvd / T
+def boundary_layer_diffusivity(solver):
+    # diffusion applied within boundary layer
+    return Ksurf * (1.0 - (solver.zs / boundary_layer_top)) ** 2 * (solver.zs <= boundary_layer_top)
 
-    F = ddz(s)  # diffusive flux
-    # bottom boundary condition
-    ip = solver.ip_vert_ext
-    F[ip] += (s0 - s[ip]) * solver.norm_grad_zeta[ip] / solver.weights_z[-1]
-    s_forcing = -ddz(K * F)
 
-    dsdt += s_forcing
+# entropy diffusion towards the initial surface entropy. The old diffusive_forcing callback overwrote its
+# internal cooling tendency, add TemperatureForcing(internal_cooling) to the list to switch the cooling on
+diffusion = VerticalDiffusion(boundary_layer_diffusivity, mode=args.diffusion)
+forcing = [diffusion]
 
 # save data at these times
 n = int(run_time / 5)
@@ -221,11 +199,10 @@ labels = ["entropy", "density", "water", "vapour", "liquid", "ice", "u", "w", "T
 
 if run_model:
     
-    solver = FortranThreePhaseEuler2D(xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=nproc, forcing=diffusive_forcing)
+    solver = FortranThreePhaseEuler2D(xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=nproc, forcing=forcing)
     u, v, density, s, qw = initial_condition(solver)
 
-    s0 = np.copy(s[solver.ip_vert_ext])
-    s1 = np.copy(s[solver.im_vert_ext])
+    diffusion.s_surface = np.copy(s[solver.ip_vert_ext])
 
     np.random.seed(42 + rank)
     noise = 2 * (np.random.random(density.shape) - 0.5)
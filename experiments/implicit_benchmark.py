@@ -0,0 +1,112 @@
+import numpy as np
+import argparse
+import time
+import csv
+import os
+
+# Wall time and energy conservation of the Jacobian-free Newton-Krylov theta method against the SSP-RK
+# time_step over the same simulated time, e.g.
+#   python experiments/implicit_benchmark.py --nx 16 --nz 16 --order 3 --time 500 --multiples 10 50
+# Each implicit run uses a fixed step of multiple * get_dt(). The table reports the wall time, the relative
+# energy change, the Newton and GMRES iterations, and the largest difference in entropy from the SSP-RK run.
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--order', type=int, help='Polynomial order', default=3)
+parser.add_argument('--nx', type=int, help='Number of cells in horizontal', default=16)
+parser.add_argument('--nz', type=int, help='Number of cells in vertical', default=16)
+parser.add_argument('--time', type=float, help='Simulated time (s)', default=500.0)
+parser.add_argument('--multiples', type=float, nargs='+', help='Implicit steps as multiples of get_dt', default=[10, 50])
+parser.add_argument('--theta', type=float, help='0.5 trapezoidal, 1 backward Euler', default=0.5)
+parser.add_argument('--model', choices=['two-phase', 'three-phase'], default='three-phase')
+parser.add_argument('--backend', choices=['numpy', 'fortran'], default='fortran')
+parser.add_argument('--out', type=str, help='Output csv file', default=os.path.join('data', 'implicit_benchmark.csv'))
+args = parser.parse_args()
+
+
+def make_solver():
+    if args.model == 'two-phase':
+        if args.backend == 'fortran':
+            from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D as Solver
+        else:
+            from moist_euler_dg.two_phase_euler_2D import TwoPhaseEuler2D as Solver
+    else:
+        if args.backend == 'fortran':
+            from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D as Solver
+        else:
+            from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D as Solver
+
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * 10_000
+    xmap = lambda x, z: 10_000 * (x - 0.5)
+
+    solver = Solver(xmap, zmap, args.order, args.nx, g=9.81, cfl=0.5, a=0.5, nz=args.nz, upwind=True, nprocx=1, profile=True)
+
+    # hydrostatic moist atmosphere with a warm bubble
+    dry_theta = 300
+    dexdy = -solver.g / (solver.cpd * dry_theta)
+    ex = 1 + dexdy * solver.zs
+    p = 1_00_000.0 * ex ** (solver.cpd / solver.Rd)
+    density = p / (solver.Rd * ex * dry_theta)
+
+    qw = solver.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver.Rd * qd + solver.Rv * qw
+    T = p / (R * density)
+    s = qd * solver.entropy_air(T, qd, density)
+    s += qw * solver.entropy_vapour(T, qw, density)
+
+    r = np.sqrt(solver.xs ** 2 + (solver.zs - 2_000.0) ** 2)
+    s = s + 2.0 * np.exp(-(r / 1_000.0) ** 2)
+
+    u = np.zeros_like(solver.zs)
+    w = np.zeros_like(solver.zs)
+    solver.set_initial_condition(u, w, density, s, qw)
+
+    return solver
+
+
+def run(multiple=None):
+    solver = make_solver()
+    dt = solver.get_dt() if multiple is None else multiple * solver.get_dt()
+    nsteps = int(np.ceil(args.time / dt))
+    dt = args.time / nsteps
+    E0 = solver.energy()
+
+    t0 = time.perf_counter()
+    for _ in range(nsteps):
+        if multiple is None:
+            solver.time_step(dt)
+        else:
+            solver.implicit_time_step(dt, theta=args.theta)
+    wall_time = time.perf_counter() - t0
+
+    counters = solver.profiler.counters
+    row = {
+        'scheme': 'ssp-rk' if multiple is None else f'jfnk-theta-{args.theta}',
+        'multiple': 1.0 if multiple is None else multiple, 'dt': dt, 'steps': nsteps, 'wall_time': wall_time,
+        'energy_change': (solver.energy() - E0) / E0,
+        'newton_iterations': counters.get('jfnk_newton_iterations', 0),
+        'krylov_iterations': counters.get('jfnk_krylov_iterations', 0),
+        'matvecs': counters.get('matvec', 0),
+    }
+    return row, solver
+
+
+rows = []
+row, reference = run()
+row['max_entropy_difference'] = 0.0
+rows.append(row)
+for multiple in args.multiples:
+    row, solver = run(multiple)
+    row['max_entropy_difference'] = abs(solver.s - reference.s).max()
+    rows.append(row)
+
+for row in rows:
+    print(', '.join(f'{key}: {value:.4g}' if isinstance(value, float) else f'{key}: {value}' for key, value in row.items()))
+
+os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+with open(args.out, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
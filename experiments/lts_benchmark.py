@@ -0,0 +1,114 @@
+import numpy as np
+import argparse
+import time
+import csv
+import os
+
+# Wall time and mass conservation of the local time step against the SSP-RK time_step over the same simulated
+# time, on columns narrowing towards the periodic seam, e.g.
+#   python experiments/lts_benchmark.py --nx 128 --nz 32 --order 3 --time 0.05 --refine 0.98
+# refine = 0 is the uniform grid, the columns at the seam are narrower by a factor 1 - refine. The table reports
+# the wall time, the relative mass change, the cell steps of each tier and the largest difference in entropy from
+# the SSP-RK run.
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--order', type=int, help='Polynomial order', default=3)
+parser.add_argument('--nx', type=int, help='Number of cells in horizontal', default=128)
+parser.add_argument('--nz', type=int, help='Number of cells in vertical', default=32)
+parser.add_argument('--time', type=float, help='Simulated time (s)', default=0.05)
+parser.add_argument('--refine', type=float, help='Narrowing of the columns at the seam', default=0.98)
+parser.add_argument('--max-tiers', type=int, help='Largest number of tiers', default=4)
+parser.add_argument('--model', choices=['two-phase', 'three-phase'], default='three-phase')
+parser.add_argument('--backend', choices=['numpy', 'fortran'], default='fortran')
+parser.add_argument('--out', type=str, help='Output csv file', default=os.path.join('data', 'lts_benchmark.csv'))
+args = parser.parse_args()
+
+
+def make_solver():
+    if args.model == 'two-phase':
+        if args.backend == 'fortran':
+            from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D as Solver
+        else:
+            from moist_euler_dg.two_phase_euler_2D import TwoPhaseEuler2D as Solver
+    else:
+        if args.backend == 'fortran':
+            from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D as Solver
+        else:
+            from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D as Solver
+
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * 10_000
+    xmap = lambda x, z: 10_000 * (x - 0.5 - args.refine * np.sin(2 * np.pi * x) / (2 * np.pi))
+
+    solver = Solver(xmap, zmap, args.order, args.nx, g=9.81, cfl=0.5, a=0.5, nz=args.nz, upwind=True, nprocx=1, profile=True)
+
+    # hydrostatic moist atmosphere with a warm bubble
+    dry_theta = 300
+    dexdy = -solver.g / (solver.cpd * dry_theta)
+    ex = 1 + dexdy * solver.zs
+    p = 1_00_000.0 * ex ** (solver.cpd / solver.Rd)
+    density = p / (solver.Rd * ex * dry_theta)
+
+    qw = solver.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver.Rd * qd + solver.Rv * qw
+    T = p / (R * density)
+    s = qd * solver.entropy_air(T, qd, density)
+    s += qw * solver.entropy_vapour(T, qw, density)
+
+    r = np.sqrt(solver.xs ** 2 + (solver.zs - 2_000.0) ** 2)
+    s = s + 2.0 * np.exp(-(r / 1_000.0) ** 2)
+
+    u = np.zeros_like(solver.zs)
+    w = np.zeros_like(solver.zs)
+    solver.set_initial_condition(u, w, density, s, qw)
+
+    return solver
+
+
+def run(local):
+    from moist_euler_dg import local_time_stepping
+
+    solver = make_solver()
+    if local:
+        dt, tiers = local_time_stepping.cell_tiers(solver, max_tiers=args.max_tiers)
+    else:
+        dt, tiers = solver.get_dt(), np.zeros((args.nx, args.nz), dtype=int)
+    nsteps = int(np.ceil(args.time / dt))
+    dt = args.time / nsteps
+    mass0 = solver.integrate(solver.h)
+
+    t0 = time.perf_counter()
+    for _ in range(nsteps):
+        if local:
+            solver.local_time_step(dt, max_tiers=args.max_tiers)
+        else:
+            solver.time_step(dt)
+    wall_time = time.perf_counter() - t0
+
+    row = {
+        'scheme': 'local' if local else 'ssp-rk', 'dt': dt, 'steps': nsteps, 'wall_time': wall_time,
+        'mass_change': (solver.integrate(solver.h) - mass0) / mass0,
+        'cell_steps': solver.profiler.counters.get('lts_cell_steps', nsteps * args.nx * args.nz),
+        'tier_cells': ' '.join(str(count) for count in np.bincount(tiers.ravel())),
+    }
+    return row, solver
+
+
+rows = []
+row, reference = run(False)
+row['max_entropy_difference'] = 0.0
+rows.append(row)
+row, solver = run(True)
+row['max_entropy_difference'] = abs(solver.s - reference.s).max()
+rows.append(row)
+
+for row in rows:
+    print(', '.join(f'{key}: {value:.4g}' if isinstance(value, float) else f'{key}: {value}' for key, value in row.items()))
+
+os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+with open(args.out, 'w', newline='') as f:
+    writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
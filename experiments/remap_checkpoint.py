@@ -0,0 +1,44 @@
+# remap a checkpoint to a new resolution or polynomial order, e.g. to continue a coarse spin up at full resolution
+#   mpirun -n 4 python remap_checkpoint.py --files data/run/*time_2H0m0s.npy --nx 64 --nz 32 --order 2 \
+#       --target-nx 256 --target-nz 128 --target-order 3 --nproc 4 --time 7200
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.remap import load_remapped
+import os
+import argparse
+from mpi4py import MPI
+
+
+comm = MPI.COMM_WORLD
+rank = comm.Get_rank()
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--files', nargs='+', help='Checkpoint files, all parts of a decomposed run in order')
+parser.add_argument('--nx', type=int, help='Number of cells in horizontal of the checkpoint')
+parser.add_argument('--nz', type=int, help='Number of cells in vertical of the checkpoint')
+parser.add_argument('--order', type=int, help='Polynomial order of the checkpoint')
+parser.add_argument('--target-nx', type=int, help='Number of cells in horizontal')
+parser.add_argument('--target-nz', type=int, help='Number of cells in vertical')
+parser.add_argument('--target-order', type=int, help='Polynomial order')
+parser.add_argument('--nproc', type=int, help='Number of procs of the remapped run', default=1)
+parser.add_argument('--width', type=float, help='Domain width (m)', default=20_000.0)
+parser.add_argument('--height', type=float, help='Domain height (m)', default=10_000.0)
+parser.add_argument('--time', type=float, help='Time of the checkpoint (s), used in the output file names', default=0.0)
+parser.add_argument('--out-dir', help='Output directory', default=os.path.join('data', 'remapped'))
+parser.add_argument('--name', help='Experiment name of the output files', default='remapped')
+args = parser.parse_args()
+
+zmap = lambda x, z: z * args.height
+xmap = lambda x, z: args.width * (x - 0.5)
+
+g = 9.81
+
+solver = FortranThreePhaseEuler2D(
+    xmap, zmap, args.target_order, args.target_nx, g=g, nz=args.target_nz, nprocx=args.nproc
+)
+load_remapped(solver, args.files, args.nx, args.nz, args.order, xmap, zmap)
+solver.time = args.time
+
+fp = solver.get_filepath(args.out_dir, args.name)
+solver.save(fp)
+if rank == 0:
+    print(f"Remapped ({args.nx}, {args.nz}, p{args.order}) to ({args.target_nx}, {args.target_nz}, p{args.target_order}): {fp}")
@@ -0,0 +1,184 @@
+import numpy as np
+import subprocess
+import argparse
+import time
+import json
+import csv
+import sys
+import os
+
+# MPI strong/weak scaling of the nprocx slab decomposition.
+#
+# The sweep launches this script under mpiexec for each rank count and problem size, e.g.
+#   python experiments/scaling_benchmark.py --nprocs 1 2 4 8 --nx 64 --nz 32 --order 3 --steps 20
+# Strong scaling keeps the global grid (nx, nz) fixed. Weak scaling keeps nx / nproc fixed at --nx-per-rank.
+# Each run writes the per-rank timers to a json file and the sweep writes strong_scaling.csv and
+# weak_scaling.csv with the speedup and parallel efficiency relative to the smallest rank count.
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--order', type=int, help='Polynomial order', default=3)
+parser.add_argument('--nx', type=int, nargs='+', help='Global number of cells in horizontal (strong scaling)', default=[64])
+parser.add_argument('--nx-per-rank', type=int, nargs='+', help='Number of cells in horizontal per rank (weak scaling)', default=[8])
+parser.add_argument('--nz', type=int, help='Number of cells in vertical', default=32)
+parser.add_argument('--nprocs', type=int, nargs='+', help='Rank counts to sweep', default=[1, 2, 4])
+parser.add_argument('--steps', type=int, help='Number of timed time steps', default=10)
+parser.add_argument('--model', choices=['two-phase', 'three-phase'], default='three-phase')
+parser.add_argument('--backend', choices=['numpy', 'fortran'], default='fortran')
+parser.add_argument('--mpiexec', type=str, help='MPI launcher command', default='mpiexec')
+parser.add_argument('--out', type=str, help='Output directory', default=os.path.join('data', 'scaling'))
+parser.add_argument('--worker', action='store_true', help='Run a single case (used internally by the sweep)')
+parser.add_argument('--fp', type=str, help='Output file of a single case')
+args = parser.parse_args()
+
+timers = ['time_step', 'time_step/solve', 'time_step/solve/volume', 'time_step/solve/mpi_send',
+          'time_step/solve/mpi_recv', 'time_step/solve/boundaries', 'time_step/positivity', 'time_step/thermodynamics']
+
+
+def make_solver(nx, nz, nproc):
+    if args.model == 'two-phase':
+        if args.backend == 'fortran':
+            from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D as Solver
+        else:
+            from moist_euler_dg.two_phase_euler_2D import TwoPhaseEuler2D as Solver
+    else:
+        if args.backend == 'fortran':
+            from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D as Solver
+        else:
+            from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D as Solver
+
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    domain_height = 10_000
+    domain_width = domain_height * nx / nz
+    zmap = lambda x, z: z * domain_height
+    xmap = lambda x, z: domain_width * (x - 0.5)
+
+    solver = Solver(xmap, zmap, args.order, nx, g=9.81, cfl=0.5, a=0.5, nz=nz, upwind=True, nprocx=nproc, profile=True)
+
+    # hydrostatic moist atmosphere with a warm bubble so the thermodynamics and limiter do real work
+    dry_theta = 300
+    dexdy = -solver.g / (solver.cpd * dry_theta)
+    ex = 1 + dexdy * solver.zs
+    p = 1_00_000.0 * ex ** (solver.cpd / solver.Rd)
+    density = p / (solver.Rd * ex * dry_theta)
+
+    r = np.sqrt(solver.xs ** 2 + (solver.zs - 2_000.0) ** 2)
+    rh = 0.95 + 0.1 * np.exp(-(r / 1_000.0) ** 2)
+    qw = solver.rh_to_qw(rh, p, density)
+    qd = 1 - qw
+
+    R = solver.Rd * qd + solver.Rv * qw
+    T = p / (R * density)
+    s = qd * solver.entropy_air(T, qd, density)
+    s += qw * solver.entropy_vapour(T, qw, density)
+
+    u = np.zeros_like(solver.zs)
+    w = np.zeros_like(solver.zs)
+    solver.set_initial_condition(u, w, density, s, qw)
+
+    return solver
+
+
+def run_worker():
+    from mpi4py import MPI
+    comm = MPI.COMM_WORLD
+    nproc = comm.Get_size()
+    nx = args.nx[0]
+
+    solver = make_solver(nx, args.nz, nproc)
+    dt = solver.get_dt()
+
+    # warm up caches and the MPI transport before timing
+    solver.time_step(dt)
+    solver.profiler.reset()
+
+    comm.Barrier()
+    t0 = time.perf_counter()
+    for _ in range(args.steps):
+        solver.time_step(dt)
+    comm.Barrier()
+    wall_time = time.perf_counter() - t0
+
+    rows = solver.profiler.summary()
+    if comm.Get_rank() == 0:
+        out = {
+            'nproc': nproc, 'nx': nx, 'nz': args.nz, 'order': args.order, 'steps': args.steps,
+            'model': args.model, 'backend': args.backend, 'wall_time': wall_time,
+            'dofs': (args.order + 1) ** 2 * nx * args.nz,
+            'timers': {row['name']: row for row in rows},
+        }
+        with open(args.fp, 'w') as f:
+            json.dump(out, f, indent=2)
+
+
+def launch(nproc, nx):
+    fp = os.path.join(args.out, f'{args.model}-{args.backend}-p{args.order}-nx-{nx}-nz-{args.nz}-np-{nproc}.json')
+    cmd = args.mpiexec.split() + ['-n', str(nproc), sys.executable, os.path.abspath(__file__), '--worker',
+                                  '--order', str(args.order), '--nx', str(nx), '--nz', str(args.nz),
+                                  '--steps', str(args.steps), '--model', args.model, '--backend', args.backend, '--fp', fp]
+    print(' '.join(cmd))
+    subprocess.run(cmd, check=True)
+    with open(fp) as f:
+        return json.load(f)
+
+
+def table_row(result):
+    row = {key: result[key] for key in ['nproc', 'nx', 'nz', 'order', 'dofs', 'steps']}
+    row['time_per_step'] = result['wall_time'] / result['steps']
+    for name in timers:
+        # mean and max over ranks, max - mean shows load imbalance and time waiting on neighbours
+        timer = result['timers'].get(name, {'mean': 0.0, 'max': 0.0})
+        row[f'{name}:mean'] = timer['mean'] / result['steps']
+        row[f'{name}:max'] = timer['max'] / result['steps']
+
+    return row
+
+
+def write_table(fp, rows):
+    with open(fp, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    for row in rows:
+        print(f"nproc={row['nproc']:>4} nx={row['nx']:>5} nz={row['nz']:>4} time/step={row['time_per_step']:.4e}s "
+              f"speedup={row['speedup']:.2f} efficiency={row['efficiency']:.2f}")
+
+
+def run_sweep():
+    if not os.path.exists(args.out): os.makedirs(args.out)
+    nprocs = sorted(args.nprocs)
+
+    # strong scaling - fixed global problem
+    rows = []
+    for nx in args.nx:
+        results = [launch(nproc, nx) for nproc in nprocs if nx % nproc == 0]
+        base = results[0]
+        t_base = base['wall_time'] * base['nproc']
+        for result in results:
+            row = table_row(result)
+            row['speedup'] = base['wall_time'] / result['wall_time']
+            row['efficiency'] = t_base / (result['wall_time'] * result['nproc'])
+            rows.append(row)
+
+    print('---------- strong scaling')
+    write_table(os.path.join(args.out, 'strong_scaling.csv'), rows)
+
+    # weak scaling - fixed work per rank
+    rows = []
+    for nx_per_rank in args.nx_per_rank:
+        results = [launch(nproc, nx_per_rank * nproc) for nproc in nprocs]
+        base = results[0]
+        for result in results:
+            row = table_row(result)
+            row['speedup'] = (base['wall_time'] / base['nproc']) / (result['wall_time'] / result['nproc'])
+            row['efficiency'] = base['wall_time'] / result['wall_time']
+            rows.append(row)
+
+    print('---------- weak scaling')
+    write_table(os.path.join(args.out, 'weak_scaling.csv'), rows)
+
+
+if args.worker:
+    run_worker()
+else:
+    run_sweep()
@@ -1,15 +1,56 @@
 import numpy as np
-from moist_euler_dg import utils
-from mpi4py import MPI
+from moist_euler_dg import utils, stability
+from moist_euler_dg.profiling import Profiler
+from moist_euler_dg.forcing import as_forcing
+from moist_euler_dg.parallel import get_mpi
 import time
+import json
 import os
 
 
+class MetricCache():
+    # keeps the metric terms rebuilt in compact mode for the duration of a solve, so each is built once rather
+    # than on every access. Nested solves share the outermost cache
+
+    def __init__(self, solver):
+        self.solver = solver
+
+    def __enter__(self):
+        self.owner = 'metric_cache' not in self.solver.__dict__
+        if self.owner:
+            self.solver.metric_cache = {}
+        return self
+
+    def __exit__(self, *args):
+        if self.owner:
+            del self.solver.metric_cache
+        return False
+
+
 class Euler2D():
 
     nvars = 4
+    # u, w, h, s are evolved, the remaining variables are diagnosed from them
+    nprognostic = 4
+
+    # 'double' stores everything in float64. 'mixed' stores the state, working arrays and the metric terms
+    # in float32 and evaluates the right hand side in float32, the thermodynamic solves and the conservation
+    # diagnostics are promoted to float64
+    precisions = {'double': np.float64, 'mixed': np.float32}
+    supported_precisions = ('double', 'mixed')
+
+    # 'variable' stores the state variable-major, nvars arrays of shape (nx, nz, n, n) back to back.
+    # 'blocked' stores it element-major with shape (nx, nz, nvars, n, n) so all the variables of an element
+    # are contiguous. get_vars returns views in either layout and files are always written variable-major
+    layouts = ('variable', 'blocked')
+
+    # 'wall' is a rigid lid. 'outflow' is a characteristic boundary against the initial state at the top,
+    # outgoing acoustic waves leave the domain and the incoming characteristic is held at the initial state
+    top_bcs = ('wall', 'outflow')
+    # the outflow ghost state needs the sound speed of the moist thermodynamics
+    supported_top_bcs = ('wall',)
 
-    def __init__(self, xmap, zmap, order, nx, g, cfl=0.5, a=0, nz=None, upwind=True, nprocx=1, top_bc='wall', forcing=None):
+    def __init__(self, xmap, zmap, order, nx, g, cfl=0.5, a=0, nz=None, upwind=True, nprocx=1, top_bc='wall', forcing=None, compact_geometry=False, z_edges=None, profile=False, precision='double', layout='variable'):
 
         self.order = order
         self.g = g
@@ -20,9 +61,28 @@ class Euler2D():
         self.upwind = upwind
         self.nprocx = nprocx
         self.buoyancy_relax = 1.0
-        self.comm = MPI.COMM_WORLD
+        # a single process solver (nprocx=1) uses a serial communicator and never initialises MPI
+        self.mpi = get_mpi(serial=nprocx == 1)
+        self.comm = self.mpi.COMM_WORLD
         self.rank = self.comm.Get_rank()
-        self.forcing = forcing
+        self.forcing = as_forcing(forcing)
+        self.profiler = Profiler(enabled=profile, comm=self.comm)
+
+        if precision not in Euler2D.precisions:
+            raise ValueError(f"Unknown precision {precision}, expected one of {tuple(Euler2D.precisions)}")
+        if precision not in self.supported_precisions:
+            raise NotImplementedError(f"{type(self).__name__} does not support {precision} precision")
+        self.precision = precision
+        self.dtype = np.dtype(Euler2D.precisions[precision])
+
+        if layout not in Euler2D.layouts:
+            raise ValueError(f"Unknown layout {layout}, expected one of {Euler2D.layouts}")
+        self.layout = layout
+
+        if top_bc not in Euler2D.top_bcs:
+            raise ValueError(f"Unknown top boundary condition {top_bc}, expected one of {Euler2D.top_bcs}")
+        if top_bc not in self.supported_top_bcs:
+            raise NotImplementedError(f"{type(self).__name__} does not support the {top_bc} top boundary condition")
 
         self.cp = 1_005.0
         self.cv = 718.0
@@ -31,6 +91,8 @@ class Euler2D():
         self.gamma = self.cp / self.cv
         self.is_x_periodic = True
         self.top_bc = top_bc
+        self.compact_geometry = compact_geometry
+        self.metric_per_cell = False
 
         # interface boundary indices
         self.ip_horz_int = (slice(1, None), slice(None), 0, slice(None))
@@ -44,7 +106,22 @@ class Euler2D():
         self.im_vert_ext = (slice(None), -1, slice(None), -1)
 
         if nz is None:
-            nz = nx
+            nz = nx if z_edges is None else len(z_edges) - 1
+
+        # the map of the vertical reference coordinate onto the rescaled level edges, None for uniform levels
+        self.z_stretch = None
+        if z_edges is not None:
+            # user supplied level edges, rescaled to [0, 1] before zmap is applied. The edges are placed
+            # with a C1 interpolant of a uniform grid so the metric terms stay continuous across cells
+            z_edges = np.asarray(z_edges, dtype=float)
+            assert z_edges.size == nz + 1
+            assert (np.diff(z_edges) > 0).all()
+            z_edges = (z_edges - z_edges[0]) / (z_edges[-1] - z_edges[0])
+            stretch = utils.monotone_cubic(np.linspace(0, 1, nz + 1), z_edges)
+            self.z_stretch = stretch
+            xmap_, zmap_ = xmap, zmap
+            xmap = lambda x, z: xmap_(x, stretch(z))
+            zmap = lambda x, z: zmap_(x, stretch(z))
 
         self.nx = nx
         self.nz = nz
@@ -58,7 +135,7 @@ class Euler2D():
         self.D = utils.lagrange1st(order, xis_).transpose()
         self.weights2D = self.weights_z[None, :] * self.weights_x[:, None]
 
-        comm = MPI.COMM_WORLD
+        comm = self.comm
 
         if nprocx > 1:
             self.is_x_periodic = False
@@ -97,21 +174,26 @@ class Euler2D():
         self.dz = (abs(self.zs[:, :, :, 1:] - self.zs[:, :, :, :-1]).min())
 
         self.cdt = self.cfl * min(self.dx, self.dz)
+
+        # smallest node spacing in each cell - used for per-cell CFL accounting
+        self.cell_dx = abs(self.xs[:, :, 1:] - self.xs[:, :, :-1]).min(axis=(2, 3))
+        self.cell_dz = abs(self.zs[:, :, :, 1:] - self.zs[:, :, :, :-1]).min(axis=(2, 3))
+        self.cell_cdt = self.cfl * np.minimum(self.cell_dx, self.cell_dz)
         self.time = 0
 
-        self.state = np.zeros(self.nvars * self.xs.size)
-        self.state_unflat = self.state.reshape((self.nvars,) + self.xs.shape)
+        self.state = np.zeros(self.nvars * self.xs.size, dtype=self.dtype)
+        self.state_unflat = self.unflatten(self.state)
         self.private_working_arrays = [np.zeros_like(self.state) for _ in range(3)]
 
         self.cell_horz_stride = self.nx
         self.horz_stride = self.order + 1
 
-        self.right_boundary = np.zeros((self.nvars, self.nz, self.order + 1))
+        self.right_boundary = np.zeros((self.nvars, self.nz, self.order + 1), dtype=self.dtype)
         self.left_boundary = np.zeros_like(self.right_boundary)
         self.right_boundary_send = np.zeros_like(self.right_boundary)
         self.left_boundary_send = np.zeros_like(self.right_boundary)
 
-        self.top_boundary = np.zeros((self.nvars, self.nx, self.order + 1))
+        self.top_boundary = np.zeros((self.nvars, self.nx, self.order + 1), dtype=self.dtype)
 
         self.dxdxi = self.project_H1(self.ddxi(self.xs))
         self.dxdzeta = self.project_H1(self.ddzeta(self.xs))
@@ -140,11 +222,16 @@ class Euler2D():
             self.dzdzeta[self.im_horz_ext] = 0.5 * (self.dzdzeta[self.im_horz_ext] + self.right_boundary[3])
 
             self.state[:] = 0
-            MPI.COMM_WORLD.Barrier()
+            self.comm.Barrier()
+
+        if self.compact_geometry:
+            self.compress_metric_terms()
 
         self.compute_metric_terms()
 
-        self.dtype = self.state.dtype
+        if self.dtype != np.float64:
+            self.cast_operators()
+
         self.shape = (self.state.size, self.state.size)
         self.scale = 0.0
 
@@ -158,7 +245,86 @@ class Euler2D():
         self.u_grav = self.dzdxi
         self.w_grav = self.dzdzeta
 
+    # metric terms derived from the covariant basis dxdxi, dxdzeta, dzdxi, dzdzeta
+    derived_metric_terms = (
+        'J', 'dxidx', 'dxidz', 'dzetadx', 'dzetadz',
+        'grad_xi_2', 'grad_zeta_2', 'grad_xi_dot_zeta', 'norm_grad_xi', 'norm_grad_zeta',
+        'drdxi_2', 'drdzeta_2', 'dr_xi_dot_zeta', 'norm_drdxi', 'norm_drdzeta',
+    )
+
+    def compress_metric_terms(self, rtol=1e-12):
+        # affine maps (e.g. zmap = lambda x, z: z * zlim) have constant metric terms in each cell
+        # so only one value per cell is kept - these broadcast against nodal arrays
+        basis = (self.dxdxi, self.dxdzeta, self.dzdxi, self.dzdzeta)
+        scale = max(abs(arr).max() for arr in basis)
+        is_affine = all((arr.max(axis=(2, 3)) - arr.min(axis=(2, 3))).max() <= rtol * scale for arr in basis)
+        if self.nprocx > 1:
+            is_affine = self.comm.allreduce(is_affine, op=self.mpi.LAND)
+
+        if is_affine:
+            self.dxdxi, self.dxdzeta, self.dzdxi, self.dzdzeta = (np.ascontiguousarray(arr[:, :, :1, :1]) for arr in basis)
+            self.metric_per_cell = True
+
+        return is_affine
+
+    def __getattr__(self, name):
+        # in compact mode with a non-affine map only the covariant basis is stored,
+        # the remaining metric terms are rebuilt when they are needed, once per solve inside a MetricCache
+        if name in Euler2D.derived_metric_terms and self.__dict__.get('compact_geometry', False):
+            cache = self.__dict__.get('metric_cache')
+            if cache is None:
+                return self.get_metric_term(name)
+            if name not in cache:
+                cache[name] = self.get_metric_term(name)
+            return cache[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def get_metric_term(self, name):
+        if name == 'J':
+            return self.dxdxi * self.dzdzeta - self.dxdzeta * self.dzdxi
+        elif name == 'dxidx':
+            return self.dzdzeta / self.J
+        elif name == 'dxidz':
+            return -self.dxdzeta / self.J
+        elif name == 'dzetadx':
+            return -self.dzdxi / self.J
+        elif name == 'dzetadz':
+            return self.dxdxi / self.J
+        elif name == 'grad_xi_2':
+            J = self.J
+            return (self.dzdzeta * self.dzdzeta + self.dxdzeta * self.dxdzeta) / (J * J)
+        elif name == 'grad_zeta_2':
+            J = self.J
+            return (self.dzdxi * self.dzdxi + self.dxdxi * self.dxdxi) / (J * J)
+        elif name == 'grad_xi_dot_zeta':
+            J = self.J
+            return -(self.dzdzeta * self.dzdxi + self.dxdzeta * self.dxdxi) / (J * J)
+        elif name == 'norm_grad_xi':
+            return np.sqrt(self.grad_xi_2)
+        elif name == 'norm_grad_zeta':
+            return np.sqrt(self.grad_zeta_2)
+        elif name == 'drdxi_2':
+            return self.dxdxi * self.dxdxi + self.dzdxi * self.dzdxi
+        elif name == 'drdzeta_2':
+            return self.dxdzeta * self.dxdzeta + self.dzdzeta * self.dzdzeta
+        elif name == 'dr_xi_dot_zeta':
+            return self.dxdxi * self.dxdzeta + self.dzdxi * self.dzdzeta
+        elif name == 'norm_drdxi':
+            return np.sqrt(self.drdxi_2)
+        elif name == 'norm_drdzeta':
+            return np.sqrt(self.drdzeta_2)
+        else:
+            raise ValueError(f"Unknown metric term {name}")
+
+    @property
+    def metric_nbytes(self):
+        names = ('dxdxi', 'dxdzeta', 'dzdxi', 'dzdzeta') + Euler2D.derived_metric_terms
+        return sum(self.__dict__[name].nbytes for name in names if name in self.__dict__)
+
     def compute_metric_terms(self):
+        if self.compact_geometry and not self.metric_per_cell:
+            return
+
         self.J = self.dxdxi * self.dzdzeta - self.dxdzeta * self.dzdxi
 
         self.dxidx = self.dzdzeta / self.J
@@ -180,6 +346,18 @@ class Euler2D():
         self.norm_drdxi = np.sqrt(self.drdxi_2)
         self.norm_drdzeta = np.sqrt(self.drdzeta_2)
 
+    def cast_operators(self):
+        # metric terms and quadrature/derivative operators in the working precision,
+        # the node coordinates stay in float64 for the initial conditions and diagnostics
+        names = ('D', 'weights_x', 'weights_z', 'weights2D', 'dxdxi', 'dxdzeta', 'dzdxi', 'dzdzeta') + Euler2D.derived_metric_terms
+        for name in names:
+            if name in self.__dict__:
+                self.__dict__[name] = self.__dict__[name].astype(self.dtype)
+
+    def promote(self, arr):
+        # float64 view or copy of arr for the thermodynamic solves and the conservation diagnostics
+        return np.asarray(arr, dtype=np.float64)
+
     def phys_to_contra(self, u_in, w_in, idx=slice(None)):
         u_out = u_in * self.dxidx[idx] + w_in * self.dxidz[idx]
         w_out = u_in * self.dzetadx[idx] + w_in * self.dzetadz[idx]
@@ -206,10 +384,25 @@ class Euler2D():
 
     def get_boundary_data(self, state, idx):
         # extract boundary data
-        shape = (-1,) + self.xs.shape
-        state_bdry = state.reshape(shape)[(slice(None),) + idx]
+        state_bdry = self.unflatten(state)[(slice(None),) + idx]
         return state_bdry
 
+    def unflatten(self, state):
+        # (nvars, nx, nz, n, n) view of a flat state in either layout
+        if self.layout == 'blocked':
+            return state.reshape(self.xs.shape[:2] + (-1,) + self.xs.shape[2:]).transpose(2, 0, 1, 3, 4)
+        return state.reshape((-1,) + self.xs.shape)
+
+    def blocked_view(self, state):
+        # (n * n, nvars, nx * nz) Fortran-ordered view of a blocked state for the compiled kernels
+        return state.reshape(self.nx * self.nz, -1, self.xs.shape[2] * self.xs.shape[3]).T
+
+    def variable_major(self, state):
+        # flat variable-major copy of state, or state itself in the variable layout
+        if self.layout == 'blocked':
+            return np.ascontiguousarray(self.unflatten(state)).ravel()
+        return state
+
     def fill_right_boundary(self, state):
         state_m = self.get_boundary_data(state, self.im_horz_ext)
         if self.nprocx == 1:
@@ -217,7 +410,7 @@ class Euler2D():
             return None
         else:
             self.right_boundary_send[:] = state_m
-            comm = MPI.COMM_WORLD
+            comm = self.comm
             rank = comm.Get_rank()
             comm.Isend(self.right_boundary_send, dest=(rank + 1) % self.nprocx, tag=2)
             req = comm.Irecv(self.right_boundary, source=(rank + 1) % self.nprocx, tag=1)
@@ -230,7 +423,7 @@ class Euler2D():
             return None
         else:
             self.left_boundary_send[:] = state_p
-            comm = MPI.COMM_WORLD
+            comm = self.comm
             rank = comm.Get_rank()
             comm.Isend(self.left_boundary_send, dest=(rank - 1) % self.nprocx, tag=1)
             req = comm.Irecv(self.left_boundary, source=(rank - 1) % self.nprocx, tag=2)
@@ -250,31 +443,36 @@ class Euler2D():
         return G, c_sound, T, Fx, Fz
 
     def solve(self, state, dstatedt=None, verbose=False):
-        MPI.COMM_WORLD.Barrier()
-
-        t0 = time.time()
-        req1, req2 = self.fill_boundaries(state)
-        self.mpi_send_time += time.time() - t0
-
-        if dstatedt is None:
-            dstatedt = np.empty_like(state)
-        dstatedt[:] = 0.0
-
-        t0 = time.time()
-        self._solve(state, dstatedt)
-        self.solve_time += time.time() - t0
-
-        # horizontal edge boundaries MPI here!
-        t0 = time.time()
-        if req1 is not None:
-            req1.wait()
-        if req2 is not None:
-            req2.wait()
-        self.mpi_recv_time += time.time() - t0
-
-        t0 = time.time()
-        self._solve_horz_boundaries(state, dstatedt)
-        self.bdry_time += time.time() - t0
+        self.comm.Barrier()
+
+        with self.profiler.region('solve'), MetricCache(self):
+            t0 = time.time()
+            with self.profiler.region('mpi_send'):
+                req1, req2 = self.fill_boundaries(state)
+            self.mpi_send_time += time.time() - t0
+
+            if dstatedt is None:
+                dstatedt = np.empty_like(state)
+            dstatedt[:] = 0.0
+
+            t0 = time.time()
+            with self.profiler.region('volume'):
+                self._solve(state, dstatedt)
+            self.solve_time += time.time() - t0
+
+            # horizontal edge boundaries MPI here!
+            t0 = time.time()
+            with self.profiler.region('mpi_recv'):
+                if req1 is not None:
+                    req1.wait()
+                if req2 is not None:
+                    req2.wait()
+            self.mpi_recv_time += time.time() - t0
+
+            t0 = time.time()
+            with self.profiler.region('boundaries'):
+                self._solve_horz_boundaries(state, dstatedt)
+            self.bdry_time += time.time() - t0
 
         return dstatedt
 
@@ -484,11 +682,13 @@ class Euler2D():
         return 0.0
 
     def energy(self):
-        pe = self.h * self.g * self.zs
-        ke = 0.5 * self.h * (self.u ** 2 + self.w ** 2)
-        ie = self.h * self.get_thermodynamic_quantities(self.h, self.hs)[3]
-        energy = pe + ke + ie
-        return self.integrate(energy)
+        with self.profiler.region('diagnostics'):
+            h, u, w = self.promote(self.h), self.promote(self.u), self.promote(self.w)
+            pe = h * self.g * self.zs
+            ke = 0.5 * h * (u ** 2 + w ** 2)
+            ie = h * self.get_thermodynamic_quantities(h, h * self.promote(self.s))[3]
+            energy = pe + ke + ie
+            return self.integrate(energy)
 
     def get_thermodynamic_quantities(self, h, hs):
         s = hs / h
@@ -513,6 +713,10 @@ class Euler2D():
 
     def get_vars(self, state, reshape=True):
         assert state.size % self.nvars == 0
+        if self.layout == 'blocked':
+            # strided views, the variables of one element are contiguous
+            return tuple(self.unflatten(state))
+
         sz = state.size // self.nvars
 
         out = tuple(state[i * sz:(i + 1) * sz] for i in range(self.nvars))
@@ -577,33 +781,135 @@ class Euler2D():
         for i in range(2, len(vars_in)):
             vars[i][:] = vars_in[i]
 
-    def get_dt(self):
+    def get_cell_dt(self):
+        # stable time step of each cell
         c = 340.0 * np.ones_like(self.h)
-        return self.cdt / c.max()
+        return self.cell_cdt / c.max(axis=(2, 3))
+
+    def get_level_dt(self):
+        # stable time step of each vertical level
+        dt = self.get_cell_dt().min(axis=0)
+        if self.nprocx > 1:
+            dt = self.comm.allreduce(dt, op=self.mpi.MIN)
+        return dt
+
+    def get_column_dt(self):
+        # stable time step of each (local) column
+        return self.get_cell_dt().min(axis=1)
+
+    def get_dt(self):
+        dt = self.get_cell_dt().min()
+        if self.nprocx > 1:
+            dt = self.comm.allreduce(dt, op=self.mpi.MIN)
+        return dt
+
+    def estimate_dt(self, state=None, krylov_dim=30, safety=0.9):
+        # largest linearly stable step of time_step about state from the spectrum of the jacobian of rhs, see
+        # stability.max_stable_dt. Unlike get_dt it accounts for the order, the dissipation a and the flow
+        return stability.max_stable_dt(self, state, krylov_dim=krylov_dim, safety=safety)
+
+    def calibrate_cfl(self, state=None, krylov_dim=30, safety=0.9):
+        # rescales cfl so get_dt returns estimate_dt, the cell, level and column steps keep their ratios.
+        # Returns the new cfl
+        factor = self.estimate_dt(state, krylov_dim=krylov_dim, safety=safety) / self.get_dt()
+        self.cfl *= factor
+        self.cdt *= factor
+        self.cell_cdt = factor * self.cell_cdt
+        return self.cfl
 
     def time_step(self, dt=None):
 
         if dt is None:
             dt = self.get_dt()
+        # a python float keeps the stage updates in the working precision
+        dt = float(dt)
 
         k = self.private_working_arrays[1]
         u_tmp = self.private_working_arrays[2]
 
-        self.solve(self.state, dstatedt=k)
+        with self.profiler.region('time_step'):
+            self.solve(self.state, dstatedt=k)
 
-        u_tmp[:] = self.state + 0.5 * dt * k
-        self.solve(u_tmp, dstatedt=k)
+            u_tmp[:] = self.state + 0.5 * dt * k
+            self.solve(u_tmp, dstatedt=k)
 
-        u_tmp[:] = u_tmp[:] + 0.5 * dt * k
-        self.solve(u_tmp, dstatedt=k)
+            u_tmp[:] = u_tmp[:] + 0.5 * dt * k
+            self.solve(u_tmp, dstatedt=k)
 
-        u_tmp[:] = (2 / 3) * self.state + (1 / 3) * u_tmp[:] + (1 / 6) * dt * k
-        self.solve(u_tmp, dstatedt=k)
+            u_tmp[:] = (2 / 3) * self.state + (1 / 3) * u_tmp[:] + (1 / 6) * dt * k
+            self.solve(u_tmp, dstatedt=k)
 
-        self.state[:] = u_tmp + 0.5 * dt * k
+            self.state[:] = u_tmp + 0.5 * dt * k
 
         self.time += dt
 
+    def advance(self, nsteps, dt=None):
+        # nsteps time steps with a fixed step size
+        if dt is None:
+            dt = self.get_dt()
+
+        for _ in range(nsteps):
+            self.time_step(dt)
+
+    def rhs(self, state, dstatedt=None):
+        # time derivative of the prognostic variables of state, the diagnostic slots of dstatedt are zero
+        return self.solve(state, dstatedt=dstatedt)
+
+    def linearise(self, state=None):
+        # matvec is the jacobian of rhs about state (the current state by default), state is copied
+        if state is None:
+            state = self.state
+        self.linear_state = np.copy(state)
+        self.linear_rhs = self.rhs(self.linear_state)
+
+        # finite difference steps are relative to the largest magnitude of each prognostic variable, at least
+        # 1 m/s for the covariant velocities
+        scale = np.array([abs(arr).max() for arr in self.get_vars(self.linear_state)[:self.nprognostic]])
+        scale[0] = max(scale[0], abs(self.norm_drdxi).max())
+        scale[1] = max(scale[1], abs(self.norm_drdzeta).max())
+        if self.nprocx > 1:
+            scale = self.comm.allreduce(scale, op=self.mpi.MAX)
+        self.linear_scale = np.where(scale > 0, scale, 1.0)
+
+    def matvec(self, v):
+        # matrix-free jacobian-vector product of rhs about the state of the last linearise, by a one sided
+        # finite difference. The diagnostic slots of v are ignored
+        if not hasattr(self, 'linear_state'):
+            self.linearise()
+
+        t0 = time.time()
+        with self.profiler.region('matvec'):
+            v = np.asarray(v, dtype=self.dtype).reshape(self.state.shape)
+            v_vars = self.get_vars(v)[:self.nprognostic]
+
+            vnorm = max(abs(arr).max() / scale for arr, scale in zip(v_vars, self.linear_scale))
+            if self.nprocx > 1:
+                vnorm = self.comm.allreduce(vnorm, op=self.mpi.MAX)
+            if vnorm == 0.0:
+                return np.zeros_like(self.linear_rhs)
+            eps = np.sqrt(np.finfo(self.dtype).eps) / vnorm
+
+            perturbed = np.copy(self.linear_state)
+            for arr, varr in zip(self.get_vars(perturbed), v_vars):
+                arr += eps * varr
+
+            out = self.rhs(perturbed)
+            out -= self.linear_rhs
+            out *= 1 / eps
+
+        self.matrix_assemble_time += time.time() - t0
+        self.profiler.count('matvec')
+
+        return out
+
+    def as_linear_operator(self, state=None):
+        # the jacobian of rhs about state as a scipy.sparse.linalg.LinearOperator, scipy is imported here as
+        # it is only needed for Krylov solves
+        from scipy.sparse.linalg import LinearOperator
+
+        self.linearise(state)
+        return LinearOperator(self.shape, matvec=self.matvec, dtype=self.dtype)
+
     def plot_solution(self, ax, vmin=None, vmax=None, plot_func=None, dim=3, cmap='nipy_spectral', levels=1000):
 
         def _reshape(arr):
@@ -640,9 +946,9 @@ class Euler2D():
         return ax.contour(x_plot, y_plot, z_plot, vmin=vmin, vmax=vmax, levels=levels, colors='black', linewidths=0.5)
 
     def integrate(self, q):
-        out = (self.J * self.weights2D[None, None] * q).sum()
+        out = (self.promote(self.J) * self.promote(self.weights2D)[None, None] * self.promote(q)).sum()
         out = np.array([out], 'd')
-        out = self.comm.reduce(out, op=MPI.SUM)
+        out = self.comm.reduce(out, op=self.mpi.SUM)
 
         if out is not None:
             return out[0]
@@ -696,7 +1002,7 @@ class Euler2D():
         return arr_out
 
     def get_filepath(self, data_dir, experiment_name, proc=None, time=None, nprocx=None, ext='npy'):
-        comm = MPI.COMM_WORLD
+        comm = self.comm
         rank = comm.Get_rank()
         size = comm.Get_size()
 
@@ -724,10 +1030,75 @@ class Euler2D():
         return fn
 
     def save(self, fn):
-        np.save(fn, self.state)
-        comm = MPI.COMM_WORLD
+        np.save(fn, self.variable_major(self.state))
+        comm = self.comm
         comm.Barrier()
 
+    def save_profile(self, fp):
+        # collective - writes the profiler report aggregated over ranks as json or csv
+        metadata = {
+            'solver': type(self).__name__, 'order': self.order, 'nx': self.nx, 'nz': self.nz,
+            'nprocx': self.nprocx, 'time': self.time,
+        }
+        return self.profiler.save(fp, metadata=metadata)
+
+    # restart files of runs with a different decomposition or resolution cannot be loaded
+    restart_shape_keys = ('nx', 'nz', 'order', 'nprocx', 'nvars')
+
+    def restart_config(self):
+        return {
+            'solver': type(self).__name__, 'nx': self.nx * self.nprocx, 'nz': self.nz, 'order': self.order,
+            'nprocx': self.nprocx, 'nvars': self.nvars, 'g': self.g, 'cfl': self.cfl, 'a': self.a,
+            'upwind': bool(self.upwind), 'top_bc': self.top_bc, 'compact_geometry': self.compact_geometry,
+            'precision': self.precision, 'layout': self.layout,
+        }
+
+    def get_restart_data(self):
+        # everything besides the state that a continued run depends on, subclasses add their caches
+        return {
+            'time': self.time,
+            'wall_times': np.array([self.mpi_send_time, self.mpi_recv_time, self.solve_time, self.bdry_time]),
+        }
+
+    def set_restart_data(self, data):
+        self.time = float(data['time'])
+        self.mpi_send_time, self.mpi_recv_time, self.solve_time, self.bdry_time = data['wall_times']
+
+    def save_restart(self, fn, **history):
+        # one npz file per rank with the exact time, the state and get_restart_data, the solver config, the
+        # profiler timers and counters and any diagnostics history given as keyword arrays
+        profile = {'timers': self.profiler.timers, 'counters': self.profiler.counters}
+        data = {f'restart_{name}': value for name, value in self.get_restart_data().items()}
+        data.update({f'history_{name}': np.asarray(value) for name, value in history.items()})
+        np.savez(
+            fn, state=self.variable_major(self.state), config=json.dumps(self.restart_config()),
+            profile=json.dumps(profile, default=lambda x: x.item()), **data
+        )
+        self.comm.Barrier()
+
+    def load_restart(self, fn):
+        # restores a save_restart file so the run continues as if it had not stopped, returns the history
+        with np.load(fn) as f:
+            config = json.loads(str(f['config']))
+            expected = self.restart_config()
+            mismatched = [key for key in self.restart_shape_keys if config[key] != expected[key]]
+            if mismatched:
+                raise ValueError(
+                    f"Restart file {fn} does not match the solver: "
+                    + ', '.join(f"{key}={config[key]} (solver {expected[key]})" for key in mismatched)
+                )
+
+            vars = self.get_vars(self.state)
+            for var, var_in in zip(vars, f['state'].reshape(self.nvars, -1)):
+                var[:] = var_in.reshape(var.shape)
+
+            self.set_restart_data({name[8:]: f[name] for name in f.files if name.startswith('restart_')})
+            profile = json.loads(str(f['profile']))
+            self.profiler.timers, self.profiler.counters = profile['timers'], profile['counters']
+            history = {name[8:]: f[name] for name in f.files if name.startswith('history_')}
+
+        return history
+
     def load(self, filepaths):
         if type(filepaths) is str:
             filepaths = [filepaths]
@@ -739,7 +1110,7 @@ class Euler2D():
 
         for i, filepath in enumerate(filepaths):
             i_start, i_stop = i * dnx, (i + 1) * dnx
-            state_in = np.load(filepath)
-            vars_in = self.get_vars(state_in, reshape=False)
+            # files are variable-major in either layout
+            vars_in = np.load(filepath).reshape(self.nvars, -1)
             for var, var_in in zip(vars, vars_in):
-                var[i_start:i_stop].ravel()[:] = var_in
+                var[i_start:i_stop] = var_in.reshape(var[i_start:i_stop].shape)
@@ -0,0 +1,403 @@
+import numpy as np
+
+
+def as_forcing(forcing):
+    # forcing=... accepts a Forcing, a list of them or a legacy forcing(solver, state, dstatedt) callable
+    if forcing is None or isinstance(forcing, Forcing):
+        return forcing
+    if isinstance(forcing, (list, tuple)):
+        return ForcingList(forcing)
+    if callable(forcing):
+        return CallbackForcing(forcing)
+    raise TypeError(f"Cannot use {type(forcing).__name__} as a forcing")
+
+
+def static_field(solver, field):
+    # profiles are given as arrays or as functions of the solver, e.g. lambda solver: f(solver.zs)
+    if callable(field):
+        field = field(solver)
+    return np.broadcast_to(np.asarray(field, dtype=solver.dtype), solver.xs.shape).copy()
+
+
+class Forcing:
+    # tendencies added to dstatedt once per Runge-Kutta stage. setup is called once with the constructed
+    # solver to precompute the time independent fields, apply adds the tendency of state to dstatedt.
+    # Split forcings instead update the state in split_step, once after each dynamics step
+
+    split = False
+
+    def setup(self, solver):
+        pass
+
+    def apply(self, solver, state, dstatedt):
+        raise NotImplementedError
+
+    def split_step(self, solver, state, dt):
+        pass
+
+    def max_dt(self, solver, radius=2.0):
+        # largest stable step of this forcing on its own when apply is integrated by a method whose stability
+        # region reaches -radius on the negative real axis, 2 for forward Euler. split_step is its own integrator
+        return np.inf
+
+    def get_restart_data(self):
+        # arrays set up from the solver state rather than from the arguments, which a continued run depends on
+        return {}
+
+    def set_restart_data(self, data):
+        pass
+
+
+class CallbackForcing(Forcing):
+    # a legacy forcing(solver, state, dstatedt) callable
+
+    def __init__(self, func):
+        self.func = func
+
+    def apply(self, solver, state, dstatedt):
+        self.func(solver, state, dstatedt)
+
+
+class ForcingList(Forcing):
+
+    def __init__(self, forcings):
+        self.forcings = [as_forcing(forcing) for forcing in forcings]
+        self.split = any(forcing.split for forcing in self.forcings)
+
+    def setup(self, solver):
+        for forcing in self.forcings:
+            forcing.setup(solver)
+
+    def apply(self, solver, state, dstatedt):
+        for forcing in self.forcings:
+            forcing.apply(solver, state, dstatedt)
+
+    def split_step(self, solver, state, dt):
+        for forcing in self.forcings:
+            forcing.split_step(solver, state, dt)
+
+    def max_dt(self, solver, radius=2.0):
+        return min((forcing.max_dt(solver, radius) for forcing in self.forcings), default=np.inf)
+
+    def get_restart_data(self):
+        return {
+            f'{i}_{name}': value
+            for i, forcing in enumerate(self.forcings) for name, value in forcing.get_restart_data().items()
+        }
+
+    def set_restart_data(self, data):
+        for i, forcing in enumerate(self.forcings):
+            prefix = f'{i}_'
+            forcing.set_restart_data({
+                name[len(prefix):]: value for name, value in data.items() if name.startswith(prefix)
+            })
+
+
+class TemperatureForcing(Forcing):
+    # heating rate dT/dt in K/s, applied as the entropy tendency cvd * dT/dt / T
+
+    def __init__(self, rate):
+        self.rate = rate
+
+    def setup(self, solver):
+        self.coeff = solver.cvd * static_field(solver, self.rate)
+        self.tmp = np.zeros_like(self.coeff)
+
+    def apply(self, solver, state, dstatedt):
+        T = solver.get_vars(state)[5]
+        dsdt = solver.get_vars(dstatedt)[3]
+        np.divide(self.coeff, T, out=self.tmp)
+        dsdt += self.tmp
+
+
+class EnergyForcing(Forcing):
+    # volumetric heating in W/m^3, applied as the entropy tendency E / (h * T)
+
+    def __init__(self, rate):
+        self.rate = rate
+
+    def setup(self, solver):
+        self.rate_ = static_field(solver, self.rate)
+        self.tmp = np.zeros_like(self.rate_)
+
+    def apply(self, solver, state, dstatedt):
+        u, w, h, s, q, T, *_ = solver.get_vars(state)
+        dsdt = solver.get_vars(dstatedt)[3]
+        np.multiply(h, T, out=self.tmp)
+        np.divide(self.rate_, self.tmp, out=self.tmp)
+        dsdt += self.tmp
+
+
+class VerticalDiffusion(Forcing):
+    # entropy tendency d/dz(K * F) with F = ds/dz. Interfaces use the central flux and the top is zero flux. At
+    # the surface either s_surface (one value per bottom face node) is imposed weakly or surface_flux, the upward
+    # flux -K ds/dz, is prescribed, zero if neither is given. Only the levels where K is nonzero, and the level above them, are evaluated.
+    #
+    # mode='explicit' adds the tendency at every Runge-Kutta stage, or as a forward Euler step after the dynamics
+    # with split=True. mode='implicit' is always split: after each dynamics step the columns are advanced with
+    # backward Euler, (I - dt L) s = s_old + dt b, so the diffusion does not limit the time step
+
+    modes = ('explicit', 'implicit')
+
+    def __init__(self, K, s_surface=None, surface_flux=None, mode='explicit', split=False):
+        if mode not in self.modes:
+            raise ValueError(f"Unknown mode {mode}, expected one of {self.modes}")
+        if s_surface is not None and surface_flux is not None:
+            raise ValueError("Only one of s_surface and surface_flux can be given")
+        self.K = K
+        self.s_surface = s_surface
+        self.surface_flux = surface_flux
+        self.mode = mode
+        self.split = split or mode == 'implicit'
+
+    def setup(self, solver):
+        K = static_field(solver, self.K)
+        active = np.flatnonzero((K != 0).any(axis=(0, 2, 3)))
+        nlev = min(active[-1] + 2, solver.nz) if active.size > 0 else 0
+        self.levels = (slice(None), slice(0, nlev))
+
+        # metric terms may be stored per cell (compact geometry)
+        self.K_ = K[self.levels]
+        self.dzetadz, self.dxidz, norm_grad_zeta = (
+            np.broadcast_to(arr, solver.xs.shape)[self.levels].copy()
+            for arr in (solver.dzetadz, solver.dxidz, solver.norm_grad_zeta)
+        )
+        self.penalty_p = norm_grad_zeta[solver.ip_vert_int] / solver.weights_z[-1]
+        self.penalty_m = norm_grad_zeta[solver.im_vert_int] / solver.weights_z[-1]
+        self.penalty_sfc = norm_grad_zeta[solver.ip_vert_ext] / solver.weights_z[-1]
+        self.penalty_top = norm_grad_zeta[solver.im_vert_ext] / solver.weights_z[-1]
+
+        self.solve_dt = None
+        self.spectral_radius = None
+        if self.mode == 'implicit' and nlev > 0:
+            self.assemble(solver)
+
+    def ddz(self, solver, arr):
+        # strong form d/dz with the central value at the interfaces, the face terms n (arr* - arr) follow the
+        # sign convention of solve_boundaries, the bottom face of a cell has n = -1 and the top face n = +1
+        out = solver.ddzeta(arr) * self.dzetadz + solver.ddxi(arr) * self.dxidz
+
+        ip = solver.ip_vert_int
+        im = solver.im_vert_int
+        jump = 0.5 * (arr[im] - arr[ip])
+        out[ip] -= jump * self.penalty_p
+        out[im] -= jump * self.penalty_m
+
+        return out
+
+    def tendency(self, solver, s, homogeneous=False):
+        # ds/dt = d/dz(K ds/dz) on the diffusion levels, homogeneous=True drops the prescribed surface value or
+        # flux. The flux K ds/dz is zero through the top of the diffusion levels
+        ip = solver.ip_vert_ext
+        top = solver.im_vert_ext
+        F = self.ddz(solver, s)
+        if self.s_surface is not None:
+            s_surface = 0.0 if homogeneous else self.s_surface
+            F[ip] -= (s_surface - s[ip]) * self.penalty_sfc
+
+        F *= self.K_
+        out = self.ddz(solver, F)
+        # the upward flux -K ds/dz through the surface is surface_flux, zero by default, or that of the interior
+        # for s_surface
+        if self.s_surface is None:
+            surface_flux = 0.0 if homogeneous or self.surface_flux is None else self.surface_flux
+            out[ip] += (surface_flux + F[ip]) * self.penalty_sfc
+        out[top] -= F[top] * self.penalty_top
+
+        return out
+
+    def assemble(self, solver):
+        # the operator couples each level to two levels either side, so pairs of levels form a block
+        # tridiagonal system per cell column. Columns of L are probed five levels and one node at a time
+        nx, nlev, n = self.K_.shape[:3]
+        nn = n * n
+        npair = (nlev + 1) // 2
+        blocks = np.zeros((3, nx, npair, 2 * nn, 2 * nn))
+
+        k = np.arange(nlev)
+        for c in range(5):
+            offset = (c - k + 2) % 5 - 2
+            l = k + offset
+            valid = (l >= 0) & (l < nlev)
+            k_, l_ = k[valid], l[valid]
+            for node in range(nn):
+                e = np.zeros(self.K_.shape)
+                e[:, c::5, node // n, node % n] = 1.0
+                response = self.tendency(solver, e, homogeneous=True).reshape(nx, nlev, nn)
+                for ki, li in zip(k_, l_):
+                    rows = slice((ki % 2) * nn, (ki % 2 + 1) * nn)
+                    blocks[li // 2 - ki // 2 + 1, :, ki // 2, rows, (li % 2) * nn + node] = response[:, ki]
+
+        # with an odd number of levels the last block is padded with an identity row of I - dt L
+        self.L_lower, self.L_diag, self.L_upper = blocks
+
+    def factorise(self, dt):
+        # block LU of I - dt L, kept until dt changes
+        npair, B = self.L_diag.shape[1:3]
+        eye = np.eye(B)
+        self.inv_diag = np.zeros_like(self.L_diag)
+        self.upper = np.zeros_like(self.L_diag)
+        for p in range(npair):
+            diag = eye - dt * self.L_diag[:, p]
+            if p > 0:
+                diag += (dt * self.L_lower[:, p]) @ self.upper[:, p - 1]
+            self.inv_diag[:, p] = np.linalg.inv(diag)
+            if p < npair - 1:
+                self.upper[:, p] = self.inv_diag[:, p] @ (-dt * self.L_upper[:, p])
+        self.solve_dt = dt
+
+    def implicit_solve(self, solver, s, dt):
+        nx, nlev, n = self.K_.shape[:3]
+        nn = n * n
+        npair = self.L_diag.shape[1]
+        if self.solve_dt != dt:
+            self.factorise(dt)
+
+        rhs = np.zeros((nx, 2 * npair, nn))
+        rhs[:, :nlev] = (s + dt * self.tendency(solver, np.zeros_like(s))).reshape(nx, nlev, nn)
+        rhs = rhs.reshape(nx, npair, 2 * nn, 1)
+
+        y = np.zeros_like(rhs)
+        for p in range(npair):
+            r = rhs[:, p]
+            if p > 0:
+                r = r + (dt * self.L_lower[:, p]) @ y[:, p - 1]
+            y[:, p] = self.inv_diag[:, p] @ r
+        for p in range(npair - 2, -1, -1):
+            y[:, p] -= self.upper[:, p] @ y[:, p + 1]
+
+        s[:] = y.reshape(nx, 2 * npair, nn)[:, :nlev].reshape(s.shape)
+
+    def max_dt(self, solver, radius=2.0, iters=100, safety=0.9):
+        # radius / rho(L), with the spectral radius of the homogeneous operator from power iterations, and 2 / rho(L)
+        # for the forward Euler split step. L is symmetric and negative semidefinite in the J weighted inner
+        # product, which the power iterations check: the extreme eigenvalue must be negative and the one of
+        # L + rho I must not exceed rho. The power iterations approach rho from below, hence the safety factor
+        if self.mode == 'implicit' or self.K_.shape[1] == 0:
+            return np.inf
+
+        if self.spectral_radius is None:
+            mass = (np.broadcast_to(solver.J, solver.xs.shape) * solver.weights2D)[self.levels]
+            extreme = self.power_iteration(solver, mass, 0.0, iters)
+            self.spectral_radius = abs(extreme)
+            largest = self.power_iteration(solver, mass, self.spectral_radius, iters) - self.spectral_radius
+            if extreme > 0 or largest > 1e-8 * self.spectral_radius:
+                raise ValueError(
+                    f"The vertical diffusion has an eigenvalue with a positive real part, {max(extreme, largest)}, "
+                    "check the sign of K"
+                )
+
+        radius = 2.0 if self.split else radius
+        return safety * radius / self.spectral_radius
+
+    def power_iteration(self, solver, mass, shift, iters):
+        # Rayleigh quotient of the extreme eigenvector of L + shift I, with the inner product weighted by mass
+        v = np.random.default_rng(0).standard_normal(self.K_.shape)
+        for _ in range(iters):
+            v /= np.sqrt((mass * v * v).sum())
+            v = self.tendency(solver, v, homogeneous=True) + shift * v
+        v /= np.sqrt((mass * v * v).sum())
+        return (mass * v * (self.tendency(solver, v, homogeneous=True) + shift * v)).sum()
+
+    def apply(self, solver, state, dstatedt):
+        if self.split or self.K_.shape[1] == 0:
+            return
+
+        s = solver.get_vars(state)[3][self.levels]
+        dsdt = solver.get_vars(dstatedt)[3][self.levels]
+        dsdt += self.tendency(solver, s)
+
+    def split_step(self, solver, state, dt):
+        if not self.split or self.K_.shape[1] == 0:
+            return
+
+        s = solver.get_vars(state)[3][self.levels]
+        if self.mode == 'implicit':
+            self.implicit_solve(solver, s, dt)
+        else:
+            s += dt * self.tendency(solver, s)
+
+
+def sponge_profile(distance, depth, rate):
+    # rate * sin^2 ramp from zero at depth from the boundary to rate at distance zero, in 1/s
+    ramp = np.clip(1.0 - distance / depth, 0.0, 1.0)
+    return rate * np.sin(0.5 * np.pi * ramp) ** 2
+
+
+def top_sponge(z_top, depth, rate):
+    return lambda solver: sponge_profile(z_top - solver.zs, depth, rate)
+
+
+def lateral_sponge(x_left, x_right, width, rate):
+    # damping either side of the periodic seam so the lateral boundaries act as open boundaries
+    return lambda solver: sponge_profile(np.minimum(solver.xs - x_left, x_right - solver.xs), width, rate)
+
+
+class RayleighDamping(Forcing):
+    # sponge layer relaxing variables towards a reference state at the rate coeff in 1/s, e.g. top_sponge(...) or
+    # a list of profiles which are summed. Only the cells where coeff is nonzero are stored and updated. The
+    # reference defaults to the state at setup, which set_initial_condition runs, so the initial condition, and
+    # reference={'u': ...} overrides it per variable. split=True relaxes exactly, ref + (var - ref) *
+    # exp(-coeff dt), after each dynamics step
+
+    variable_index = {'u': 0, 'w': 1, 'h': 2, 's': 3, 'q': 4}
+
+    def __init__(self, coeff, variables=('u', 'w'), reference=None, split=False):
+        unknown = set(variables) - set(self.variable_index)
+        if unknown:
+            raise ValueError(f"Cannot damp {sorted(unknown)}, expected some of {tuple(self.variable_index)}")
+        self.coeff = coeff
+        self.variables = tuple(variables)
+        self.reference = {} if reference is None else reference
+        self.split = split
+
+    def setup(self, solver):
+        profiles = self.coeff if isinstance(self.coeff, (list, tuple)) else [self.coeff]
+        coeff = sum(static_field(solver, profile) for profile in profiles)
+        self.cells = np.nonzero((coeff != 0).any(axis=(2, 3)))
+        self.coeff_ = coeff[self.cells]
+        self.max_coeff = self.coeff_.max(initial=0.0)
+
+        state_vars = solver.get_vars(solver.state)
+        self.reference_ = []
+        for name in self.variables:
+            ref = self.reference.get(name)
+            ref = state_vars[self.variable_index[name]] if ref is None else static_field(solver, ref)
+            self.reference_.append(np.copy(ref[self.cells]))
+
+        self.decay_dt = None
+
+    def max_dt(self, solver, radius=2.0):
+        if self.split or self.max_coeff == 0:
+            return np.inf
+        return radius / self.max_coeff
+
+    def get_restart_data(self):
+        return {f'reference_{name}': ref for name, ref in zip(self.variables, self.reference_)}
+
+    def set_restart_data(self, data):
+        for name, ref in zip(self.variables, self.reference_):
+            if f'reference_{name}' in data:
+                ref[:] = data[f'reference_{name}']
+
+    def apply(self, solver, state, dstatedt):
+        if self.split or self.coeff_.size == 0:
+            return
+
+        state_vars, tendencies = solver.get_vars(state), solver.get_vars(dstatedt)
+        for name, ref in zip(self.variables, self.reference_):
+            i = self.variable_index[name]
+            tendencies[i][self.cells] -= self.coeff_ * (state_vars[i][self.cells] - ref)
+
+    def split_step(self, solver, state, dt):
+        if not self.split or self.coeff_.size == 0:
+            return
+
+        if self.decay_dt != dt:
+            self.decay = np.exp(-dt * self.coeff_)
+            self.decay_dt = dt
+
+        state_vars = solver.get_vars(state)
+        for name, ref in zip(self.variables, self.reference_):
+            var = state_vars[self.variable_index[name]]
+            var[self.cells] = ref + (var[self.cells] - ref) * self.decay
@@ -0,0 +1,69 @@
+import numpy as np
+from _moist_euler_dg import fmoist_euler_2d_advance
+
+
+def can_advance_compiled(solver, forcing=True):
+    # the compiled loop has no MPI halo exchange, forcing, compact geometry, blocked layout or outflow top.
+    # forcing=False asks for the dynamics only, as in the subcycles of TwoPhaseEuler2D.multirate_step
+    has_forcing = forcing is not False and solver.forcing is not None
+    return (
+        solver.nprocx == 1 and not has_forcing and not solver.compact_geometry and solver.layout == 'variable'
+        and solver.top_bc == 'wall'
+    )
+
+
+def advance(solver, nsteps, dt, nphase, consts, qi, thermo_module):
+    # run nsteps of solver.time_step in native code, returns the number of points where the thermo solve failed
+    state, k, u_tmp = (arr.reshape(solver.nvars, -1).T for arr in [solver.state] + solver.private_working_arrays[1:])
+
+    with solver.profiler.region('advance'):
+        steps_done, first_limit_step, nlimited, nfail, status = fmoist_euler_2d_advance.advance(
+            state, k, u_tmp, solver.qv.ravel(), solver.ql.ravel(), qi.ravel(),
+            nsteps, dt,
+            solver.D.transpose(), solver.weights_z[-1], solver.J.ravel(),
+            solver.grad_xi_2.ravel(), solver.grad_xi_dot_zeta.ravel(), solver.grad_zeta_2.ravel(),
+            solver.u_grav.ravel(), solver.w_grav.ravel(), solver.g, solver.cell_mass.ravel(), solver.inv_cell_mass.ravel(),
+            solver.nx, solver.nz, solver.order + 1, solver.kernel_order,
+            solver.a, float(solver.upwind), solver.gamma,
+            nphase, np.array(consts, dtype=np.float64),
+        )
+
+    solver.limited_cells += nlimited
+    solver.profiler.count('advance_steps', steps_done)
+    solver.profiler.count('limited_cells', nlimited)
+    solver.profiler.count('newton_iterations', int(thermo_module.newton_iterations))
+    thermo_module.newton_iterations = 0
+
+    if first_limit_step > 0 and solver.first_water_limit_time is None:
+        solver.first_water_limit_time = solver.time + (first_limit_step - 1) * dt
+    for _ in range(steps_done):
+        solver.time += dt
+
+    if status == 1:
+        print("Negative water cell mean detected")
+        raise RuntimeError("Negative water cell mean detected")
+    elif status == 2:
+        print("Negative water mass - limiting failed :( ")
+        raise RuntimeError("Negative water mass - limiting failed :( ")
+    elif status == 3:
+        raise RuntimeError(f"Error: thermo solve not converged at t={solver.time}.")
+
+    return nfail
+
+
+def limit_water(solver, h, qw):
+    # compiled TwoPhaseEuler2D.limit_water, qw is limited in place
+    nonpositive, nlimited, status = fmoist_euler_2d_advance.limit_water(
+        h.ravel(), qw.ravel(), solver.cell_mass.ravel(), solver.inv_cell_mass.ravel(),
+        solver.nx * solver.nz, (solver.order + 1) ** 2
+    )
+    return bool(nonpositive), nlimited, status
+
+
+def limit_water_blocked(solver, state):
+    # compiled TwoPhaseEuler2D.limit_state_water for the blocked layout, state is limited in place
+    nonpositive, nlimited, status = fmoist_euler_2d_advance.limit_water_blocked(
+        solver.blocked_view(state), solver.cell_mass.ravel(), solver.inv_cell_mass.ravel(),
+        solver.nx * solver.nz, (solver.order + 1) ** 2
+    )
+    return bool(nonpositive), nlimited, status
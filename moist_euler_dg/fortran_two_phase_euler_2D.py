@@ -1,45 +1,103 @@
 import numpy as np
 from moist_euler_dg.two_phase_euler_2D import TwoPhaseEuler2D
 from _moist_euler_dg import two_phase_thermo, fmoist_euler_2d_dynamics
+from moist_euler_dg import fortran_advance, local_time_stepping
 
 
 class FortranTwoPhaseEuler2D(TwoPhaseEuler2D):
 
-
-    def get_thermodynamic_quantities(self, density, entropy, qw, update_cache=False, use_cache=False):
-
-        qd = 1 - qw
-        if use_cache:
-            qv, ql = self.qv, self.ql
-        else:
-            qv, ql = np.zeros_like(density), np.zeros_like(density)
-            qv[:] = qw
-
-        T = np.zeros_like(density)
-        mu = np.zeros_like(density)
-        ind = np.zeros_like(density)
-
-        two_phase_thermo.solve_fractions_from_entropy(
-            qv.ravel(), ql.ravel(), T.ravel(), mu.ravel(), ind.ravel(), density.ravel(), entropy.ravel(), qw.ravel(), qv.size,
+    # the kernels are compiled for real(8) arrays
+    supported_precisions = ('double',)
+    # 'specialised' runs solve_column compiled for the polynomial order when there is one, 'generic' always
+    # runs the kernel with runtime loop bounds
+    column_kernels = ('specialised', 'generic')
+    specialised_orders = range(1, 9)
+
+    def __init__(self, *args, column_kernel='specialised', **kwargs):
+        if column_kernel not in self.column_kernels:
+            raise ValueError(f"Unknown column kernel '{column_kernel}', expected one of {self.column_kernels}")
+        self.column_kernel = column_kernel
+        TwoPhaseEuler2D.__init__(self, *args, **kwargs)
+        specialised = column_kernel == 'specialised' and self.order in self.specialised_orders
+        self.kernel_order = self.order if specialised else 0
+        if self.layout == 'blocked' and self.compact_geometry:
+            raise NotImplementedError("The compact geometry kernels only support the variable layout")
+        # G, Fx, Fz and the sound speed on the left and right faces of each column, filled by solve
+        # and reused for the periodic and MPI faces in solve_horz_boundaries
+        self.face_trace = np.zeros((self.nz * (self.order + 1), 4, 2, self.nx), order='F')
+        # the first and last level of each column the variable layout kernel is restricted to during solve_active,
+        # None for every level
+        self.active_levels = None
+
+    def thermo_constants(self):
+        # constants in the argument order of the two_phase_thermo kernels
+        return (
             self.Rd, self.logRd, self.Rv, self.logRv, self.cvd, self.cvv, self.cpv, self.cpd, self.cl,
             self.T0, self.logT0, self.p0, self.logp0, self.Lv0, self.c0, self.c1
         )
 
-        if (ind == 0).any():
-            mask = ind == 0
-            # print(f"Warning: thermo solve not converged at t={self.time}. density={density[mask][0]}; entropy={entropy[mask][0]}; qw={qw[mask][0]}")
-
-            raise RuntimeError(f"Error: thermo solve not converged at t={self.time}. density={density[mask][0]}; entropy={entropy[mask][0]}; qw={qw[mask][0]}")
+    def solve_thermo_vars(self, qv, ql, T, mu, p, ie, density, entropy, qw):
+        # moisture fractions (updated in place from their initial guess) and T, mu, p, ie in a single kernel pass
+        nfail, first_fail = two_phase_thermo.solve_thermo_vars(
+            qv.ravel(), ql.ravel(), T.ravel(), mu.ravel(), p.ravel(), ie.ravel(),
+            density.ravel(), entropy.ravel(), qw.ravel(), qv.size, *self.thermo_constants()
+        )
+        self.record_thermo_solve(qv.size, nfail, first_fail, density, entropy, qw)
 
-        R = qv * self.Rv + qd * self.Rd
-        cv = qd * self.cvd + qv * self.cvv + ql * self.cl
+    def solve_thermo_vars_blocked(self, state):
+        # solve_thermo_vars on a blocked state, T, mu, p and ie are written into each element
+        nfail, first_fail = two_phase_thermo.solve_thermo_vars_blocked(
+            self.qv.ravel(), self.ql.ravel(), self.blocked_view(state),
+            self.xs.shape[2] * self.xs.shape[3], self.nx * self.nz, *self.thermo_constants()
+        )
+        u, w, h, s, qw, *_ = self.get_vars(state)
+        self.record_thermo_solve(self.qv.size, nfail, first_fail, h, s, qw)
+
+    def record_thermo_solve(self, npoints, nfail, first_fail, density, entropy, qw):
+        self.profiler.count('thermo_points', npoints)
+        self.profiler.count('newton_iterations', int(two_phase_thermo.newton_iterations))
+        two_phase_thermo.newton_iterations = 0
+
+        if nfail > 0:
+            i = first_fail - 1
+            raise RuntimeError(f"Error: thermo solve not converged at t={self.time}. density={density.ravel()[i]}; entropy={entropy.ravel()[i]}; qw={qw.ravel()[i]}")
+
+    def set_thermo_vars(self, state, use_cache=True):
+        with self.profiler.region('thermodynamics'):
+            u, w, h, s, qw, T, mu, p, ie = self.get_vars(state)
+            if not use_cache:
+                self.qv[:] = qw
+                self.ql[:] = 0.0
+
+            # written straight into the state and the moisture caches
+            if self.layout == 'blocked':
+                self.solve_thermo_vars_blocked(state)
+            else:
+                self.solve_thermo_vars(self.qv, self.ql, T, mu, p, ie, h, s, qw)
+
+    def set_thermo_vars_active(self, state, active):
+        # set_thermo_vars on the cells where active (nx, nz) is True, the blocked layout solves every cell
+        if self.layout == 'blocked' or active.all():
+            return self.set_thermo_vars(state)
+
+        with self.profiler.region('thermodynamics'):
+            u, w, h, s, qw, T, mu, p, ie = self.get_vars(state)
+            fractions = [arr[active] for arr in self.moisture_fractions()]
+            thermo = [np.zeros_like(fractions[0]) for _ in range(4)]
+            self.solve_thermo_vars(*fractions, *thermo, h[active], s[active], qw[active])
+            for arr, values in zip(self.moisture_fractions() + [T, mu, p, ie], fractions + thermo):
+                arr[active] = values
 
-        p = density * R * T
+    def get_thermodynamic_quantities(self, density, entropy, qw, update_cache=False, use_cache=False):
 
-        specific_ie = cv * T + qv * self.Lv0
-        enthalpy = specific_ie + p / density
-        ie = density * specific_ie
+        if use_cache:
+            qv, ql = self.qv, self.ql
+        else:
+            qv, ql = np.copy(qw), np.zeros_like(density)
 
+        T, mu, p, ie = (np.zeros_like(density) for _ in range(4))
+        self.solve_thermo_vars(qv, ql, T, mu, p, ie, density, entropy, qw)
+        enthalpy = (ie + p) / density
 
         if update_cache:
             self.qv[:] = qv
@@ -47,22 +105,105 @@ class FortranTwoPhaseEuler2D(TwoPhaseEuler2D):
 
         return enthalpy, T, p, ie, mu, qv, ql
 
+    def advance(self, nsteps, dt=None, forcing=True):
+        if dt is None:
+            dt = self.get_dt()
+
+        if not fortran_advance.can_advance_compiled(self, forcing):
+            return TwoPhaseEuler2D.advance(self, nsteps, dt, forcing=forcing)
+
+        # no ice in the two phase model
+        fortran_advance.advance(self, nsteps, dt, 2, self.thermo_constants(), np.zeros(1), two_phase_thermo)
+
+    def limit_water(self, h, qw):
+        return fortran_advance.limit_water(self, h, qw)
+
+    def limit_state_water(self, state):
+        if self.layout == 'blocked':
+            return fortran_advance.limit_water_blocked(self, state)
+        return TwoPhaseEuler2D.limit_state_water(self, state)
+
     def _solve(self, state, dstatedt):
         u, w, h, s, q, T, mu, p, ie = self.get_vars(state)
         dudt, dwdt, dhdt, dsdt, dqdt, *_ = self.get_vars(dstatedt)
 
-        fmoist_euler_2d_dynamics.solve(
-            u.ravel(), w.ravel(), h.ravel(), s.ravel(), q.ravel(), T.ravel(), mu.ravel(), p.ravel(), ie.ravel(),
-            dudt.ravel(), dwdt.ravel(), dhdt.ravel(), dsdt.ravel(), dqdt.ravel(),
-            self.D.transpose(), self.weights_z[-1], self.J.ravel(),
-            self.grad_xi_2.ravel(), self.grad_xi_dot_zeta.ravel(), self.grad_zeta_2.ravel(),
-            self.nx, self.nz, self.order + 1,
-            self.a, float(self.upwind), self.gamma
-        )
+        if self.compact_geometry:
+            fmoist_euler_2d_dynamics.solve_compact(
+                u.ravel(), w.ravel(), h.ravel(), s.ravel(), q.ravel(), T.ravel(), mu.ravel(), p.ravel(), ie.ravel(),
+                dudt.ravel(), dwdt.ravel(), dhdt.ravel(), dsdt.ravel(), dqdt.ravel(),
+                self.D.transpose(), self.weights_z[-1],
+                self.dxdxi.ravel(), self.dxdzeta.ravel(), self.dzdxi.ravel(), self.dzdzeta.ravel(), int(self.metric_per_cell),
+                self.face_trace,
+                self.nx, self.nz, self.order + 1, self.kernel_order,
+                self.a, float(self.upwind), self.gamma
+            )
+        elif self.layout == 'blocked':
+            fmoist_euler_2d_dynamics.solve_blocked(
+                self.blocked_view(state), self.blocked_view(dstatedt),
+                self.D.transpose(), self.weights_z[-1], self.J.ravel(),
+                self.grad_xi_2.ravel(), self.grad_xi_dot_zeta.ravel(), self.grad_zeta_2.ravel(),
+                self.face_trace,
+                self.nx, self.nz, self.order + 1, self.kernel_order,
+                self.a, float(self.upwind), self.gamma
+            )
+        elif self.active_levels is not None:
+            fmoist_euler_2d_dynamics.solve_active(
+                u.ravel(), w.ravel(), h.ravel(), s.ravel(), q.ravel(), T.ravel(), mu.ravel(), p.ravel(), ie.ravel(),
+                dudt.ravel(), dwdt.ravel(), dhdt.ravel(), dsdt.ravel(), dqdt.ravel(),
+                self.D.transpose(), self.weights_z[-1], self.J.ravel(),
+                self.grad_xi_2.ravel(), self.grad_xi_dot_zeta.ravel(), self.grad_zeta_2.ravel(),
+                self.face_trace, *self.active_levels,
+                self.nx, self.nz, self.order + 1, self.kernel_order,
+                self.a, float(self.upwind), self.gamma
+            )
+        else:
+            fmoist_euler_2d_dynamics.solve(
+                u.ravel(), w.ravel(), h.ravel(), s.ravel(), q.ravel(), T.ravel(), mu.ravel(), p.ravel(), ie.ravel(),
+                dudt.ravel(), dwdt.ravel(), dhdt.ravel(), dsdt.ravel(), dqdt.ravel(),
+                self.D.transpose(), self.weights_z[-1], self.J.ravel(),
+                self.grad_xi_2.ravel(), self.grad_xi_dot_zeta.ravel(), self.grad_zeta_2.ravel(),
+                self.face_trace,
+                self.nx, self.nz, self.order + 1, self.kernel_order,
+                self.a, float(self.upwind), self.gamma
+            )
 
         dudt -= self.g * self.u_grav
         dwdt -= self.g * self.w_grav
 
+        if self.top_bc == 'outflow':
+            self.solve_top_outflow(state, dstatedt)
+
+    def solve_active(self, state, dstatedt, active):
+        # the column kernels run on the levels from the first to the last active cell of each column only, except
+        # for the compact geometry and the blocked layout which evaluate every cell
+        self.active_levels = local_time_stepping.level_ranges(active)
+        try:
+            return self.solve(state, dstatedt)
+        finally:
+            self.active_levels = None
+
+    def mass_flux(self, state_p, state_m, direction, idx):
+        # face_fluxes takes the mean of the normal mass fluxes, without the jump term of the numpy kernels
+        return 0.5 * (self.normal_mass_flux(state_p, direction, idx) + self.normal_mass_flux(state_m, direction, idx))
+
+    def solve_top_outflow(self, state, dstatedt):
+        # the kernels close the top with the wall flux, solve_top_outflow swaps it for the ghost state flux
+        im = self.im_vert_ext
+        ghost = self.fill_top_boundary(state)
+        state_m = np.ascontiguousarray(self.get_boundary_data(state, im)).reshape(self.nvars, -1)
+        dstatedt_m = self.get_boundary_data(dstatedt, im)
+        ddt = np.ascontiguousarray(dstatedt_m[:5]).reshape(5, -1)
+        metric = (
+            np.ascontiguousarray(np.broadcast_to(arr, self.xs.shape)[im]).ravel()
+            for arr in (self.grad_xi_2, self.grad_xi_dot_zeta, self.grad_zeta_2)
+        )
+
+        fmoist_euler_2d_dynamics.solve_top_outflow(
+            *state_m, *ghost.reshape(self.nvars, -1), *ddt, *metric,
+            state_m.shape[1], self.weights_z[-1], self.a, float(self.upwind), self.gamma,
+        )
+        dstatedt_m[:5] = ddt.reshape(dstatedt_m[:5].shape)
+
     def _solve_horz_boundaries(self, state, dstatedt):
 
         u, w, h, s, q, T, mu, p, ie = self.get_vars(state)
@@ -71,15 +212,40 @@ class FortranTwoPhaseEuler2D(TwoPhaseEuler2D):
         um, wm, hm, sm, qm, Tm, mum, pm, iem = (self.left_boundary[i].ravel() for i in range(self.nvars))
         up, wp, hp, sp, qp, Tp, mup, pp, iep = (self.right_boundary[i].ravel() for i in range(self.nvars))
 
-        fmoist_euler_2d_dynamics.solve_horz_boundaries(
-            u.ravel(), w.ravel(), h.ravel(), s.ravel(), q.ravel(), T.ravel(), mu.ravel(), p.ravel(), ie.ravel(),
-            um, wm, hm, sm, qm, Tm, mum, pm, iem,
-            up, wp, hp, sp, qp, Tp, mup, pp, iep,
-            dudt.ravel(), dwdt.ravel(), dhdt.ravel(), dsdt.ravel(), dqdt.ravel(),
-            self.D.transpose(), self.weights_z[-1], self.J.ravel(),
-            self.grad_xi_2.ravel(), self.grad_xi_dot_zeta, self.grad_zeta_2.ravel(),
-            self.nx, self.nz, self.order + 1,
-            self.a, float(self.upwind), self.gamma,
-        )
+        if self.compact_geometry:
+            fmoist_euler_2d_dynamics.solve_horz_boundaries_compact(
+                u.ravel(), w.ravel(), h.ravel(), s.ravel(), q.ravel(), T.ravel(), mu.ravel(), p.ravel(), ie.ravel(),
+                um, wm, hm, sm, qm, Tm, mum, pm, iem,
+                up, wp, hp, sp, qp, Tp, mup, pp, iep,
+                dudt.ravel(), dwdt.ravel(), dhdt.ravel(), dsdt.ravel(), dqdt.ravel(),
+                self.D.transpose(), self.weights_z[-1],
+                self.dxdxi.ravel(), self.dxdzeta.ravel(), self.dzdxi.ravel(), self.dzdzeta.ravel(), int(self.metric_per_cell),
+                self.face_trace,
+                self.nx, self.nz, self.order + 1,
+                self.a, float(self.upwind), self.gamma,
+            )
+        elif self.layout == 'blocked':
+            fmoist_euler_2d_dynamics.solve_horz_boundaries_blocked(
+                self.blocked_view(state),
+                self.left_boundary.reshape(self.nvars, -1).T, self.right_boundary.reshape(self.nvars, -1).T,
+                self.blocked_view(dstatedt),
+                self.D.transpose(), self.weights_z[-1], self.J.ravel(),
+                self.grad_xi_2.ravel(), self.grad_xi_dot_zeta.ravel(), self.grad_zeta_2.ravel(),
+                self.face_trace,
+                self.nx, self.nz, self.order + 1,
+                self.a, float(self.upwind), self.gamma,
+            )
+        else:
+            fmoist_euler_2d_dynamics.solve_horz_boundaries(
+                u.ravel(), w.ravel(), h.ravel(), s.ravel(), q.ravel(), T.ravel(), mu.ravel(), p.ravel(), ie.ravel(),
+                um, wm, hm, sm, qm, Tm, mum, pm, iem,
+                up, wp, hp, sp, qp, Tp, mup, pp, iep,
+                dudt.ravel(), dwdt.ravel(), dhdt.ravel(), dsdt.ravel(), dqdt.ravel(),
+                self.D.transpose(), self.weights_z[-1], self.J.ravel(),
+                self.grad_xi_2.ravel(), self.grad_xi_dot_zeta, self.grad_zeta_2.ravel(),
+                self.face_trace,
+                self.nx, self.nz, self.order + 1,
+                self.a, float(self.upwind), self.gamma,
+            )
 
         return dstatedt
\ No newline at end of file
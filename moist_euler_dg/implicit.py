@@ -0,0 +1,158 @@
+import numpy as np
+
+
+def column_colours(nx):
+    # number of column colours such that neighbouring columns, across the periodic seam too, differ in colour
+    if nx <= 3:
+        return nx
+    ncolour = 3
+    while (nx - 1) % ncolour == 0:
+        ncolour += 1
+    return ncolour
+
+
+def element_major(solver, x):
+    # the prognostic variables of x as (nx, nz, nprognostic * n * n), one row per element
+    return np.stack(solver.get_vars(x)[:solver.nprognostic], axis=2).reshape(solver.nx, solver.nz, -1)
+
+
+def set_element_major(solver, x, y):
+    n = solver.order + 1
+    y = y.reshape(solver.nx, solver.nz, solver.nprognostic, n, n)
+    for var, arr in enumerate(solver.get_vars(x)[:solver.nprognostic]):
+        arr[:] = y[:, :, var]
+
+
+class ColumnPreconditioner():
+    # block tridiagonal approximation of I - c J per cell column, J the jacobian of solver.rhs at the state of
+    # the last solver.linearise. The coupling between columns is dropped and each level couples to the level
+    # either side. Blocks are probed with solver.matvec, every third level of every ncolour-th column and one
+    # variable and node at a time
+
+    def assemble(self, solver):
+        nx, nz, n = solver.nx, solver.nz, solver.order + 1
+        nn = n * n
+        B = solver.nprognostic * nn
+        blocks = np.zeros((3, nx, nz, B, B))
+
+        ncolour = column_colours(nx)
+        k = np.arange(nz)
+        v = np.zeros_like(solver.state)
+        for cx in range(ncolour):
+            cols = np.arange(nx) % ncolour == cx
+            for cz in range(3):
+                offset = (cz - k + 1) % 3 - 1
+                l = k + offset
+                valid = (l >= 0) & (l < nz)
+                for var in range(solver.nprognostic):
+                    scale = solver.linear_scale[var]
+                    for node in range(nn):
+                        v[:] = 0.0
+                        solver.get_vars(v)[var][cols, cz::3, node // n, node % n] = scale
+                        response = element_major(solver, solver.matvec(v))[cols] / scale
+                        for ki, li in zip(k[valid], l[valid]):
+                            blocks[li - ki + 1, cols, ki, :, var * nn + node] = response[:, ki]
+
+        self.J_lower, self.J_diag, self.J_upper = blocks
+        self.solve_c = None
+        self.age = 0
+
+    def factorise(self, c):
+        # block LU of I - c J, kept until c changes
+        nz, B = self.J_diag.shape[1:3]
+        eye = np.eye(B)
+        self.inv_diag = np.zeros_like(self.J_diag)
+        self.upper = np.zeros_like(self.J_diag)
+        for k in range(nz):
+            diag = eye - c * self.J_diag[:, k]
+            if k > 0:
+                diag += (c * self.J_lower[:, k]) @ self.upper[:, k - 1]
+            self.inv_diag[:, k] = np.linalg.inv(diag)
+            if k < nz - 1:
+                self.upper[:, k] = self.inv_diag[:, k] @ (-c * self.J_upper[:, k])
+        self.solve_c = c
+
+    def solve(self, solver, r, c):
+        # (I - c J)^-1 r on the prognostic variables, the diagnostic slots of r are passed through
+        if self.solve_c != c:
+            self.factorise(c)
+
+        nz = self.J_diag.shape[1]
+        rhs = element_major(solver, r)[..., None]
+        y = np.zeros_like(rhs)
+        for k in range(nz):
+            r_k = rhs[:, k]
+            if k > 0:
+                r_k = r_k + (c * self.J_lower[:, k]) @ y[:, k - 1]
+            y[:, k] = self.inv_diag[:, k] @ r_k
+        for k in range(nz - 2, -1, -1):
+            y[:, k] -= self.upper[:, k] @ y[:, k + 1]
+
+        out = np.copy(r)
+        set_element_major(solver, out, y)
+        return out
+
+
+def newton_krylov_step(solver, dt, theta=0.5, tol=1e-10, max_iters=10, krylov_rtol=1e-3, max_krylov=50, max_age=20):
+    """
+    Advances solver.state by the theta method y = y0 + dt * (theta * f(y) + (1 - theta) * f(y0)), f = solver.rhs,
+    with Jacobian-free Newton-Krylov. theta=0.5 is the trapezoidal rule, theta=1 backward Euler. Each Newton
+    iterate is limited with check_positivity and its thermodynamic variables are rediagnosed by rhs. The Newton
+    corrections are found with GMRES on matrix-free products, preconditioned by a ColumnPreconditioner that is
+    reassembled every max_age steps. The variables are scaled by their magnitudes in the Newton norm and in
+    GMRES. Returns the number of Newton iterations.
+    """
+    from scipy.sparse.linalg import LinearOperator, gmres
+
+    if solver.nprocx > 1:
+        raise NotImplementedError("The Newton-Krylov solve needs global inner products and runs on one process")
+
+    dt = float(dt)
+    c = theta * dt
+    y = solver.state
+    y0 = np.copy(y)
+
+    solver.linearise(y)
+    # each prognostic slot is scaled by the magnitude of its variable, the diagnostic slots are left as they are
+    weights = np.ones_like(y)
+    for var, arr in enumerate(solver.get_vars(weights)[:solver.nprognostic]):
+        arr[:] = solver.linear_scale[var]
+    explicit = (1 - theta) * dt * solver.linear_rhs
+
+    precond = getattr(solver, 'implicit_preconditioner', None)
+    if precond is None or precond.age >= max_age:
+        with solver.profiler.region('preconditioner'):
+            precond = solver.implicit_preconditioner = ColumnPreconditioner()
+            precond.assemble(solver)
+    precond.age += 1
+
+    nkrylov = 0
+
+    def count(_):
+        nonlocal nkrylov
+        nkrylov += 1
+
+    A = LinearOperator(solver.shape, matvec=lambda x: x - c * solver.matvec(weights * x) / weights, dtype=solver.dtype)
+    M = LinearOperator(solver.shape, matvec=lambda x: precond.solve(solver, weights * x, c) / weights, dtype=solver.dtype)
+
+    for it in range(max_iters + 1):
+        residual = (y - y0 - c * solver.linear_rhs - explicit) / weights
+        for arr in solver.get_vars(residual)[solver.nprognostic:]:
+            arr[:] = 0.0
+        if abs(residual).max() <= tol:
+            break
+        if it == max_iters:
+            raise RuntimeError(f"Error: Newton-Krylov solve not converged at t={solver.time}.")
+
+        with solver.profiler.region('gmres'):
+            delta, _ = gmres(A, -residual, rtol=krylov_rtol, restart=max_krylov, maxiter=1, M=M, callback=count, callback_type='pr_norm')
+        for arr, darr in zip(solver.get_vars(y)[:solver.nprognostic], solver.get_vars(weights * delta)):
+            arr += darr
+
+        solver.check_positivity(y)
+        solver.linearise(y)
+
+    solver.set_thermo_vars(y)
+    solver.profiler.count('jfnk_newton_iterations', it)
+    solver.profiler.count('jfnk_krylov_iterations', nkrylov)
+    return it
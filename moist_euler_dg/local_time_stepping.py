@@ -0,0 +1,205 @@
+import numpy as np
+
+
+def cell_tiers(solver, dt=None, max_tiers=4):
+    # tier of each cell for a local time step of dt, tier k cells take steps of dt / 2 ** k within their get_cell_dt
+    # limit. By default dt is the power of two multiple of get_dt, within max_tiers tiers, with the fewest cell
+    # steps per unit time. Neighbouring cells, across the periodic seam too, differ by at most one tier, cells are
+    # moved to the finer tier
+    cell_dt = solver.get_cell_dt()
+    if dt is None:
+        candidates = [cell_dt.min() * 2 ** m for m in range(max_tiers)]
+        # a tier k cell is stepped with each of the tiers 0 to k
+        cost = [(2 ** (cell_tiers(solver, dt, max_tiers)[1] + 1) - 1).sum() / dt for dt in candidates]
+        dt = candidates[int(np.argmin(cost))]
+    dt = float(dt)
+
+    tiers = np.maximum(np.ceil(np.log2(dt / cell_dt) - 1e-12), 0).astype(int)
+    while True:
+        neighbours = np.stack([np.roll(tiers, 1, axis=0), np.roll(tiers, -1, axis=0), tiers, tiers])
+        neighbours[2, :, 1:] = tiers[:, :-1]
+        neighbours[3, :, :-1] = tiers[:, 1:]
+        smoothed = np.maximum(tiers, neighbours.max(axis=0) - 1)
+        if np.array_equal(smoothed, tiers):
+            break
+        tiers = smoothed
+
+    if tiers.max() >= max_tiers:
+        raise ValueError(f"A step of {dt} needs {tiers.max() + 1} tiers, more than max_tiers={max_tiers}")
+
+    return dt, tiers
+
+
+def node_mask(solver, cells):
+    # cells (nx, nz) as a mask of the state
+    mask = np.zeros(solver.state.shape, dtype=bool)
+    solver.unflatten(mask)[:] = cells[None, :, :, None, None]
+    return mask
+
+
+def level_ranges(cells):
+    # first and last level of cells (nx, nz) in each column counted from 1, 0 for the columns without any, as int32
+    # for the compiled kernels
+    nz = cells.shape[1]
+    found = cells.any(axis=1)
+    first = np.where(found, cells.argmax(axis=1) + 1, 0)
+    last = np.where(found, nz - cells[:, ::-1].argmax(axis=1), 0)
+    return first.astype(np.int32), last.astype(np.int32)
+
+
+def halo_cells(cells):
+    # the cells outside cells sharing a face with them, across the periodic seam too
+    halo = np.roll(cells, 1, axis=0) | np.roll(cells, -1, axis=0)
+    halo[:, 1:] |= cells[:, :-1]
+    halo[:, :-1] |= cells[:, 1:]
+    return halo & ~cells
+
+
+def interface_faces(tiers, k):
+    # faces between tier k and another tier, the bottom face of each cell above the first level (nx, nz - 1) and
+    # the left face of each column (nx, nz)
+    faces_z = (tiers[:, 1:] == k) != (tiers[:, :-1] == k)
+    faces_x = (tiers == k) != (np.roll(tiers, 1, axis=0) == k)
+    return faces_z, faces_x
+
+
+def face_mass_fluxes(solver, state, faces):
+    # solver.mass_flux through the face nodes of faces from interface_faces, (nfaces, n) for either direction
+    s = solver.unflatten(state)
+    i, j = np.nonzero(faces[0])
+    Fz = solver.mass_flux(s[:, i, j + 1][..., 0], s[:, i, j][..., -1], 'z', (i, j + 1, slice(None), 0))
+    i, j = np.nonzero(faces[1])
+    Fx = solver.mass_flux(s[:, i, j][..., 0, :], s[:, i - 1, j][..., -1, :], 'x', (i, j, 0, slice(None)))
+    return Fz, Fx
+
+
+def reflux(solver, state, tiers, k, dphi):
+    # the density at the face nodes of tier k cells next to tier k + 1 cells takes the time integrated flux of the
+    # finer side, dphi the finer minus the tier k time integrated flux through each face
+    h = solver.unflatten(state)[2]
+    wz = solver.weights_z[-1]
+    dphi_z, dphi_x = dphi
+
+    coarse_p = (tiers[:, 1:] == k) & (tiers[:, :-1] == k + 1)
+    coarse_m = (tiers[:, 1:] == k + 1) & (tiers[:, :-1] == k)
+    h[:, 1:, :, 0] += coarse_p[..., None] * dphi_z / wz
+    h[:, :-1, :, -1] -= coarse_m[..., None] * dphi_z / wz
+
+    left = np.roll(tiers, 1, axis=0)
+    coarse_p = (tiers == k) & (left == k + 1)
+    coarse_m = (tiers == k + 1) & (left == k)
+    h[:, :, 0, :] += coarse_p[..., None] * dphi_x / wz
+    h[:, :, -1, :] -= np.roll(coarse_m[..., None] * dphi_x, -1, axis=0) / wz
+
+
+class Tier():
+    # the cells, state nodes and faces the step of tier k works on: the active cells of tier k and finer, the
+    # coarser cells next to them that are interpolated in time, and the faces between tier k and the other tiers
+
+    def __init__(self, solver, tiers, k):
+        self.active = tiers >= k
+        halo = halo_cells(self.active)
+        self.changed = self.active | halo
+        self.nodes = slice(None) if self.active.all() else np.flatnonzero(node_mask(solver, self.active))
+        self.halo_nodes = np.flatnonzero(node_mask(solver, halo))
+        self.faces = interface_faces(tiers, k)
+        # the state at the start of the step, the tendency, and the tendency at the start and the state at the end
+        # of the step for the interpolation in the finer steps
+        self.y0, self.ddt, self.dydt0, self.new = (np.empty_like(solver.state) for _ in range(4))
+
+
+def advance_tier(solver, tiers, levels, k, dt, t0, coarse=None, phi_out=None, forcing=True):
+    # one SSP-RK step of dt from t0 of the cells of tier k and finer, followed by two steps of dt / 2 of the finer
+    # tiers. levels holds the Tier of each tier. coarse = (old, dydt0, new, t_start, dt_coarse) holds the coarser
+    # states next to the active ones at either end of the coarser step and their tendency at the start, they are
+    # interpolated by the quadratic through them at the stage times. The time integrated mass fluxes through the
+    # faces between tier k and the other tiers are added to phi_out. The stages are taken in solver.state, on the
+    # active nodes only
+    state = solver.state
+    tier = levels[k]
+    nodes = tier.nodes
+
+    phi = [np.zeros(sel.shape + (solver.order + 1,)) for sel in tier.faces]
+    y0, ddt = tier.y0, tier.ddt
+    y0[nodes] = state[nodes]
+
+    def rhs(c, b, consistent):
+        if coarse is not None:
+            old, dydt0, new, t_start, dt_coarse = coarse
+            theta = (t0 + c * dt - t_start) / dt_coarse
+            halo = tier.halo_nodes
+            slope = dt_coarse * dydt0[halo]
+            state[halo] = old[halo] + theta * slope + theta ** 2 * (new[halo] - old[halo] - slope)
+            consistent = False
+        if not consistent:
+            solver.check_positivity(state)
+            solver.set_thermo_vars_active(state, tier.changed)
+
+        solver.solve_active(state, ddt, tier.active)
+        solver.apply_forcing(state, ddt, forcing)
+
+        for acc, sel, F in zip(phi, tier.faces, face_mass_fluxes(solver, state, tier.faces)):
+            acc[sel] += b * dt * F
+        return ddt[nodes]
+
+    with solver.profiler.region('lts_tier'):
+        y = y0[nodes]
+        k1 = rhs(0.0, 1 / 6, True)
+        if k + 1 < len(levels):
+            halo = levels[k + 1].halo_nodes
+            tier.dydt0[halo] = ddt[halo]
+        state[nodes] = y + 0.5 * dt * k1
+        k2 = rhs(0.5, 1 / 6, False)
+        state[nodes] += 0.5 * dt * k2
+        k3 = rhs(1.0, 1 / 6, False)
+        state[nodes] = (2 / 3) * y + (1 / 3) * state[nodes] + (1 / 6) * dt * k3
+        k4 = rhs(0.5, 1 / 2, False)
+        state[nodes] += 0.5 * dt * k4
+
+        solver.check_positivity(state)
+        solver.set_thermo_vars_active(state, tier.active)
+    solver.profiler.count('lts_cell_steps', int(tier.active.sum()))
+
+    if k + 1 < len(levels):
+        finer = levels[k + 1]
+        new = tier.new
+        new[finer.halo_nodes] = state[finer.halo_nodes]
+        state[finer.nodes] = y0[finer.nodes]
+
+        phi_fine = [np.zeros_like(arr) for arr in phi]
+        for half in range(2):
+            advance_tier(
+                solver, tiers, levels, k + 1, 0.5 * dt, t0 + half * 0.5 * dt, (y0, tier.dydt0, new, t0, dt), phi_fine,
+                forcing
+            )
+
+        # the tier k cells next to the finer ones hold the interpolated states of the finer steps
+        state[finer.halo_nodes] = new[finer.halo_nodes]
+        reflux(solver, state, tiers, k, [fine - own for fine, own in zip(phi_fine, phi)])
+        solver.check_positivity(state)
+        solver.set_thermo_vars_active(state, tier.active)
+
+    if phi_out is not None:
+        for acc, arr in zip(phi_out, phi):
+            acc += arr
+
+
+def local_time_step(solver, dt=None, max_tiers=4, forcing=True):
+    """
+    Advances solver.state by dt with each cell stepping at the rate of its tier from cell_tiers, tier k taking
+    2 ** k SSP-RK steps of dt / 2 ** k. A tier is stepped together with the finer cells, which are then reset and
+    stepped twice at half the step, the coarser cells next to them interpolated in time by the quadratic through
+    their states either side of the step and their tendency at the start. The density at the faces between tiers is corrected to the time integrated flux of the finer
+    side, so the mass is conserved as in time_step. Returns dt and the tiers.
+    """
+    if solver.nprocx > 1:
+        raise NotImplementedError("Local time stepping smooths the tiers across the periodic seam and runs on one process")
+
+    dt, tiers = cell_tiers(solver, dt, max_tiers)
+    # the tiers only depend on the mesh and dt, so the plan is kept for the next step of the same size
+    plan = getattr(solver, 'local_time_step_plan', None)
+    if plan is None or plan[0] != dt or not np.array_equal(plan[1], tiers):
+        plan = solver.local_time_step_plan = (dt, tiers, [Tier(solver, tiers, k) for k in range(tiers.max() + 1)])
+    levels = plan[2]
+    advance_tier(solver, tiers, levels, 0, dt, 0.0, forcing=forcing)
+    return dt, tiers
@@ -0,0 +1,45 @@
+# mpi4py is imported on first use, so serial runs, plotting and post-processing do not initialise MPI
+
+
+class SerialComm():
+    # the part of the mpi4py communicator interface used by the solvers, for a single process
+
+    def Get_rank(self):
+        return 0
+
+    def Get_size(self):
+        return 1
+
+    def Barrier(self):
+        pass
+
+    barrier = Barrier
+
+    def bcast(self, obj, root=0):
+        return obj
+
+    def allgather(self, obj):
+        return [obj]
+
+    def reduce(self, obj, op=None, root=0):
+        return obj
+
+    def allreduce(self, obj, op=None):
+        return obj
+
+
+class SerialMPI():
+    # stands in for the mpi4py.MPI module, reductions over one process return their input whatever the op
+    SUM = 'sum'
+    MIN = 'min'
+    MAX = 'max'
+    LAND = 'land'
+    COMM_WORLD = SerialComm()
+
+
+def get_mpi(serial=False):
+    # SerialMPI for a solver on a single process, otherwise mpi4py.MPI
+    if serial:
+        return SerialMPI
+    from mpi4py import MPI
+    return MPI
@@ -0,0 +1,128 @@
+import time
+import json
+import csv
+
+
+class NullRegion():
+    # returned by a disabled profiler so instrumented code pays for a single attribute lookup
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+null_region = NullRegion()
+
+
+class Region():
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.stack.append(self.name)
+        self.path = '/'.join(self.profiler.stack)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.t0
+        self.profiler.stack.pop()
+        self.profiler.add_time(self.path, elapsed)
+        return False
+
+
+class Profiler():
+    """
+    Named, nestable wall clock timers and event counters.
+
+    Timers are keyed by their nesting path, e.g. 'time_step/solve/mpi_recv'. The
+    summary is reduced over all ranks of `comm` and reports the min, max and mean
+    across ranks.
+    """
+
+    def __init__(self, enabled=False, comm=None):
+        self.enabled = enabled
+        self.comm = comm
+        self.reset()
+
+    def reset(self):
+        self.stack = []
+        self.timers = {}
+        self.counters = {}
+
+    def region(self, name):
+        if not self.enabled:
+            return null_region
+        return Region(self, name)
+
+    def add_time(self, name, seconds, calls=1):
+        entry = self.timers.setdefault(name, [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        # collective - must be called on every rank
+        local = {'timers': self.timers, 'counters': self.counters}
+        if self.comm is None:
+            gathered = [local]
+        else:
+            gathered = self.comm.allgather(local)
+
+        rows = []
+        for kind in ['timers', 'counters']:
+            names = sorted(set().union(*(data[kind].keys() for data in gathered)))
+            for name in names:
+                if kind == 'timers':
+                    calls = [data[kind].get(name, [0, 0.0])[0] for data in gathered]
+                    values = [data[kind].get(name, [0, 0.0])[1] for data in gathered]
+                else:
+                    calls = [0 for _ in gathered]
+                    values = [data[kind].get(name, 0) for data in gathered]
+                rows.append({
+                    'name': name,
+                    'kind': kind[:-1],
+                    'calls': max(calls),
+                    'min': min(values),
+                    'max': max(values),
+                    'mean': sum(values) / len(values),
+                    'total': sum(values),
+                    'nranks': len(values),
+                })
+
+        return rows
+
+    def report(self):
+        rows = self.summary()
+        lines = [f"{'name':<48} {'kind':<8} {'calls':>8} {'min':>12} {'max':>12} {'mean':>12}"]
+        for row in rows:
+            lines.append(
+                f"{row['name']:<48} {row['kind']:<8} {row['calls']:>8} "
+                f"{row['min']:>12.5g} {row['max']:>12.5g} {row['mean']:>12.5g}"
+            )
+        return '\n'.join(lines)
+
+    def save(self, fp, metadata=None):
+        # collective - the report is written by rank 0 as json or csv depending on the extension
+        rows = self.summary()
+        rank = 0 if self.comm is None else self.comm.Get_rank()
+        if rank != 0:
+            return rows
+
+        if fp.endswith('.csv'):
+            with open(fp, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ['name'])
+                writer.writeheader()
+                writer.writerows(rows)
+        else:
+            with open(fp, 'w') as f:
+                json.dump({'metadata': metadata or {}, 'regions': rows}, f, indent=2)
+
+        return rows
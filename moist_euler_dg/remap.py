@@ -0,0 +1,95 @@
+import numpy as np
+from moist_euler_dg import utils
+
+
+def lagrange_basis(order, r):
+    # (len(r), order + 1) values of the GLL Lagrange basis at the reference points r in [-1, 1]
+    nodes, _ = utils.gll(order, iterative=True)
+    return np.stack([utils.lagrange(order, i, r, nodes) for i in range(-1, order)], axis=-1)
+
+
+def locate(coord, centre, ncell):
+    # source cell index and reference coordinate in [-1, 1] of global reference coordinates in [0, 1]. Nodes on
+    # a cell face take the source cell on the side of their own cell centre
+    cell = np.clip(np.floor((coord + 1e-6 * (centre - coord)) * ncell).astype(int), 0, ncell - 1)
+    return cell, 2 * (coord * ncell - cell) - 1
+
+
+def source_zetas(source, target, zetas, iters=60):
+    # vertical reference coordinates of source at the same heights as the target reference coordinates zetas.
+    # The solvers share xmap and zmap but each places its levels with its own z_stretch, which is inverted by
+    # bisection
+    stretched = zetas if target.z_stretch is None else target.z_stretch(zetas)
+    if source.z_stretch is None:
+        return stretched
+
+    lo, hi = np.zeros_like(stretched), np.ones_like(stretched)
+    for _ in range(iters):
+        mid = 0.5 * (lo + hi)
+        below = source.z_stretch(mid) < stretched
+        lo = np.where(below, mid, lo)
+        hi = np.where(below, hi, mid)
+    return 0.5 * (lo + hi)
+
+
+def interpolate(source, fields, target):
+    # evaluate the source polynomials of fields, each of shape source.xs.shape, at the target nodes. Both solvers
+    # share the horizontal reference coordinate in [0, 1], target may be one rank of a decomposed domain
+    zetas = source_zetas(source, target, target.zetas)
+    centres = source_zetas(source, target, target.zetas.mean(axis=(2, 3), keepdims=True))
+    ix, rx = locate(target.xis, target.xis.mean(axis=(2, 3), keepdims=True), source.nx)
+    iz, rz = locate(zetas, centres, source.nz)
+    Lx, Lz = lagrange_basis(source.order, rx.ravel()), lagrange_basis(source.order, rz.ravel())
+    ix, iz = ix.ravel(), iz.ravel()
+    return [np.einsum('pa,pb,pab->p', Lx, Lz, field[ix, iz]).reshape(target.xs.shape) for field in fields]
+
+
+def local_integral(solver, q):
+    return (solver.J * solver.weights2D[None, None] * q).sum()
+
+
+def remap(source, target):
+    """
+    Sets the state of target from that of source, a solver with a different nx, nz, order or z_edges on the same
+    geometry.
+    The velocities and the densities h, h * s, h * q are interpolated exactly with the source Lagrange basis,
+    then the mass and water are rescaled to the source totals. source covers the whole domain (nprocx=1) and
+    is read by every rank, each rank of a decomposed target remaps its own columns.
+    """
+    nprog = source.nprognostic
+    vars_in = source.get_vars(source.state)
+    u, w = source.cov_to_phy(vars_in[0], vars_in[1])
+    h = vars_in[2]
+    fields = [u, w, h] + [h * tracer for tracer in vars_in[3:nprog]]
+
+    u_out, w_out, h_out, *tracers_out = interpolate(source, fields, target)
+
+    # interpolation conserves only under refinement, restore the totals of the source
+    comm = target.comm
+    mass = local_integral(source, h)
+    h_scale = mass / comm.allreduce(local_integral(target, h_out), op=target.mpi.SUM)
+    h_out *= h_scale
+    for tracer_out in tracers_out:
+        tracer_out *= h_scale
+
+    if nprog > 4:
+        water = local_integral(source, h * vars_in[4])
+        tracers_out[1] *= water / comm.allreduce(local_integral(target, tracers_out[1]), op=target.mpi.SUM)
+
+    tracers_out = [tracer_out / h_out for tracer_out in tracers_out]
+    if nprog > 4:
+        # overshoots of h * q are limited towards the cell means, which keeps the water total
+        _, _, status = target.limit_water(h_out, tracers_out[1])
+        if status != 0:
+            raise RuntimeError("Negative water after remapping")
+
+    target.set_initial_condition(u_out, w_out, h_out, *tracers_out)
+
+
+def load_remapped(target, filepaths, nx, nz, order, xmap, zmap, **kwargs):
+    # remap a checkpoint written at (nx, nz, order), one file or all the parts of a decomposed run, onto target.
+    # xmap, zmap and kwargs such as z_edges must describe the geometry of the run that wrote it
+    source = type(target)(xmap, zmap, order, nx, target.g, nz=nz, nprocx=1, **kwargs)
+    source.load(filepaths)
+    remap(source, target)
+    return source
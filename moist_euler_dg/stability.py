@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def amplification_factor(z):
+    # growth of one time_step of dy/dt = lambda y, z = lambda * dt, the SSP-RK(4,3) stages in time_step order
+    u1 = 1 + 0.5 * z
+    u2 = u1 * (1 + 0.5 * z)
+    u3 = 2 / 3 + u2 * (1 / 3 + z / 6)
+    return u3 * (1 + 0.5 * z)
+
+
+def stability_radius(angle, rmax=8.0, samples=8000, iters=60):
+    # distance from the origin to the edge of the stability region along the ray z = r exp(i angle), the first
+    # crossing of |amplification_factor| = 1 on a sampled ray refined by bisection
+    direction = np.exp(1j * angle)
+    r = np.linspace(0.0, rmax, samples + 1)[1:]
+    unstable = abs(amplification_factor(r * direction)) > 1.0
+    if not unstable.any():
+        return rmax
+    i = int(np.argmax(unstable))
+    lo, hi = (r[i - 1] if i > 0 else 0.0), r[i]
+    for _ in range(iters):
+        mid = 0.5 * (lo + hi)
+        if abs(amplification_factor(mid * direction)) > 1.0:
+            hi = mid
+        else:
+            lo = mid
+    return lo
+
+
+def scaled_vector(solver, x):
+    # the prognostic variables of x divided by solver.linear_scale as one vector
+    return np.concatenate([
+        arr.ravel() / scale for arr, scale in zip(solver.get_vars(x)[:solver.nprognostic], solver.linear_scale)
+    ])
+
+
+def unscaled_state(solver, y):
+    x = np.zeros_like(solver.state)
+    parts = np.split(y, solver.nprognostic)
+    for arr, scale, part in zip(solver.get_vars(x)[:solver.nprognostic], solver.linear_scale, parts):
+        arr[:] = scale * part.reshape(arr.shape)
+    return x
+
+
+def ritz_values(solver, state=None, krylov_dim=30, seed=0):
+    # Ritz values of the jacobian of solver.rhs about state (the current state by default) from krylov_dim
+    # Arnoldi iterations on solver.matvec. The variables are scaled by solver.linear_scale so no variable
+    # dominates the inner products, which leaves the eigenvalues unchanged
+    solver.linearise(state)
+
+    def dot(a, b):
+        value = np.dot(a, b)
+        if solver.nprocx > 1:
+            value = solver.comm.allreduce(value, op=solver.mpi.SUM)
+        return value
+
+    v = np.random.default_rng(seed + solver.rank if solver.nprocx > 1 else seed).standard_normal(
+        solver.nprognostic * solver.h.size
+    )
+    basis = [v / np.sqrt(dot(v, v))]
+    H = np.zeros((krylov_dim + 1, krylov_dim))
+    for j in range(krylov_dim):
+        w = scaled_vector(solver, solver.matvec(unscaled_state(solver, basis[j])))
+        solver.profiler.count('stability_arnoldi_iterations')
+        # modified Gram-Schmidt, repeated once for the orthogonality lost to cancellation
+        for _ in range(2):
+            for i in range(j + 1):
+                coeff = dot(basis[i], w)
+                H[i, j] += coeff
+                w -= coeff * basis[i]
+        H[j + 1, j] = np.sqrt(dot(w, w))
+        # an invariant subspace, its Ritz values are eigenvalues
+        if H[j + 1, j] <= 1e-12 * abs(H[:j + 1, j]).max():
+            return np.linalg.eigvals(H[:j + 1, :j + 1])
+        basis.append(w / H[j + 1, j])
+
+    return np.linalg.eigvals(H[:krylov_dim, :krylov_dim])
+
+
+def max_stable_dt(solver, state=None, krylov_dim=30, safety=0.9):
+    """
+    Estimates the largest step of time_step that is linearly stable about state (the current state by default).
+    Each Ritz value lambda of the jacobian of rhs from ritz_values limits the step to the stability radius of
+    SSP-RK(4,3) along the direction of lambda divided by |lambda|. Ritz values with a positive real part, the
+    buoyancy modes and the round off of the finite difference jacobian, are limited along the imaginary axis.
+    The Ritz values of a few Arnoldi iterations are within a few percent of the extreme eigenvalues, hence the
+    safety factor.
+    Returns the smallest limit, np.inf for a state with a zero jacobian.
+    """
+    with solver.profiler.region('stability_estimate'):
+        ritz = ritz_values(solver, state, krylov_dim)
+        ritz = ritz[abs(ritz) > 0]
+        if ritz.size == 0:
+            return np.inf
+
+        angles = np.clip(abs(np.angle(ritz)), 0.5 * np.pi, np.pi)
+        dt = min(stability_radius(angle) / abs(value) for angle, value in zip(angles, ritz))
+
+    return safety * dt
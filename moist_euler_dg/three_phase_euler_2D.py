@@ -5,6 +5,7 @@ from moist_euler_dg.two_phase_euler_2D import TwoPhaseEuler2D
 class ThreePhaseEuler2D(TwoPhaseEuler2D):
 
     nvars = 9
+    moisture_fraction_names = ('qv', 'ql', 'qi')
 
     def __init__(self, *args, **kwargs):
         TwoPhaseEuler2D.__init__(self, *args, **kwargs)
@@ -54,6 +55,15 @@ class ThreePhaseEuler2D(TwoPhaseEuler2D):
         self.c1 = self.cl + (self.Lf0 / self.T0) - self.cl * self.logT0
         self.c2 = self.ci - self.ci * self.logT0
 
+    def get_restart_data(self):
+        data = TwoPhaseEuler2D.get_restart_data(self)
+        data['qi'] = self.qi
+        return data
+
+    def set_restart_data(self, data):
+        TwoPhaseEuler2D.set_restart_data(self, data)
+        self.qi[:] = data['qi']
+
     def entropy_vapour(self, T, qv, density, np=np):
         # s = cvv * log(T / T0) - Rv * log(h / h0) + cpv + (Ls0 / T0)
         # c0 = cpv + (Ls0 / T0) - cvv * logT0 + Rv * log(h0)
@@ -99,6 +109,8 @@ class ThreePhaseEuler2D(TwoPhaseEuler2D):
         return self.cpd * T - T * self.cvd * np.log(T) + self.Rd * T * np.log(h * self.Rd)
 
     def get_thermodynamic_quantities(self, density, entropy, qw, update_cache=False, use_cache=False):
+        # the Gibbs Newton solve takes logs of fractions near 1e-15 so always runs in float64
+        density, entropy, qw = self.promote(density), self.promote(entropy), self.promote(qw)
 
         qd = 1 - qw
 
@@ -240,7 +252,7 @@ class ThreePhaseEuler2D(TwoPhaseEuler2D):
         has_liquid = (ql > 0) * 0.0
 
         def _newton_loop(density, qw, entropy, logdensity, is_solved, has_liquid, qd, qv, ql, qi):
-            for _ in range(iters):
+            for it in range(iters):
 
                 # solve for temperature and pv
                 R = qv * self.Rv + qd * self.Rd
@@ -327,6 +339,8 @@ class ThreePhaseEuler2D(TwoPhaseEuler2D):
                 if rel_update < tol:
                     break
 
+            self.profiler.count('newton_iterations', (it + 1) * qv.size)
+
             # could be issue with only vapour -- not converged?
             qv = np.minimum(qv, qw)
             qi = is_solved * qi + frozen * (qw - qv)
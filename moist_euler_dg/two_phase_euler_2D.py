@@ -1,10 +1,15 @@
 import numpy as np
 from moist_euler_dg.euler_2D import Euler2D
+from moist_euler_dg import implicit, local_time_stepping, stability
 
 
 class TwoPhaseEuler2D(Euler2D):
 
     nvars = 9
+    nprognostic = 5
+    splittings = ('strang', 'lie', 'hold')
+    supported_top_bcs = ('wall', 'outflow')
+    moisture_fraction_names = ('qv', 'ql')
 
     def __init__(self, *args, **kwargs):
         Euler2D.__init__(self, *args, **kwargs)
@@ -43,90 +48,305 @@ class TwoPhaseEuler2D(Euler2D):
 
         self.first_water_limit_time = None
 
+        # node masses and inverse cell masses for the positivity limiter
+        self.cell_mass = self.weights2D[None, None] * self.J
+        self.inv_cell_mass = 1 / self.cell_mass.sum(axis=(2, 3))
+        self.limited_cells = 0
+        self.forcing_ready = False
+
     def set_initial_condition(self, *vars_in):
         Euler2D.set_initial_condition(self, *vars_in)
         self.set_thermo_vars(self.state, use_cache=False) # don't use cached moisture fractions - they don't exist yet!
+        self.top_reference = np.copy(self.get_boundary_data(self.state, self.im_vert_ext))
+        # the forcings take their default references (e.g. of RayleighDamping) from the initial condition rather
+        # than from the state of the first step, which may have been loaded from a restart
+        if self.forcing is not None:
+            self.forcing_ready = False
+            self.setup_forcing()
 
     def set_thermo_vars(self, state, use_cache=True):
-        u, w, h, s, qw, T, mu, p, ie = self.get_vars(state)
-        enthalpy_, T_, p_, ie_, mu_, qv_, ql_ = self.get_thermodynamic_quantities(h, s, qw, update_cache=True, use_cache=use_cache)
-        T[:] = T_
-        mu[:] = mu_
-        p[:] = p_
-        ie[:] = ie_
+        with self.profiler.region('thermodynamics'):
+            u, w, h, s, qw, T, mu, p, ie = self.get_vars(state)
+            enthalpy_, T_, p_, ie_, mu_, qv_, ql_ = self.get_thermodynamic_quantities(h, s, qw, update_cache=True, use_cache=use_cache)
+            T[:] = T_
+            mu[:] = mu_
+            p[:] = p_
+            ie[:] = ie_
+
+    def set_thermo_vars_active(self, state, active):
+        # set_thermo_vars where active (nx, nz) is True, elsewhere the thermodynamic variables may be left stale.
+        # The cached moisture fractions are swapped for those of the active cells during the solve
+        if active.all():
+            return self.set_thermo_vars(state)
+
+        with self.profiler.region('thermodynamics'):
+            u, w, h, s, qw, T, mu, p, ie = self.get_vars(state)
+            fractions = self.moisture_fractions()
+            for name, arr in zip(self.moisture_fraction_names, fractions):
+                setattr(self, name, arr[active])
+            try:
+                enthalpy_, T_, p_, ie_, mu_, qv_, ql_ = self.get_thermodynamic_quantities(
+                    h[active], s[active], qw[active], update_cache=True, use_cache=True
+                )
+                active_fractions = self.moisture_fractions()
+            finally:
+                for name, arr in zip(self.moisture_fraction_names, fractions):
+                    setattr(self, name, arr)
+
+            for arr, values in zip(fractions + [T, mu, p, ie], active_fractions + [T_, mu_, p_, ie_]):
+                arr[active] = values
+
+    def get_restart_data(self):
+        # the moisture fractions are the initial guesses of the next thermodynamic solve
+        data = Euler2D.get_restart_data(self)
+        data['qv'] = self.qv
+        data['ql'] = self.ql
+        data['first_water_limit_time'] = np.nan if self.first_water_limit_time is None else self.first_water_limit_time
+        data['limited_cells'] = self.limited_cells
+        if hasattr(self, 'top_reference'):
+            data['top_reference'] = self.top_reference
+        if self.forcing is not None and self.forcing_ready:
+            data.update({f'forcing_{name}': value for name, value in self.forcing.get_restart_data().items()})
+        return data
+
+    def set_restart_data(self, data):
+        Euler2D.set_restart_data(self, data)
+        self.qv[:] = data['qv']
+        self.ql[:] = data['ql']
+        first_water_limit_time = float(data['first_water_limit_time'])
+        self.first_water_limit_time = None if np.isnan(first_water_limit_time) else first_water_limit_time
+        self.limited_cells = int(data['limited_cells'])
+        if 'top_reference' in data:
+            self.top_reference = np.copy(data['top_reference'])
+        forcing_data = {name[8:]: value for name, value in data.items() if name.startswith('forcing_')}
+        if self.forcing is not None and forcing_data:
+            self.setup_forcing()
+            self.forcing.set_restart_data(forcing_data)
+
+    def setup_forcing(self):
+        # static forcing fields are precomputed once, from the fully constructed solver
+        if not self.forcing_ready:
+            self.forcing.setup(self)
+            self.forcing_ready = True
+
+    def apply_forcing(self, state, dstatedt, forcing=True):
+        # forcing=True evaluates the forcings, False skips them and an array is added as a held tendency
+        if forcing is False or self.forcing is None:
+            return
+        with self.profiler.region('forcing'):
+            if forcing is True:
+                self.setup_forcing()
+                self.forcing.apply(self, state, dstatedt)
+            else:
+                dstatedt += forcing
+
+    def split_forcing_step(self, state, dt):
+        # split forcings (e.g. implicit vertical diffusion) are advanced after the dynamics step
+        if self.forcing is not None and self.forcing.split:
+            with self.profiler.region('forcing'):
+                self.setup_forcing()
+                self.forcing.split_step(self, state, dt)
+            self.set_thermo_vars(state)
+
+    def moisture_fractions(self):
+        # cached moisture fractions, the initial guesses of the thermodynamic solves
+        return [getattr(self, name) for name in self.moisture_fraction_names]
+
+    def rhs(self, state, dstatedt=None, forcing=True):
+        # the thermodynamic variables are rediagnosed from the prognostic ones of a copy of state, and the
+        # moisture caches are restored after, so rhs is a function of the prognostic variables only
+        state = np.copy(state)
+        caches = [np.copy(arr) for arr in self.moisture_fractions()]
+
+        self.set_thermo_vars(state)
+        dstatedt = self.solve(state, dstatedt=dstatedt)
+        self.apply_forcing(state, dstatedt, forcing)
+
+        for arr, cache in zip(self.moisture_fractions(), caches):
+            arr[:] = cache
+        return dstatedt
 
-    def time_step(self, dt=None):
+    def time_step(self, dt=None, forcing=True):
 
         if dt is None:
             dt = self.get_dt()
+        # a python float keeps the stage updates in the working precision
+        dt = float(dt)
 
         k = self.private_working_arrays[1]
         u_tmp = self.private_working_arrays[2]
 
-        self.solve(self.state, dstatedt=k)
-        if self.forcing is not None:
-            self.forcing(self, self.state, k)
+        with self.profiler.region('time_step'):
+            self.solve(self.state, dstatedt=k)
+            self.apply_forcing(self.state, k, forcing)
+
+            u_tmp[:] = self.state + 0.5 * dt * k
+            self.check_positivity(u_tmp)
+            self.set_thermo_vars(u_tmp)
+            self.solve(u_tmp, dstatedt=k)
+            self.apply_forcing(u_tmp, k, forcing)
+
+            u_tmp[:] = u_tmp[:] + 0.5 * dt * k
+            self.check_positivity(u_tmp)
+            self.set_thermo_vars(u_tmp)
+            self.solve(u_tmp, dstatedt=k)
+            self.apply_forcing(u_tmp, k, forcing)
+
+            u_tmp[:] = (2 / 3) * self.state + (1 / 3) * u_tmp[:] + (1 / 6) * dt * k
+            self.check_positivity(u_tmp)
+            self.set_thermo_vars(u_tmp)
+            self.solve(u_tmp, dstatedt=k)
+            self.apply_forcing(u_tmp, k, forcing)
+
+            self.state[:] = u_tmp + 0.5 * dt * k
+            self.check_positivity(self.state)
+            self.set_thermo_vars(self.state)
+            if forcing is True:
+                self.split_forcing_step(self.state, dt)
+
+        self.time += dt
+
+    def advance(self, nsteps, dt=None, forcing=True):
+        # nsteps time steps with a fixed step size
+        if dt is None:
+            dt = self.get_dt()
+
+        for _ in range(nsteps):
+            self.time_step(dt, forcing=forcing)
+
+    def implicit_time_step(self, dt, theta=0.5, **kwargs):
+        # one theta method step by Jacobian-free Newton-Krylov, dt is not limited by the acoustic CFL of get_dt.
+        # The forcings are in the implicit residual and split forcings are advanced after it. kwargs are passed
+        # to implicit.newton_krylov_step, returns the number of Newton iterations
+        with self.profiler.region('implicit_step'):
+            niter = implicit.newton_krylov_step(self, dt, theta=theta, **kwargs)
+            self.split_forcing_step(self.state, dt)
+
+        self.time += dt
+        return niter
+
+    def local_time_step(self, dt=None, max_tiers=4, forcing=True):
+        # one step of dt with each cell at the rate of its CFL tier, see local_time_stepping.local_time_step. By
+        # default dt is the largest step within max_tiers tiers. Split forcings are advanced after it, returns dt
+        with self.profiler.region('local_time_step'):
+            dt, _ = local_time_stepping.local_time_step(self, dt, max_tiers=max_tiers, forcing=forcing)
+            if forcing is True:
+                self.split_forcing_step(self.state, dt)
+
+        self.time += dt
+        return dt
+
+    def forcing_step(self, dt):
+        # the forcings on their own over dt, without advancing the clock
+        if self.forcing is None:
+            return
+        dt = float(dt)
+
+        k = self.private_working_arrays[1]
+        u_tmp = self.private_working_arrays[2]
+
+        k[:] = 0.0
+        self.apply_forcing(self.state, k)
 
         u_tmp[:] = self.state + 0.5 * dt * k
         self.check_positivity(u_tmp)
         self.set_thermo_vars(u_tmp)
-        self.solve(u_tmp, dstatedt=k)
-        if self.forcing is not None:
-            self.forcing(self, u_tmp, k)
+        k[:] = 0.0
+        self.apply_forcing(u_tmp, k)
 
         u_tmp[:] = u_tmp[:] + 0.5 * dt * k
         self.check_positivity(u_tmp)
         self.set_thermo_vars(u_tmp)
-        self.solve(u_tmp, dstatedt=k)
-        if self.forcing is not None:
-            self.forcing(self, u_tmp, k)
+        k[:] = 0.0
+        self.apply_forcing(u_tmp, k)
 
         u_tmp[:] = (2 / 3) * self.state + (1 / 3) * u_tmp[:] + (1 / 6) * dt * k
         self.check_positivity(u_tmp)
         self.set_thermo_vars(u_tmp)
-        self.solve(u_tmp, dstatedt=k)
-        if self.forcing is not None:
-            self.forcing(self, u_tmp, k)
+        k[:] = 0.0
+        self.apply_forcing(u_tmp, k)
 
         self.state[:] = u_tmp + 0.5 * dt * k
         self.check_positivity(self.state)
         self.set_thermo_vars(self.state)
-
-        self.time += dt
+        self.split_forcing_step(self.state, dt)
 
     def forcing_only_time_step(self, dt=None):
 
         if dt is None:
             dt = self.get_dt()
 
-        k = self.private_working_arrays[1]
-        u_tmp = self.private_working_arrays[2]
-
-        if self.forcing is not None:
-            k[:] = 0.0
-            self.forcing(self, self.state, k)
-
-        u_tmp[:] = self.state + 0.5 * dt * k
-        if self.forcing is not None:
-            k[:] = 0.0
-            self.forcing(self, u_tmp, k)
+        self.forcing_step(dt)
 
-        u_tmp[:] = u_tmp[:] + 0.5 * dt * k
-        if self.forcing is not None:
-            k[:] = 0.0
-            self.forcing(self, u_tmp, k)
+        self.time += dt
 
-        u_tmp[:] = (2 / 3) * self.state + (1 / 3) * u_tmp[:] + (1 / 6) * dt * k
-        if self.forcing is not None:
-            k[:] = 0.0
-            self.forcing(self, u_tmp, k)
+    def get_physics_dt(self, splitting='strang'):
+        # largest stable step of the forcings on their own, inf if none of them limits the step. 'strang' and
+        # 'lie' step the forcings with the SSP-RK(4,3) stages of forcing_step, stable up to stability_radius(pi),
+        # about 5.15, along the negative real axis. 'hold' is a forward Euler step, stable up to 2
+        if self.forcing is None:
+            return np.inf
+
+        self.setup_forcing()
+        radius = 2.0 if splitting == 'hold' else stability.stability_radius(np.pi)
+        dt = self.forcing.max_dt(self, radius)
+        if self.nprocx > 1:
+            dt = self.comm.allreduce(dt, op=self.mpi.MIN)
+        return dt
+
+    def subcycled_forcing_step(self, dt):
+        # forcing_step in as many equal steps as the stability limit of the forcings needs, returns their number
+        nforce = max(1, int(np.ceil(dt / self.get_physics_dt() - 1e-12)))
+        for _ in range(nforce):
+            self.forcing_step(dt / nforce)
+        self.profiler.count('multirate_forcing_steps', nforce)
+        return nforce
+
+    def multirate_step(self, dt=None, nsub=None, max_subcycles=10, splitting='strang'):
+        # one physics step of nsub dynamics steps of size dt. By default nsub is the largest number of dynamics
+        # steps within the stability limit of the forcings, capped at max_subcycles. 'strang' and 'lie' split
+        # the forcings from the dynamics with forcing_step, which is subcycled when the physics step exceeds the
+        # stability limit of the forcings, e.g. when it is below dt. 'hold' adds their tendency at the start of
+        # the physics step to every dynamics stage, a forward Euler step of the forcings that cannot be
+        # subcycled, so it raises a ValueError beyond the limit. Split forcings are advanced once with the
+        # physics step
+        if splitting not in self.splittings:
+            raise ValueError(f"Unknown splitting {splitting}, expected one of {self.splittings}")
 
-        self.state[:] = u_tmp + 0.5 * dt * k
+        if dt is None:
+            dt = self.get_dt()
+        dt = float(dt)
+
+        dt_limit = self.get_physics_dt(splitting)
+        if nsub is None:
+            nsub = max(1, int(min(max_subcycles, dt_limit / dt)))
+        dt_physics = nsub * dt
+
+        if splitting == 'hold' and dt_physics > dt_limit:
+            raise ValueError(
+                f"A held physics step of {dt_physics} exceeds the stability limit {dt_limit} of the "
+                "forcings, reduce dt or use the 'strang' or 'lie' splitting"
+            )
+
+        with self.profiler.region('multirate_step'):
+            if splitting == 'strang':
+                self.subcycled_forcing_step(0.5 * dt_physics)
+                self.advance(nsub, dt, forcing=False)
+                self.subcycled_forcing_step(0.5 * dt_physics)
+            elif splitting == 'lie':
+                self.advance(nsub, dt, forcing=False)
+                self.subcycled_forcing_step(dt_physics)
+            else:
+                held = np.zeros_like(self.state)
+                self.apply_forcing(self.state, held)
+                self.advance(nsub, dt, forcing=held)
+                self.split_forcing_step(self.state, dt_physics)
 
-        self.time += dt
+        self.profiler.count('multirate_subcycles', nsub)
+        return nsub
 
     def positivity_preserving_limiter(self, in_tnsr):
-        cell_means = (in_tnsr * self.weights2D[None, None] * self.J).sum(axis=(2, 3)) / (self.weights2D[None, None] * self.J).sum(axis=(2, 3))
+        cell_means = (in_tnsr * self.cell_mass).sum(axis=(2, 3)) * self.inv_cell_mass
         cell_diffs = in_tnsr - cell_means[..., None, None]
 
         cell_mins = in_tnsr.min(axis=-1)
@@ -138,34 +358,57 @@ class TwoPhaseEuler2D(Euler2D):
 
         out_tnsr = cell_means[..., None, None] + scale[..., None, None] * cell_diffs
 
-        # cell_means1 = (out_tnsr * self.weights2D[None, None] * self.J).sum(axis=(2, 3)) / (self.weights2D[None, None] * self.J).sum(axis=(2, 3))
-
         return out_tnsr, cell_means
 
-    def check_positivity(self, state):
+    def limit_water(self, h, qw):
+        # positivity_preserving_limiter applied to h * qw in the troubled cells only
+        # returns whether any qw <= 0 before limiting, the number of limited cells and a status code:
+        # 0 ok, 1 negative water cell mean, 2 limiting failed
+        hqw = h * qw
+        cell_mins = hqw.min(axis=(2, 3))
+        troubled = cell_mins < 1e-12
+        nlimited = int(troubled.sum())
+        if nlimited == 0:
+            return False, 0, 0
+
+        nonpositive = bool((cell_mins[troubled] <= 0).any())
+        hqw = hqw[troubled]
+        cell_mins = cell_mins[troubled]
+        cell_means = (hqw * self.cell_mass[troubled]).sum(axis=(1, 2)) * self.inv_cell_mass[troubled]
+        if (cell_means <= 0).any():
+            return nonpositive, nlimited, 1
+
+        scale = (1e-12 - cell_means) / (cell_mins - cell_means)
+        qw_limited = (cell_means[:, None, None] + scale[:, None, None] * (hqw - cell_means[:, None, None])) / h[troubled]
+        qw[troubled] = qw_limited
+
+        if (qw_limited <= 0).any():
+            return nonpositive, nlimited, 2
+
+        return nonpositive, nlimited, 0
+
+    def limit_state_water(self, state):
+        # limit_water on the density and water slots of state
         u, v, h, s, qw, *_ = self.get_vars(state)
+        return self.limit_water(h, qw)
 
-        if (qw <= 0).any():
-            if self.first_water_limit_time is None:
+    def check_positivity(self, state):
+        with self.profiler.region('positivity'):
+            nonpositive, nlimited, status = self.limit_state_water(state)
+
+            if nonpositive and self.first_water_limit_time is None:
                 self.first_water_limit_time = self.time
 
-        hqw = h * qw
-        hqw_limited, hqw_cell_means = self.positivity_preserving_limiter(hqw)
-        qw[:] = hqw_limited / h
-
-        if (hqw_cell_means <= 0).any():
-            print("Negative water cell mean detected")
-            raise RuntimeError("Negative water cell mean detected")
-            # print("x-coords:", self.xs[state['hqw'] <= 0], "\n")
-            # print("y-coords:", self.ys[state['hqw'] <= 0], "\n")
-
-        if (qw <= 0).any():
-            print("Negative water mass - limiting failed :( ")
-            print('hqw_limited min:', hqw_limited.min())
-            print('h min:', h.min())
-            raise RuntimeError("Negative water mass - limiting failed :( ")
-            # print("x-coords:", self.xs[state['hqw'] <= 0], "\n")
-            # print("y-coords:", self.ys[state['hqw'] <= 0], "\n")
+            self.limited_cells += nlimited
+            self.profiler.count('limited_cells', nlimited)
+
+            if status == 1:
+                print("Negative water cell mean detected")
+                raise RuntimeError("Negative water cell mean detected")
+            elif status == 2:
+                print("Negative water mass - limiting failed :( ")
+                print('h min:', self.get_vars(state)[2].min())
+                raise RuntimeError("Negative water mass - limiting failed :( ")
 
     def get_fluxes(self, u, w, h, s, q, T, mu, p, ie, idx=slice(None)):
 
@@ -241,7 +484,7 @@ class TwoPhaseEuler2D(Euler2D):
             # energy_diss = Fz[im] * diss / self.weights_z[-1]
             # dsdt[im] -= energy_diss / (h[im] * T[im])
         else:
-            raise NotImplementedError
+            self.solve_top_outflow(state, dstatedt)
 
         # vertical interior boundaries
         ip = self.ip_vert_int
@@ -258,11 +501,65 @@ class TwoPhaseEuler2D(Euler2D):
             state_m, dstatedt_m = self.get_boundary_data(state, im), self.get_boundary_data(dstatedt, im)
             self.solve_boundaries(state_p, state_m, dstatedt_p, dstatedt_m, 'x', idx=ip)
 
-        if self.forcing is not None:
-            self.forcing(self, state, dstatedt)
-
         return dstatedt
 
+    def fill_top_boundary(self, state):
+        # ghost state above the top for top_bc='outflow'. The incoming acoustic characteristic is set to that of
+        # top_reference: the ghost pressure perturbation is h c times the interior normal velocity and the ghost
+        # normal velocity is the interior pressure perturbation over h c, so outgoing waves see no jump. The
+        # density and energy follow the pressure isentropically, the tangential velocity is extrapolated
+        im = self.im_vert_ext
+        u, w, h, s, q, T, mu, p, ie = self.get_boundary_data(state, im)
+        ref = self.top_reference
+        ghost = self.top_boundary
+
+        c_sound = np.sqrt(self.gamma * p / h)
+        norm_contra = self.norm_grad_zeta[im]
+        normal_vel = (self.grad_xi_dot_zeta[im] * u + self.grad_zeta_2[im] * w) / norm_contra
+        dp = h * c_sound * normal_vel
+
+        dh = dp / c_sound ** 2
+        ghost[:] = ref
+        ghost[2] += dh
+        ghost[7] += dp
+        ghost[8] += dh * (ref[8] + ref[7] + dp) / ref[2]
+
+        ghost_normal_vel = (p - ref[7]) / (h * c_sound)
+        ghost[0] = u
+        ghost[1] = (ghost_normal_vel * norm_contra - self.grad_xi_dot_zeta[im] * u) / self.grad_zeta_2[im]
+
+        return ghost
+
+    def solve_top_outflow(self, state, dstatedt):
+        im = self.im_vert_ext
+        ghost = self.fill_top_boundary(state)
+        state_m, dstatedt_m = self.get_boundary_data(state, im), self.get_boundary_data(dstatedt, im)
+        dstatedt_p = np.zeros_like(dstatedt_m)
+        self.solve_boundaries(ghost, state_m, dstatedt_p, dstatedt_m, 'z', idx=im)
+
+    def solve_active(self, state, dstatedt, active):
+        # tendency of state on the cells where active (nx, nz) is True, elsewhere dstatedt is incomplete. The
+        # numpy kernels evaluate every cell
+        return self.solve(state, dstatedt)
+
+    def normal_mass_flux(self, state, direction, idx):
+        # Fx or Fz of get_fluxes at the face nodes idx
+        u, w, h = state[0], state[1], state[2]
+        if direction == 'z':
+            return h * (self.grad_xi_dot_zeta[idx] * u + self.grad_zeta_2[idx] * w)
+        return h * (self.grad_xi_2[idx] * u + self.grad_xi_dot_zeta[idx] * w)
+
+    def mass_flux(self, state_p, state_m, direction, idx):
+        # the numerical density flux of solve_boundaries at the face nodes idx
+        hp, hm = state_p[2], state_m[2]
+        Fp = self.normal_mass_flux(state_p, direction, idx)
+        Fm = self.normal_mass_flux(state_m, direction, idx)
+        norm_contra = self.norm_grad_zeta[idx] if direction == 'z' else self.norm_grad_xi[idx]
+
+        c_adv = np.abs(0.5 * (Fp / hp + Fm / hm)) / norm_contra
+        c_snd = 0.5 * (np.sqrt(self.gamma * state_p[7] / hp) + np.sqrt(self.gamma * state_m[7] / hm))
+        return 0.5 * (Fp + Fm) - self.a * (c_adv + c_snd) * (hp - hm) * norm_contra
+
     def solve_boundaries(self, state_p, state_m, dstatedt_p, dstatedt_m, direction, idx):
 
         up, wp, hp, sp, qp, Tp, mup, pp, iep = (state_p[i] for i in range(self.nvars))
@@ -373,10 +670,12 @@ class TwoPhaseEuler2D(Euler2D):
         return 0.0
 
     def energy(self):
-        pe = self.h * self.g * self.zs
-        ke = 0.5 * self.h * (self.u ** 2 + self.w ** 2)
-        energy = pe + ke + self.ie
-        return self.integrate(energy)
+        with self.profiler.region('diagnostics'):
+            h, u, w = self.promote(self.h), self.promote(self.u), self.promote(self.w)
+            pe = h * self.g * self.zs
+            ke = 0.5 * h * (u ** 2 + w ** 2)
+            energy = pe + ke + self.promote(self.ie)
+            return self.integrate(energy)
 
     @property
     def q(self):
@@ -423,6 +722,8 @@ class TwoPhaseEuler2D(Euler2D):
         return mathlib.exp(logpsat)
 
     def get_thermodynamic_quantities(self, h, s, qw, update_cache=False, use_cache=False):
+        # the Newton solve for qv takes logs of fractions near 1e-15 so always runs in float64
+        h, s, qw = self.promote(h), self.promote(s), self.promote(qw)
 
         qd = 1 - qw
 
@@ -474,7 +775,7 @@ class TwoPhaseEuler2D(Euler2D):
 
         logdensity = np.log(density)
 
-        for _ in range(iters):
+        for it in range(iters):
             qd = 1 - qw
             ql = qw - qv
             R = qv * self.Rv + qd * self.Rd
@@ -523,6 +824,7 @@ class TwoPhaseEuler2D(Euler2D):
             rel_update = abs((val / grad) / qv).max()
             if rel_update < tol:
                 break
+        self.profiler.count('newton_iterations', (it + 1) * qv.size)
         self.gibbs_error = abs(val).max()
         if verbose:
             rel_update = abs((val / grad) / qv)
@@ -1,5 +1,4 @@
 import numpy as np
-from matplotlib import pyplot as plt
 
 def gll(N, iterative=False):
     """
@@ -92,6 +91,36 @@ def gll(N, iterative=False):
     return np.array(xi), np.array(weights)
 
 
+def monotone_cubic(x, y):
+    """
+    Returns a C1 monotone piecewise cubic interpolant through the points (x, y)
+    using the Fritsch-Carlson (PCHIP) slopes.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    h = np.diff(x)
+    delta = np.diff(y) / h
+
+    m = np.zeros_like(y)
+    m[0], m[-1] = delta[0], delta[-1]
+    w1 = 2 * h[1:] + h[:-1]
+    w2 = h[1:] + 2 * h[:-1]
+    same_sign = delta[:-1] * delta[1:] > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m[1:-1] = np.where(same_sign, (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:]), 0.0)
+
+    def interpolant(xq):
+        k = np.clip(np.searchsorted(x, xq, side='right') - 1, 0, x.size - 2)
+        t = (xq - x[k]) / h[k]
+        h00 = (1 + 2 * t) * (1 - t) ** 2
+        h10 = t * (1 - t) ** 2
+        h01 = t ** 2 * (3 - 2 * t)
+        h11 = t ** 2 * (t - 1)
+        return h00 * y[k] + h10 * h[k] * m[k] + h01 * y[k + 1] + h11 * h[k] * m[k + 1]
+
+    return interpolant
+
+
 def lagrange(N, i, x, xi):
     """
     Function to calculate  Lagrange polynomial for order N and polynomial
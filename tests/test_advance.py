@@ -0,0 +1,114 @@
+import pytest
+import numpy as np
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+
+
+def make_solver(solver_cls, forcing=None):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 8
+    nx = 16
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, forcing=forcing
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm, saturated bubble so the condensate and limiter paths are exercised
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    bubble = np.exp(-(r / 1_000.0) ** 2)
+    qw = qw * (1 + 0.2 * bubble)
+    s = s + 2.0 * bubble
+
+    return u, v, density, s, qw
+
+
+def assert_states_close(solver1, solver2, rtol=1e-9):
+    # velocities are near zero in a balanced state, so compare each variable relative to its scale
+    for arr1, arr2 in zip(solver1.get_vars(solver1.state), solver2.get_vars(solver2.state)):
+        assert abs(arr1 - arr2).max() <= rtol * abs(arr1).max()
+
+
+@pytest.mark.parametrize("solver_cls", [FortranTwoPhaseEuler2D, FortranThreePhaseEuler2D])
+def test_advance_matches_time_step(solver_cls):
+    solver1 = make_solver(solver_cls)
+    solver2 = make_solver(solver_cls)
+    dt = solver1.get_dt()
+
+    for _ in range(10):
+        solver1.time_step(dt)
+    solver2.advance(10, dt)
+
+    assert solver1.time == solver2.time
+    assert_states_close(solver1, solver2)
+    assert np.allclose(solver1.qv, solver2.qv, rtol=1e-10, atol=1e-14)
+    assert np.allclose(solver1.ql, solver2.ql, rtol=1e-10, atol=1e-14)
+
+
+def test_advance_limits_water():
+    solver1 = make_solver(FortranThreePhaseEuler2D)
+    solver2 = make_solver(FortranThreePhaseEuler2D)
+    dt = solver1.get_dt()
+
+    # dry out a patch of cells so the positivity limiter is active
+    for solver in [solver1, solver2]:
+        q = solver.get_vars(solver.state)[4]
+        q[4:6, 2, 0, :] = -1e-6
+        q[4:6, 2, 1, :] = 1e-6
+
+    for _ in range(3):
+        solver1.time_step(dt)
+    solver2.advance(3, dt)
+
+    assert solver1.first_water_limit_time == solver2.first_water_limit_time == 0.0
+    assert (solver2.q > 0).all()
+    # mu is sensitive to rounding in the nearly dry limited cells
+    assert_states_close(solver1, solver2, rtol=1e-7)
+
+
+def test_advance_falls_back_with_forcing():
+    forcing = lambda solver, state, dstatedt: None
+    solver1 = make_solver(FortranThreePhaseEuler2D, forcing=forcing)
+    solver2 = make_solver(FortranThreePhaseEuler2D, forcing=forcing)
+    dt = solver1.get_dt()
+
+    for _ in range(2):
+        solver1.time_step(dt)
+    solver2.advance(2, dt)
+
+    assert np.array_equal(solver1.state, solver2.state)
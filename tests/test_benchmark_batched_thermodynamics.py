@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+
+
+def make_solver(thermo_kernel):
+    xlim = 50_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 16
+    nx = 32
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = FortranThreePhaseEuler2D(
+        xmap, zmap, poly_order, nx, g=g, cfl=1.5, a=a, nz=nz, upwind=upwind, nprocx=1, thermo_kernel=thermo_kernel
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+def make_field(solver, field):
+    # clear: subsaturated everywhere, cloudy: liquid cloud below 2.5km, mixed: cloud through the freezing level
+    qw = np.copy(solver.q)
+    if field == 'cloudy':
+        qw[solver.zs < 2_500.0] *= 1.3
+    elif field == 'mixed':
+        qw[(solver.zs > 1_500.0) & (solver.zs < 6_000.0)] *= 1.3
+
+    return solver.h, solver.s, qw
+
+
+@pytest.mark.parametrize("thermo_kernel", ['scalar', 'batched'])
+@pytest.mark.parametrize("field", ['clear', 'cloudy', 'mixed'])
+def test_benchmark_thermo_kernel(benchmark, field, thermo_kernel):
+    solver = make_solver(thermo_kernel)
+    benchmark.group = f'thermo-{field}'
+    benchmark(solver.get_thermodynamic_quantities, *make_field(solver, field))
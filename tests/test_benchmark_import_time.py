@@ -0,0 +1,16 @@
+import os
+import sys
+import subprocess
+
+
+def import_solvers():
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run(
+        [sys.executable, '-c', 'import moist_euler_dg.fortran_three_phase_euler_2D'], env=env, check=True
+    )
+
+
+def test_benchmark_import_time(benchmark):
+    # cold interpreter start plus the solver imports, without MPI or matplotlib
+    benchmark.group = 'startup'
+    benchmark.pedantic(import_solvers, rounds=5, iterations=1)
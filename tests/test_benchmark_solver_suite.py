@@ -0,0 +1,185 @@
+"""
+Benchmark suite over polynomial order, grid size, phase model and backend.
+
+Store a baseline and compare later runs against it, failing if any mean time regresses by more than 10%:
+
+    python -m pytest tests/test_benchmark_solver_suite.py --benchmark-autosave
+    python -m pytest tests/test_benchmark_solver_suite.py --benchmark-compare --benchmark-compare-fail=mean:10%
+
+Results are saved as json under .benchmarks/ and grouped by operation and model. Each result records the
+order, grid size and degrees of freedom in extra_info. test_benchmark_layout compares the variable-major and
+element-blocked state layouts of the Fortran kernels and test_benchmark_column_kernel the order-specialised
+and generic column kernels. Use -k to select a subset, e.g. -k "fortran and p3".
+"""
+import pytest
+import numpy as np
+from moist_euler_dg.euler_2D import Euler2D
+from moist_euler_dg.two_phase_euler_2D import TwoPhaseEuler2D
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+
+
+solver_classes = {
+    ('dry', 'numpy'): Euler2D,
+    ('two-phase', 'numpy'): TwoPhaseEuler2D,
+    ('two-phase', 'fortran'): FortranTwoPhaseEuler2D,
+    ('three-phase', 'numpy'): ThreePhaseEuler2D,
+    ('three-phase', 'fortran'): FortranThreePhaseEuler2D,
+}
+
+orders = list(range(1, 9))
+grids = [(8, 4), (32, 16)]
+
+configs = [
+    pytest.param((model, backend, order, nx, nz), id=f"{model}-{backend}-p{order}-{nx}x{nz}")
+    for (model, backend) in solver_classes.keys() for order in orders for (nx, nz) in grids
+]
+
+
+def make_solver(model, backend, order, nx, nz, layout='variable', **kwargs):
+    xlim = 50_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    g = 9.81  # gravitational acceleration
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_classes[(model, backend)](
+        xmap, zmap, order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, layout=layout, **kwargs
+    )
+
+    if model == 'dry':
+        solver_.set_initial_condition(*dry_initial_condition(solver_))
+    else:
+        solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def dry_initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cp * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cp / solver_.R)
+    density = p / (solver_.R * ex * dry_theta)
+
+    # entropy consistent with p = exp(s / cv) * h**gamma
+    s = solver_.cv * np.log(p) - solver_.cp * np.log(density)
+
+    return u, v, density, s
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+@pytest.fixture(scope='module', params=configs)
+def config(request):
+    model, backend, order, nx, nz = request.param
+    return request.param, make_solver(model, backend, order, nx, nz)
+
+
+def setup_benchmark(benchmark, config, operation):
+    (model, backend, order, nx, nz), solver = config
+    benchmark.group = f"{operation}:{model}-{backend}"
+    benchmark.extra_info.update(
+        model=model, backend=backend, order=order, nx=nx, nz=nz, dofs=solver.xs.size
+    )
+    return solver
+
+
+def test_benchmark_time_step(benchmark, config):
+    solver = setup_benchmark(benchmark, config, 'time_step')
+    dt = solver.get_dt()
+    benchmark(solver.time_step, dt)
+
+
+def test_benchmark_check_positivity(benchmark, config):
+    solver = setup_benchmark(benchmark, config, 'check_positivity')
+    if not hasattr(solver, 'check_positivity'):
+        pytest.skip('dry solver has no moisture limiter')
+
+    state = np.copy(solver.state)
+    benchmark(solver.check_positivity, state)
+
+
+def test_benchmark_energy(benchmark, config):
+    solver = setup_benchmark(benchmark, config, 'energy')
+    benchmark(solver.energy)
+
+
+def test_benchmark_save_load(benchmark, config, tmp_path):
+    solver = setup_benchmark(benchmark, config, 'save_load')
+    fp = str(tmp_path / 'state.npy')
+
+    def save_load():
+        solver.save(fp)
+        solver.load(fp)
+
+    state = np.copy(solver.state)
+    benchmark(save_load)
+    assert np.array_equal(state, solver.state)
+
+
+def test_benchmark_halo(benchmark, config):
+    # halo exchange and horizontal domain boundary fluxes, the only MPI path in solve
+    solver = setup_benchmark(benchmark, config, 'halo')
+    state = solver.state
+    dstatedt = np.zeros_like(state)
+
+    def halo():
+        for req in solver.fill_boundaries(state):
+            if req is not None:
+                req.wait()
+        solver._solve_horz_boundaries(state, dstatedt)
+
+    benchmark(halo)
+
+
+@pytest.mark.parametrize("layout", ['variable', 'blocked'])
+@pytest.mark.parametrize("order", [3, 8])
+def test_benchmark_layout(benchmark, layout, order):
+    solver = make_solver('three-phase', 'fortran', order, 32, 16, layout=layout)
+    benchmark.group = f"layout:three-phase-fortran-p{order}"
+    benchmark.extra_info.update(layout=layout, order=order, nx=32, nz=16, dofs=solver.xs.size)
+    dt = solver.get_dt()
+    benchmark(solver.time_step, dt)
+
+
+@pytest.mark.parametrize("column_kernel", ['specialised', 'generic'])
+@pytest.mark.parametrize("order", orders)
+def test_benchmark_column_kernel(benchmark, column_kernel, order):
+    solver = make_solver('three-phase', 'fortran', order, 32, 16, column_kernel=column_kernel)
+    benchmark.group = f"column_kernel:three-phase-fortran-p{order}"
+    benchmark.extra_info.update(column_kernel=column_kernel, order=order, nx=32, nz=16, dofs=solver.xs.size)
+    state = solver.state
+    dstatedt = np.zeros_like(state)
+    benchmark(solver.solve, state, dstatedt)
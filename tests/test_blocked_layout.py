@@ -0,0 +1,150 @@
+import pytest
+import numpy as np
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+
+
+def make_solver(solver_cls, layout, poly_order=3):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 8
+    nx = 16
+
+    g = 9.81  # gravitational acceleration
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, layout=layout
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm, saturated bubble so the condensate and limiter paths are exercised
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    bubble = np.exp(-(r / 1_000.0) ** 2)
+    qw = qw * (1 + 0.2 * bubble)
+    s = s + 2.0 * bubble
+
+    return u, v, density, s, qw
+
+
+def assert_states_close(solver1, solver2, rtol=1e-12):
+    # velocities are near zero in a balanced state, so compare each variable relative to its scale
+    for arr1, arr2 in zip(solver1.get_vars(solver1.state), solver2.get_vars(solver2.state)):
+        assert abs(arr1 - arr2).max() <= rtol * abs(arr1).max()
+
+
+def test_blocked_views():
+    solver = make_solver(ThreePhaseEuler2D, 'blocked')
+    n = solver.order + 1
+
+    # all variables of an element are contiguous
+    blocked = solver.state.reshape(solver.nx, solver.nz, solver.nvars, n, n)
+    for i, var in enumerate(solver.get_vars(solver.state)):
+        assert np.shares_memory(var, solver.state)
+        assert np.array_equal(var, blocked[:, :, i])
+
+    assert np.array_equal(solver.blocked_view(solver.state)[:, 2, 5], blocked[0, 5, 2].ravel())
+    assert np.array_equal(solver.variable_major(solver.state).reshape(solver.nvars, -1)[4], solver.q.ravel())
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranTwoPhaseEuler2D, FortranThreePhaseEuler2D])
+def test_blocked_matches_variable(solver_cls):
+    solver1 = make_solver(solver_cls, 'variable')
+    solver2 = make_solver(solver_cls, 'blocked')
+    assert_states_close(solver1, solver2)
+
+    dt = solver1.get_dt()
+    for _ in range(5):
+        solver1.time_step(dt)
+        solver2.time_step(dt)
+
+    assert_states_close(solver1, solver2)
+    assert np.array_equal(solver1.qv, solver2.qv)
+
+
+@pytest.mark.parametrize("solver_cls", [FortranTwoPhaseEuler2D, FortranThreePhaseEuler2D])
+def test_blocked_limiter(solver_cls):
+    solver1 = make_solver(solver_cls, 'variable')
+    solver2 = make_solver(solver_cls, 'blocked')
+
+    # dry out a few cells so they are limited
+    for solver in [solver1, solver2]:
+        q = solver.q
+        q[3, 2] = 1e-3
+        q[3, 2, 1, 1] = -1e-4
+        q[7, 4, 0] = -1e-5
+        solver.check_positivity(solver.state)
+
+    assert solver1.limited_cells == solver2.limited_cells == 2
+    assert np.array_equal(solver1.q, solver2.q)
+
+
+def test_blocked_save_load(tmp_path):
+    solver1 = make_solver(FortranThreePhaseEuler2D, 'blocked')
+    solver2 = make_solver(FortranThreePhaseEuler2D, 'variable')
+    solver1.time_step()
+
+    # files are variable-major in either layout
+    fp = str(tmp_path / 'state.npy')
+    solver1.save(fp)
+    solver2.load(fp)
+    assert np.array_equal(solver2.state, solver1.variable_major(solver1.state))
+
+    solver2.save(fp)
+    solver1.state[:] = 0.0
+    solver1.load(fp)
+    assert_states_close(solver1, solver2, rtol=0.0)
+
+
+def test_unknown_layout():
+    with pytest.raises(ValueError):
+        make_solver(ThreePhaseEuler2D, 'tiled')
+
+
+@pytest.mark.parametrize("layout", ['variable', 'blocked'])
+def test_face_trace(layout):
+    solver = make_solver(FortranThreePhaseEuler2D, layout)
+    solver.solve(solver.state)
+    u, w, h, s, q, T, mu, p, ie = solver.get_vars(solver.state)
+
+    Fx = h * (solver.grad_xi_2 * u + solver.grad_xi_dot_zeta * w)
+    Fz = h * (solver.grad_xi_dot_zeta * u + solver.grad_zeta_2 * w)
+    G = 0.5 * (Fx * u + Fz * w) / h + (ie + p) / h - T * s - mu * q
+    c = np.sqrt(solver.gamma * p / h)
+
+    # rows of the trace are (level, z node) of the left and right face of each column
+    for side, k in enumerate([0, -1]):
+        for var, arr in enumerate([G, Fx, Fz, c]):
+            expected = arr[:, :, k, :].reshape(solver.nx, -1).T
+            assert np.allclose(solver.face_trace[:, var, side], expected, rtol=1e-13, atol=1e-13 * abs(arr).max())
@@ -0,0 +1,85 @@
+import pytest
+import numpy as np
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+
+
+def make_solver(solver_cls, poly_order, column_kernel, layout='variable'):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 4
+    nx = 6
+
+    g = 9.81  # gravitational acceleration
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, layout=layout,
+        column_kernel=column_kernel
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # sheared flow so every flux and derivative is non-zero
+    u = 10.0 * np.sin(2 * np.pi * solver_.zs / 10_000)
+    v = 2.0 * np.cos(2 * np.pi * solver_.xs / 10_000)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+@pytest.mark.parametrize("layout", ['variable', 'blocked'])
+@pytest.mark.parametrize("poly_order", list(range(1, 10)))
+def test_specialised_matches_generic(poly_order, layout):
+    solver1 = make_solver(FortranThreePhaseEuler2D, poly_order, 'generic', layout=layout)
+    solver2 = make_solver(FortranThreePhaseEuler2D, poly_order, 'specialised', layout=layout)
+    assert solver1.kernel_order == 0
+    # order 9 has no specialised kernel and falls back to the generic one
+    assert solver2.kernel_order == (poly_order if poly_order <= 8 else 0)
+
+    out1 = solver1.solve(solver1.state)
+    out2 = solver2.solve(solver2.state)
+    # -ffast-math may reorder the unrolled sums, the tendencies are small differences of large gradient terms
+    for arr1, arr2 in zip(solver1.get_vars(out1)[:5], solver2.get_vars(out2)[:5]):
+        assert abs(arr1 - arr2).max() <= 1e-9 * abs(arr1).max()
+
+
+def test_specialised_advance():
+    # the compiled time loop dispatches on the same kernel order
+    solver1 = make_solver(FortranTwoPhaseEuler2D, 3, 'generic')
+    solver2 = make_solver(FortranTwoPhaseEuler2D, 3, 'specialised')
+    dt = solver1.get_dt()
+    solver1.advance(3, dt)
+    solver2.advance(3, dt)
+
+    for arr1, arr2 in zip(solver1.get_vars(solver1.state), solver2.get_vars(solver2.state)):
+        assert abs(arr1 - arr2).max() <= 1e-10 * abs(arr1).max()
+
+
+def test_unknown_column_kernel():
+    with pytest.raises(ValueError):
+        make_solver(FortranTwoPhaseEuler2D, 3, 'unrolled')
@@ -0,0 +1,106 @@
+import pytest
+import numpy as np
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+
+
+def make_solver(solver_cls, compact_geometry, stretched=False):
+    xlim = 50_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    if stretched:
+        zmap = lambda x, z: (z + 0.5 * z ** 2) * zlim / 1.5
+    else:
+        zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 8
+    nx = 16
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=1.5, a=a, nz=nz, upwind=upwind, nprocx=1,
+        compact_geometry=compact_geometry
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+def perturbed_state(solver_):
+    np.random.seed(0)
+    state = np.copy(solver_.state)
+    u, w, *_ = solver_.get_vars(state)
+    u_phys, w_phys = 2 * (np.random.random(u.shape) - 0.5), 2 * (np.random.random(w.shape) - 0.5)
+    u[:], w[:] = solver_.phys_to_cov(u_phys, w_phys)
+    return state
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+@pytest.mark.parametrize("stretched", [False, True])
+def test_compact_solve_equivalent(solver_cls, stretched):
+    full = make_solver(solver_cls, compact_geometry=False, stretched=stretched)
+    compact = make_solver(solver_cls, compact_geometry=True, stretched=stretched)
+
+    assert compact.metric_per_cell == (not stretched)
+
+    state = perturbed_state(full)
+    out1 = full.solve(state)
+    out2 = compact.solve(state)
+
+    assert np.allclose(out1, out2)
+    assert np.allclose(full.energy(), compact.energy())
+
+
+def test_compact_metric_memory():
+    full = make_solver(FortranThreePhaseEuler2D, compact_geometry=False)
+    compact = make_solver(FortranThreePhaseEuler2D, compact_geometry=True)
+    stretched = make_solver(FortranThreePhaseEuler2D, compact_geometry=True, stretched=True)
+
+    assert 3 * compact.metric_nbytes <= full.metric_nbytes
+    assert 3 * stretched.metric_nbytes <= full.metric_nbytes
+
+
+def test_compact_metric_terms_cached_per_solve():
+    solver = make_solver(ThreePhaseEuler2D, compact_geometry=True, stretched=True)
+    built = []
+    get_metric_term = solver.get_metric_term
+    solver.get_metric_term = lambda name: built.append(name) or get_metric_term(name)
+
+    # each derived term is built at most once per solve and dropped after it
+    state = perturbed_state(solver)
+    solver.solve(state)
+    assert 0 < len(built) == len(set(built))
+    assert 'metric_cache' not in solver.__dict__ and 'J' not in solver.__dict__
+
+    solver.solve(state)
+    assert len(built) == 2 * len(set(built))
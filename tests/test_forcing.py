@@ -0,0 +1,244 @@
+import pytest
+import numpy as np
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg import stability
+from moist_euler_dg.forcing import Forcing, CallbackForcing, ForcingList, TemperatureForcing, EnergyForcing, VerticalDiffusion, as_forcing
+
+boundary_layer_top = 1250.0
+Ksurf = 20.0
+
+
+def make_solver(solver_cls, forcing=None):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 8
+    nx = 8
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, forcing=forcing
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # perturb the entropy so the diffusion has something to act on
+    s = s + 5.0 * np.sin(2 * np.pi * solver_.xs / 10_000) * np.exp(-solver_.zs / 500)
+
+    return u, v, density, s, qw
+
+
+def boundary_layer_diffusivity(solver):
+    return Ksurf * (1.0 - (solver.zs / boundary_layer_top)) ** 2 * (solver.zs <= boundary_layer_top)
+
+
+def forcing_tendency(solver, forcing):
+    dstatedt = np.zeros_like(solver.state)
+    forcing.setup(solver)
+    forcing.apply(solver, solver.state, dstatedt)
+    return dstatedt
+
+
+def test_vertical_diffusion_tendency():
+    solver = make_solver(ThreePhaseEuler2D)
+    s0 = solver.s[solver.ip_vert_ext] + 1.0
+
+    # only the boundary layer levels and the level above are evaluated
+    diffusion = VerticalDiffusion(boundary_layer_diffusivity, s_surface=s0)
+    assert abs(solver.get_vars(forcing_tendency(solver, diffusion))[3]).max() > 0
+    assert diffusion.K_.shape[1] == 2
+
+    # d/dz(K ds/dz) of a profile with zero flux at the surface and the top
+    K = 100.0
+    H = 10_000.0
+    solver.s[:] = np.cos(np.pi * solver.zs / H)
+    out = solver.get_vars(forcing_tendency(solver, VerticalDiffusion(K)))[3]
+    expected = -K * (np.pi / H) ** 2 * np.cos(np.pi * solver.zs / H)
+    assert np.allclose(out, expected, rtol=0, atol=5e-3 * abs(expected).max())
+
+    # and a diffusive tendency for a profile curving upwards
+    solver.s[:] = (solver.zs / 1_000.0) ** 2
+    out = solver.get_vars(forcing_tendency(solver, VerticalDiffusion(K, surface_flux=0.0)))[3]
+    interior = (solver.zs > 1_000.0) & (solver.zs < 9_000.0)
+    assert np.allclose(out[interior], 2 * K * 1e-6, rtol=1e-6)
+
+
+def variance(solver, s):
+    mean = solver.integrate(s) / solver.integrate(np.ones_like(s))
+    return solver.integrate((s - mean) ** 2)
+
+
+@pytest.mark.parametrize("mode", ['explicit', 'implicit'])
+def test_vertical_diffusion_decreases_variance(mode):
+    solver = make_solver(ThreePhaseEuler2D)
+    diffusion = VerticalDiffusion(lambda solver: 1e4 * (solver.zs < 2_500.0), mode=mode, split=True)
+    diffusion.setup(solver)
+    solver.s[:] = np.cos(np.pi * solver.zs / 2_500.0) + 0.1 * np.sin(2 * np.pi * solver.xs / 10_000)
+
+    # steps at the explicit limit, and up to far beyond it for the implicit solve
+    dts = [diffusion.max_dt(solver)] * 5 if mode == 'explicit' else [10.0, 300.0, 1e3, 1e4, 1e6]
+    previous = variance(solver, solver.s)
+    for dt in dts:
+        diffusion.split_step(solver, solver.state, dt)
+        current = variance(solver, solver.s)
+        assert current < previous
+        previous = current
+
+
+def test_vertical_diffusion_max_dt():
+    K = lambda solver: 1e4 * (solver.zs < 2_500.0)
+    solver = make_solver(ThreePhaseEuler2D, forcing=VerticalDiffusion(K))
+    solver.s[:] = np.cos(np.pi * solver.zs / 2_500.0) + 0.1 * np.sin(2 * np.pi * solver.xs / 10_000)
+
+    # forcing_step is SSP-RK(4,3), stable up to the real stability radius rather than the forward Euler 2
+    radius = stability.stability_radius(np.pi)
+    dt = solver.get_physics_dt()
+    assert dt == pytest.approx(0.5 * radius * solver.get_physics_dt('hold'), rel=1e-12)
+    s0 = np.copy(solver.s)
+    for _ in range(20):
+        solver.forcing_step(dt)
+    assert variance(solver, solver.s) < variance(solver, s0)
+
+    solver.s[:] = s0
+    for _ in range(8):
+        solver.forcing_step(1.5 * dt)
+    assert variance(solver, solver.s) > 10 * variance(solver, s0)
+
+    # split steps are forward Euler whatever the splitting
+    diffusion = VerticalDiffusion(K, split=True)
+    diffusion.setup(solver)
+    assert diffusion.max_dt(solver, radius) == diffusion.max_dt(solver)
+
+    # anti-diffusion has a positive spectrum, unstable at any step
+    diffusion = VerticalDiffusion(lambda solver: -K(solver))
+    diffusion.setup(solver)
+    with pytest.raises(ValueError):
+        diffusion.max_dt(solver)
+
+
+def test_heating_forcings():
+    solver = make_solver(ThreePhaseEuler2D)
+    u, w, h, s, q, T, *_ = solver.get_vars(solver.state)
+    rate = lambda solver: 1e-4 * (1 - solver.zs / 10_000)
+
+    out = forcing_tendency(solver, TemperatureForcing(rate))
+    assert np.allclose(solver.get_vars(out)[3], solver.cvd * rate(solver) / T)
+
+    out = forcing_tendency(solver, EnergyForcing(rate))
+    assert np.allclose(solver.get_vars(out)[3], rate(solver) / (h * T))
+
+
+class CountingForcing(Forcing):
+
+    def __init__(self):
+        self.nsetup = 0
+        self.napply = 0
+
+    def setup(self, solver):
+        self.nsetup += 1
+
+    def apply(self, solver, state, dstatedt):
+        self.napply += 1
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_forcing_once_per_stage(solver_cls):
+    counter = CountingForcing()
+    solver = make_solver(solver_cls, forcing=[counter, lambda solver, state, dstatedt: None])
+    assert isinstance(solver.forcing, ForcingList)
+    assert isinstance(solver.forcing.forcings[1], CallbackForcing)
+
+    for _ in range(2):
+        solver.time_step()
+
+    assert counter.nsetup == 1
+    assert counter.napply == 8
+
+
+def test_unknown_forcing():
+    with pytest.raises(TypeError):
+        as_forcing(1.0)
+
+
+@pytest.mark.parametrize("bc", ['none', 'value', 'flux'])
+def test_implicit_vertical_diffusion(bc):
+    solver = make_solver(ThreePhaseEuler2D)
+    kwargs = {
+        'none': {},
+        'value': {'s_surface': solver.s[solver.ip_vert_ext] + 1.0},
+        'flux': {'surface_flux': 0.5},
+    }[bc]
+    # deep diffusion layer, the odd number of levels pads the last block
+    diffusion = VerticalDiffusion(lambda solver: 20.0 * (solver.zs < 4_500.0), mode='implicit', **kwargs)
+    diffusion.setup(solver)
+    assert diffusion.split and diffusion.K_.shape[1] == 5
+
+    s0 = np.copy(solver.s[diffusion.levels])
+    for dt in [10.0, 1e4]:
+        # backward Euler, far beyond the explicit limit for the larger step
+        s = np.copy(s0)
+        diffusion.implicit_solve(solver, s, dt)
+        residual = (s - s0) / dt - diffusion.tendency(solver, s)
+        assert abs(residual).max() * dt <= 1e-12 * abs(s0).max()
+
+    # forward and backward Euler agree to first order for a small step
+    dt = 1e-2
+    s_explicit = s0 + dt * diffusion.tendency(solver, s0)
+    s_implicit = np.copy(s0)
+    diffusion.implicit_solve(solver, s_implicit, dt)
+    assert abs(s_implicit - s_explicit).max() <= 1e-3 * abs(s_explicit - s0).max()
+
+
+def test_split_vertical_diffusion_time_step():
+    diffusion = VerticalDiffusion(boundary_layer_diffusivity, surface_flux=0.5, mode='implicit')
+    solver1 = make_solver(ThreePhaseEuler2D, forcing=diffusion)
+    solver2 = make_solver(ThreePhaseEuler2D)
+    dt = solver1.get_dt()
+
+    solver1.time_step(dt)
+    solver2.time_step(dt)
+    diffusion.split_step(solver2, solver2.state, dt)
+    solver2.set_thermo_vars(solver2.state)
+
+    assert np.allclose(solver1.state, solver2.state, rtol=1e-13, atol=0)
+    assert not np.allclose(solver1.s, make_solver(ThreePhaseEuler2D).s, rtol=1e-13, atol=0)
+
+
+def test_vertical_diffusion_options():
+    with pytest.raises(ValueError):
+        VerticalDiffusion(1.0, mode='crank-nicolson')
+    with pytest.raises(ValueError):
+        VerticalDiffusion(1.0, s_surface=300.0, surface_flux=0.0)
+    assert VerticalDiffusion(1.0, split=True).split and not VerticalDiffusion(1.0).split
@@ -127,4 +127,54 @@ def test_moisture_fraction_solver(solver):
     gd = solver.gibbs_air(T, qd, density)
     gi = solver.gibbs_ice(T)
 
-    assert np.allclose(gi - gd, mu)
\ No newline at end of file
+    assert np.allclose(gi - gd, mu)
+
+
+def test_set_thermo_vars_writes_state(solver):
+    state = np.copy(solver.state)
+    _, _, h, s, qw, T, mu, p, ie = solver.get_vars(state)
+    # cloudy and icy points so every branch of the kernel is used
+    qw *= 2.0
+    T[:] = 0.0
+
+    # the NumPy solver is the reference for the compiled kernel, the two Newton solves stop within round off of
+    # each other
+    reference = ThreePhaseEuler2D(lambda x, z: x, lambda x, z: z, 3, 4, g=9.81, nz=4)
+    enthalpy_, T_, p_, ie_, mu_, qv_, ql_ = reference.get_thermodynamic_quantities(h, s, qw)
+    assert (ql_ > 1e-10).any() and (qw - qv_ - ql_ > 1e-10).any()
+    solver.set_thermo_vars(state, use_cache=False)
+
+    assert np.allclose(T, T_, rtol=1e-9, atol=0)
+    assert np.allclose(mu, mu_, rtol=1e-9, atol=0)
+    assert np.allclose(p, p_, rtol=1e-9, atol=0)
+    assert np.allclose(ie, ie_, rtol=1e-9, atol=0)
+    assert np.allclose(solver.qv, qv_, rtol=1e-9, atol=1e-14)
+    assert np.allclose(solver.ql, ql_, rtol=1e-9, atol=1e-14)
+    assert np.allclose(enthalpy_, (ie + p) / h, rtol=1e-9, atol=0)
+
+
+@pytest.mark.parametrize("field", ['clear', 'cloudy', 'mixed'])
+def test_batched_thermo_kernel_matches_scalar(solver, field):
+    _, _, h, s, qw, *_ = solver.get_vars(solver.state)
+    qw = np.copy(qw)
+    if field == 'cloudy':
+        qw[solver.zs < 2_500.0] *= 1.3
+    elif field == 'mixed':
+        qw[(solver.zs > 1_500.0) & (solver.zs < 6_000.0)] *= 1.3
+
+    # an odd number of points so the last batch is padded
+    h, s, qw = (arr.ravel()[:-3] for arr in [h, s, qw])
+
+    solver.thermo_kernel = 'scalar'
+    scalar = solver.get_thermodynamic_quantities(h, s, qw)
+
+    solver.thermo_kernel = 'batched'
+    batched = solver.get_thermodynamic_quantities(h, s, qw)
+
+    for arr1, arr2 in zip(scalar, batched):
+        assert np.allclose(arr1, arr2, rtol=1e-10, atol=1e-14)
+
+
+def test_unknown_thermo_kernel():
+    with pytest.raises(ValueError):
+        FortranThreePhaseEuler2D(lambda x, z: x, lambda x, z: z, 3, 4, nz=4, thermo_kernel='vector')
@@ -0,0 +1,164 @@
+import pytest
+import numpy as np
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+from moist_euler_dg.implicit import ColumnPreconditioner, column_colours, element_major
+
+pytest.importorskip('scipy')
+
+
+def make_solver(solver_cls, layout='variable', profile=False):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 5
+    nx = 6
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, layout=layout, profile=profile
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm bubble so the dynamics are not at rest
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    s = s + 2.0 * np.exp(-(r / 1_000.0) ** 2)
+
+    return u, v, density, s, qw
+
+
+def totals(solver):
+    h, q = solver.get_vars(solver.state)[2], solver.get_vars(solver.state)[4]
+    return solver.integrate(h), solver.integrate(h * q), solver.energy()
+
+
+@pytest.mark.parametrize("nx", range(1, 13))
+def test_column_colours(nx):
+    ncolour = column_colours(nx)
+    colours = np.arange(nx) % ncolour
+    # a column and its neighbours never share a colour
+    for ix in range(nx):
+        for neighbour in [(ix - 1) % nx, (ix + 1) % nx]:
+            assert neighbour == ix or colours[neighbour] != colours[ix]
+
+
+def test_column_preconditioner_blocks():
+    solver = make_solver(FortranThreePhaseEuler2D)
+    solver.linearise()
+    precond = ColumnPreconditioner()
+    precond.assemble(solver)
+
+    # a direction supported on one column, the product with the blocks matches matvec within that column
+    v = np.zeros_like(solver.state)
+    rng = np.random.default_rng(0)
+    for var, arr in enumerate(solver.get_vars(v)[:solver.nprognostic]):
+        arr[2] = solver.linear_scale[var] * rng.standard_normal(arr[2].shape)
+
+    Jv = element_major(solver, solver.matvec(v))[2]
+    x = element_major(solver, v)[2]
+    expected = np.einsum('kij,kj->ki', precond.J_diag[2], x)
+    expected[1:] += np.einsum('kij,kj->ki', precond.J_lower[2, 1:], x[:-1])
+    expected[:-1] += np.einsum('kij,kj->ki', precond.J_upper[2, :-1], x[1:])
+
+    # the upwind flux has a kink at zero velocity, so one sided differences of the state at rest are only
+    # close to linear
+    n = (solver.order + 1) ** 2
+    for var in range(solver.nprognostic):
+        arr, expected_arr = Jv[..., var * n:(var + 1) * n], expected[..., var * n:(var + 1) * n]
+        assert abs(arr - expected_arr).max() <= 1e-3 * abs(expected_arr).max()
+
+    # and the factorisation inverts I - c J on the column blocks
+    c = 10.0
+    r = solver.promote(v) - c * solver.matvec(v)
+    y = precond.solve(solver, r, c)
+    assert abs(element_major(solver, y)[2] - x).max() <= 1e-3 * abs(x).max()
+
+
+def test_implicit_step_second_order():
+    reference = make_solver(FortranThreePhaseEuler2D)
+    dt = reference.get_dt()
+    for _ in range(64):
+        reference.time_step(dt / 32)
+
+    # the trapezoidal rule converges at second order to a well resolved SSP-RK solution
+    errors = []
+    for m in [1, 2]:
+        solver = make_solver(FortranThreePhaseEuler2D)
+        for _ in range(2 * m):
+            solver.implicit_time_step(dt / m)
+        assert np.isclose(solver.time, reference.time, rtol=1e-14)
+        errors.append(abs(solver.s - reference.s).max())
+
+    assert 3.5 <= errors[0] / errors[1] <= 4.5
+
+
+@pytest.mark.parametrize("solver_cls, layout, theta", [
+    (ThreePhaseEuler2D, 'variable', 0.5),
+    (FortranTwoPhaseEuler2D, 'variable', 0.5),
+    (FortranThreePhaseEuler2D, 'variable', 1.0),
+    (FortranThreePhaseEuler2D, 'blocked', 0.5),
+])
+def test_implicit_step_beyond_cfl(solver_cls, layout, theta):
+    solver = make_solver(solver_cls, layout, profile=True)
+    mass0, water0, energy0 = totals(solver)
+    dt = 20 * solver.get_dt()
+
+    for _ in range(2):
+        niter = solver.implicit_time_step(dt, theta=theta)
+        assert 0 < niter <= 10
+
+    # mass is conserved to round off. q rather than h * q is prognostic, so water and energy are conserved to the
+    # truncation error of the step, which the trapezoidal rule keeps small for the energy
+    mass, water, energy = totals(solver)
+    assert abs(mass - mass0) <= 1e-13 * mass0
+    assert abs(water - water0) <= 1e-6 * water0
+    if theta == 0.5:
+        assert abs(energy - energy0) <= 1e-7 * abs(energy0)
+
+    # the diagnostic variables are consistent with the new state
+    state = np.copy(solver.state)
+    solver.set_thermo_vars(state)
+    assert np.allclose(state, solver.state, rtol=1e-10, atol=0)
+
+    counters = solver.profiler.counters
+    assert counters['jfnk_newton_iterations'] > 0 and counters['jfnk_krylov_iterations'] > 0
+    assert solver.implicit_preconditioner.age == 2
+
+
+def test_implicit_step_not_converged():
+    solver = make_solver(FortranThreePhaseEuler2D)
+    with pytest.raises(RuntimeError):
+        solver.implicit_time_step(20 * solver.get_dt(), max_iters=1)
@@ -0,0 +1,130 @@
+import pytest
+import numpy as np
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+
+
+def make_solver(solver_cls, layout='variable'):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 8
+    nx = 8
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, layout=layout
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # a uniform wind with a vertical wave, so the upwinding is away from its kink at zero velocity
+    u = 10.0 + np.zeros_like(solver_.zs)
+    v = np.sin(2 * np.pi * solver_.xs / 10_000)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+def direction(solver):
+    # a smooth direction with each prognostic variable scaled to its magnitude
+    v = np.zeros_like(solver.state)
+    for i, arr in enumerate(solver.get_vars(v)[:solver.nprognostic]):
+        scale = abs(solver.get_vars(solver.state)[i]).max()
+        arr[:] = scale * np.cos(2 * np.pi * (solver.xs / 10_000 + solver.zs / 5_000 + 0.1 * i))
+    return v
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranTwoPhaseEuler2D, FortranThreePhaseEuler2D])
+def test_matvec_matches_central_difference(solver_cls):
+    solver = make_solver(solver_cls)
+    v = direction(solver)
+
+    solver.linearise()
+    Jv = solver.matvec(v)
+
+    eps = 1e-5
+    state_p, state_m = np.copy(solver.state), np.copy(solver.state)
+    for arr_p, arr_m, varr in zip(solver.get_vars(state_p), solver.get_vars(state_m), solver.get_vars(v)[:solver.nprognostic]):
+        arr_p += eps * varr
+        arr_m -= eps * varr
+    expected = (solver.rhs(state_p) - solver.rhs(state_m)) / (2 * eps)
+
+    for arr, expected_arr in zip(solver.get_vars(Jv), solver.get_vars(expected)):
+        assert abs(arr - expected_arr).max() <= 1e-5 * abs(expected_arr).max()
+
+
+def test_matvec_linear():
+    solver = make_solver(FortranThreePhaseEuler2D)
+    v = direction(solver)
+    solver.linearise()
+    Jv = solver.matvec(v)
+
+    # the finite difference step scales with v, and the diagnostic slots of v are ignored
+    assert np.allclose(solver.matvec(2 * v), 2 * Jv, rtol=1e-14, atol=1e-14 * abs(Jv).max())
+    assert abs(solver.matvec(-v) + Jv).max() <= 1e-5 * abs(Jv).max()
+    v[5 * solver.xs.size:] = 1.0
+    assert np.array_equal(solver.matvec(v), Jv)
+    assert not solver.matvec(np.zeros_like(v)).any()
+
+
+@pytest.mark.parametrize("layout", ['variable', 'blocked'])
+def test_matvec_leaves_solver_unchanged(layout):
+    solver = make_solver(FortranThreePhaseEuler2D, layout)
+    state = np.copy(solver.state)
+    caches = [np.copy(arr) for arr in solver.moisture_fractions()]
+
+    solver.linearise()
+    solver.matvec(direction(solver))
+
+    assert np.array_equal(solver.state, state)
+    for arr, cache in zip(solver.moisture_fractions(), caches):
+        assert np.array_equal(arr, cache)
+
+
+def test_rhs_rediagnoses_thermodynamics():
+    solver = make_solver(FortranThreePhaseEuler2D)
+    expected = solver.rhs(solver.state)
+
+    # stale diagnostic variables do not change the right hand side
+    state = np.copy(solver.state)
+    state[5 * solver.xs.size:] *= 1.01
+    assert np.allclose(solver.rhs(state), expected, rtol=1e-12, atol=1e-12 * abs(expected).max())
+
+
+def test_as_linear_operator():
+    pytest.importorskip('scipy')
+    solver = make_solver(FortranThreePhaseEuler2D)
+    v = direction(solver)
+
+    op = solver.as_linear_operator()
+    assert op.shape == solver.shape and op.dtype == solver.dtype
+    assert np.array_equal(op.matvec(v), solver.matvec(v))
+    assert np.array_equal(op @ v[:, None], solver.matvec(v)[:, None])
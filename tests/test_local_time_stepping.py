@@ -0,0 +1,198 @@
+import pytest
+import numpy as np
+from moist_euler_dg.two_phase_euler_2D import TwoPhaseEuler2D
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+from moist_euler_dg import local_time_stepping
+
+
+def make_solver(solver_cls, layout='variable', refine=0.9, profile=False):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain. The columns narrow towards the
+    # periodic seam by a factor 1 - refine
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5 - refine * np.sin(2 * np.pi * x) / (2 * np.pi))
+
+    # number of cells in the vertical and horizontal direction
+    nz = 4
+    nx = 12
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, layout=layout, profile=profile
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm bubble across the narrow columns so the dynamics are not at rest
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    s = s + 2.0 * np.exp(-(r / 2_000.0) ** 2)
+
+    return u, v, density, s, qw
+
+
+def test_cell_tiers():
+    solver = make_solver(FortranThreePhaseEuler2D)
+    dt, tiers = local_time_stepping.cell_tiers(solver)
+
+    # every cell steps within its limit, the narrow columns at the seam are the finest
+    assert (dt / 2 ** tiers <= solver.get_cell_dt() * (1 + 1e-12)).all()
+    assert tiers.max() > 0 and (tiers[0] == tiers.max()).all() and (tiers[solver.nx // 2] == 0).all()
+    assert dt > solver.get_dt()
+    assert abs(np.roll(tiers, 1, axis=0) - tiers).max() <= 1
+    assert abs(tiers[:, 1:] - tiers[:, :-1]).max() <= 1
+
+    with pytest.raises(ValueError):
+        local_time_stepping.cell_tiers(solver, 8 * solver.get_dt(), max_tiers=2)
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_single_tier_matches_time_step(solver_cls):
+    solver = make_solver(solver_cls, refine=0.0)
+    reference = make_solver(solver_cls, refine=0.0)
+    dt = solver.get_dt()
+
+    for _ in range(2):
+        assert solver.local_time_step(dt) == dt
+        reference.time_step(dt)
+
+    assert np.array_equal(solver.state, reference.state)
+    assert solver.time == reference.time
+
+
+@pytest.mark.parametrize("solver_cls", [FortranTwoPhaseEuler2D, FortranThreePhaseEuler2D])
+def test_solve_active(solver_cls):
+    solver = make_solver(solver_cls)
+    expected = solver.solve(solver.state)
+
+    # single levels, the bottom and top levels and a column with a gap between its active levels
+    active = np.zeros((solver.nx, solver.nz), dtype=bool)
+    active[[0, 4, 5, -1], 1] = True
+    active[2, 3] = True
+    active[8, [0, 3]] = True
+    dstatedt = solver.solve_active(solver.state, np.zeros_like(solver.state), active)
+
+    # the tendencies of the active cells are those of solve
+    for arr, expected_arr in zip(solver.get_vars(dstatedt), solver.get_vars(expected)):
+        assert np.array_equal(arr[active], expected_arr[active])
+    assert solver.active_levels is None
+
+    # the kernels skip the levels more than one from the active ones, only gravity is added to every cell
+    for arr in solver.get_vars(dstatedt)[2:solver.nprognostic]:
+        assert (arr[0, 3] == 0).all() and (arr[2, 0] == 0).all() and (arr[1] == 0).all()
+
+    first, last = local_time_stepping.level_ranges(active)
+    assert first.tolist() == [2, 0, 4, 0, 2, 2, 0, 0, 1, 0, 0, 2]
+    assert last.tolist() == [2, 0, 4, 0, 2, 2, 0, 0, 4, 0, 0, 2]
+
+
+@pytest.mark.parametrize("solver_cls", [TwoPhaseEuler2D, ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_set_thermo_vars_active(solver_cls):
+    solver = make_solver(solver_cls)
+    state = np.copy(solver.state)
+    fractions = [np.copy(arr) for arr in solver.moisture_fractions()]
+    u, w, h, s, qw, T, mu, p, ie = solver.get_vars(state)
+    s += 1.0
+    T[:] = 0.0
+
+    active = np.zeros((solver.nx, solver.nz), dtype=bool)
+    active[[0, 5], 1] = True
+    active[8, [0, 3]] = True
+    solver.set_thermo_vars_active(state, active)
+
+    # the active cells are solved, the others are left as they were
+    expected = np.copy(state)
+    solver.set_thermo_vars(expected)
+    for arr, expected_arr in zip(solver.get_vars(state)[5:], solver.get_vars(expected)[5:]):
+        assert np.allclose(arr[active], expected_arr[active], rtol=1e-9, atol=0)
+    assert (T[~active] == 0.0).all()
+    assert [arr.shape for arr in solver.moisture_fractions()] == [arr.shape for arr in fractions]
+
+
+@pytest.mark.parametrize("solver_cls, layout", [
+    (ThreePhaseEuler2D, 'variable'),
+    (FortranTwoPhaseEuler2D, 'variable'),
+    (FortranThreePhaseEuler2D, 'variable'),
+    (FortranThreePhaseEuler2D, 'blocked'),
+])
+def test_local_time_step_conserves_mass(solver_cls, layout):
+    solver = make_solver(solver_cls, layout, profile=True)
+    mass0 = solver.integrate(solver.get_vars(solver.state)[2])
+
+    dt = solver.local_time_step()
+    _, tiers = local_time_stepping.cell_tiers(solver, dt)
+    assert tiers.max() >= 2
+    solver.local_time_step(dt)
+
+    # the fluxes through the faces between tiers are those of the finer side
+    mass = solver.integrate(solver.get_vars(solver.state)[2])
+    assert abs(mass - mass0) <= 1e-14 * mass0
+    assert np.isclose(solver.time, 2 * dt, rtol=1e-14)
+
+    # the diagnostic variables are consistent with the new state
+    state = np.copy(solver.state)
+    solver.set_thermo_vars(state)
+    assert np.allclose(state, solver.state, rtol=1e-10, atol=0)
+
+    # a tier k cell is stepped with each of the tiers 0 to k
+    assert solver.profiler.counters['lts_cell_steps'] == 2 * (2 ** (tiers + 1) - 1).sum()
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+@pytest.mark.parametrize("finer", ['column', 'level', 'cell'])
+def test_local_time_step_third_order(solver_cls, finer):
+    tiers = np.zeros((12, 4), dtype=int)
+    if finer == 'column':
+        tiers[2] = 1
+    elif finer == 'level':
+        tiers[:, 2] = 1
+    else:
+        tiers[2, 2] = 1
+
+    reference = make_solver(solver_cls, refine=0.0)
+    dt = reference.get_dt()
+    for _ in range(64):
+        reference.time_step(dt / 64)
+
+    # the coarser cells are interpolated to third order, so the steps converge at the order of time_step
+    errors = []
+    for m in [2, 4]:
+        solver = make_solver(solver_cls, refine=0.0)
+        levels = [local_time_stepping.Tier(solver, tiers, k) for k in range(2)]
+        for _ in range(m):
+            local_time_stepping.advance_tier(solver, tiers, levels, 0, dt / m, 0.0)
+        errors.append(max(
+            abs(arr - expected).max() / abs(expected).max()
+            for arr, expected in zip(solver.get_vars(solver.state)[:5], reference.get_vars(reference.state)[:5])
+        ))
+
+    assert errors[0] / errors[1] >= 6
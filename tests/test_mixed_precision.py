@@ -0,0 +1,110 @@
+import pytest
+import numpy as np
+from moist_euler_dg.two_phase_euler_2D import TwoPhaseEuler2D
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+
+
+def make_solver(solver_cls, precision):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 8
+    nx = 16
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, precision=precision
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm, saturated bubble so the condensate paths are exercised
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    bubble = np.exp(-(r / 1_000.0) ** 2)
+    qw = qw * (1 + 0.2 * bubble)
+    s = s + 2.0 * bubble
+
+    return u, v, density, s, qw
+
+
+@pytest.mark.parametrize("solver_cls", [TwoPhaseEuler2D, ThreePhaseEuler2D])
+def test_mixed_precision_storage(solver_cls):
+    solver = make_solver(solver_cls, 'mixed')
+    double = make_solver(solver_cls, 'double')
+
+    assert solver.state.dtype == np.float32
+    assert all(arr.dtype == np.float32 for arr in solver.private_working_arrays)
+    assert solver.J.dtype == np.float32 and solver.D.dtype == np.float32
+    assert solver.state.nbytes == double.state.nbytes // 2
+
+    # the right hand side stays in single precision
+    dstatedt = solver.solve(solver.state)
+    assert dstatedt.dtype == np.float32
+
+    # moisture fractions from the promoted thermodynamic solve
+    assert solver.qv.dtype == np.float64
+    assert np.allclose(solver.qv, double.qv, rtol=1e-5, atol=1e-12)
+
+
+@pytest.mark.parametrize("solver_cls", [TwoPhaseEuler2D, ThreePhaseEuler2D])
+def test_mixed_precision_energy_drift(solver_cls):
+    solver = make_solver(solver_cls, 'mixed')
+    double = make_solver(solver_cls, 'double')
+    dt = double.get_dt()
+
+    e0 = solver.energy()
+    e0_double = double.energy()
+    assert isinstance(e0, np.float64)
+    assert abs(e0 - e0_double) <= 1e-6 * abs(e0_double)
+
+    for _ in range(20):
+        solver.time_step(dt)
+        double.time_step(dt)
+
+    assert solver.state.dtype == np.float32
+    assert abs(solver.energy() - e0) <= 1e-5 * abs(e0)
+    assert abs(double.energy() - e0_double) <= 1e-8 * abs(e0_double)
+
+
+@pytest.mark.parametrize("solver_cls", [FortranTwoPhaseEuler2D, FortranThreePhaseEuler2D])
+def test_fortran_mixed_precision_not_implemented(solver_cls):
+    with pytest.raises(NotImplementedError):
+        make_solver(solver_cls, 'mixed')
+
+
+def test_unknown_precision():
+    with pytest.raises(ValueError):
+        make_solver(ThreePhaseEuler2D, 'half')
@@ -0,0 +1,159 @@
+import pytest
+import numpy as np
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.forcing import TemperatureForcing, VerticalDiffusion
+
+
+def make_solver(solver_cls, forcing=None, profile=False):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 8
+    nx = 8
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, forcing=forcing, profile=profile
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm bubble so the dynamics are not at rest
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    s = s + 2.0 * np.exp(-(r / 1_000.0) ** 2)
+
+    return u, v, density, s, qw
+
+
+def cooling(solver):
+    # strong cooling so the splitting error is visible
+    return -1e-2 * solver.zs / 10_000
+
+
+@pytest.mark.parametrize("splitting", ['strang', 'lie', 'hold'])
+def test_multirate_without_forcing(splitting):
+    solver1 = make_solver(ThreePhaseEuler2D)
+    solver2 = make_solver(ThreePhaseEuler2D)
+    dt = solver1.get_dt()
+
+    # nothing limits the physics step so the dynamics are subcycled max_subcycles times
+    assert solver2.get_physics_dt() == np.inf
+    assert solver2.multirate_step(dt, max_subcycles=3, splitting=splitting) == 3
+    for _ in range(3):
+        solver1.time_step(dt)
+
+    assert np.array_equal(solver1.state, solver2.state)
+    assert solver1.time == solver2.time
+
+
+@pytest.mark.parametrize("splitting", ['strang', 'lie', 'hold'])
+def test_multirate_matches_single_rate(splitting):
+    solver1 = make_solver(ThreePhaseEuler2D, forcing=TemperatureForcing(cooling))
+    solver2 = make_solver(ThreePhaseEuler2D, forcing=TemperatureForcing(cooling))
+    solver3 = make_solver(ThreePhaseEuler2D)
+    dt = solver1.get_dt()
+
+    for _ in range(4):
+        solver1.time_step(dt)
+        solver3.time_step(dt)
+    assert solver2.multirate_step(dt, nsub=4, splitting=splitting) == 4
+    assert solver1.time == solver2.time
+
+    # the splitting error is small compared with the change due to the forcing
+    change = abs(solver1.s - solver3.s).max()
+    assert change > 0
+    assert abs(solver1.s - solver2.s).max() <= 1e-3 * change
+
+
+def test_multirate_subcycles_from_stability_limit():
+    # explicit diffusion limits the physics step, the implicit solve does not
+    K = lambda solver: 1e4 * (solver.zs < 2_500.0)
+    solver = make_solver(ThreePhaseEuler2D, forcing=[TemperatureForcing(cooling), VerticalDiffusion(K)])
+    dt = solver.get_dt()
+    dt_physics = solver.get_physics_dt()
+    assert 2 * dt < dt_physics < 50 * dt
+    assert solver.multirate_step(dt, max_subcycles=100) == int(dt_physics / dt)
+
+    solver = make_solver(ThreePhaseEuler2D, forcing=VerticalDiffusion(K, mode='implicit'))
+    assert solver.get_physics_dt() == np.inf
+    assert solver.multirate_step(max_subcycles=5) == 5
+
+
+@pytest.mark.parametrize("splitting", ['strang', 'lie'])
+def test_multirate_subcycles_forcing_below_dt(splitting):
+    # explicit diffusion strong enough that its limit is below the dynamics step
+    K = lambda solver: 1e6 * (solver.zs < 2_500.0)
+    solver = make_solver(ThreePhaseEuler2D, forcing=VerticalDiffusion(K), profile=True)
+    reference = make_solver(ThreePhaseEuler2D, forcing=VerticalDiffusion(K))
+    dt = solver.get_dt()
+    dt_physics = solver.get_physics_dt()
+    assert dt_physics < 0.5 * dt
+
+    # the forcings are stepped within their limit, as with forcing_step in steps of at most dt_physics
+    assert solver.multirate_step(dt, splitting=splitting) == 1
+    nforce = int(np.ceil(dt / dt_physics)) if splitting == 'lie' else 2 * int(np.ceil(0.5 * dt / dt_physics))
+    assert solver.profiler.counters['multirate_forcing_steps'] == nforce
+    assert np.isfinite(solver.state).all()
+
+    if splitting == 'lie':
+        reference.advance(1, dt, forcing=False)
+        for _ in range(nforce):
+            reference.forcing_step(dt / nforce)
+        assert np.array_equal(solver.state, reference.state)
+
+    with pytest.raises(ValueError):
+        make_solver(ThreePhaseEuler2D, forcing=VerticalDiffusion(K)).multirate_step(dt, splitting='hold')
+
+
+def test_fortran_multirate_uses_compiled_subcycles():
+    solver1 = make_solver(FortranThreePhaseEuler2D, forcing=TemperatureForcing(cooling), profile=True)
+    solver2 = make_solver(FortranThreePhaseEuler2D, forcing=TemperatureForcing(cooling))
+    dt = solver1.get_dt()
+
+    solver1.multirate_step(dt, nsub=4)
+    solver2.forcing_step(2 * dt)
+    for _ in range(4):
+        solver2.time_step(dt, forcing=False)
+    solver2.forcing_step(2 * dt)
+
+    assert solver1.profiler.counters['advance_steps'] == 4
+    assert solver1.profiler.counters['multirate_subcycles'] == 4
+    assert np.allclose(solver1.s, solver2.s, rtol=1e-9, atol=0)
+
+
+def test_unknown_splitting():
+    solver = make_solver(ThreePhaseEuler2D)
+    with pytest.raises(ValueError):
+        solver.multirate_step(splitting='yoshida')
@@ -0,0 +1,180 @@
+import pytest
+import numpy as np
+from moist_euler_dg.euler_2D import Euler2D
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.forcing import RayleighDamping, top_sponge, lateral_sponge
+from moist_euler_dg import fortran_advance
+
+
+def make_solver(solver_cls, zlim=10_000, nz=8, top_bc='wall', forcing=None, pulse=True):
+    xlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the horizontal direction
+    nx = 8
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, top_bc=top_bc, forcing=forcing
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+    if pulse:
+        add_acoustic_pulse(solver_)
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.5, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+def add_acoustic_pulse(solver_):
+    # upward travelling acoustic pulse below the top, the isentropic density perturbation is h w / c
+    u, w, h, s, q, T, mu, p, ie = solver_.get_vars(solver_.state)
+    c_sound = np.sqrt(solver_.gamma * p / h)
+    w_phys = np.exp(-((solver_.zs - 7_000.0) / 600.0) ** 2)
+    u[:], w[:] = solver_.phys_to_cov(np.zeros_like(w_phys), w_phys)
+    h += h * w_phys / c_sound
+    solver_.set_thermo_vars(solver_.state)
+
+
+def kinetic_energy(solver, zlim=10_000):
+    return solver.integrate(0.5 * solver.h * (solver.u ** 2 + solver.w ** 2) * (solver.zs <= zlim))
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_outflow_balanced_state(solver_cls):
+    # the ghost state of a resting state is the reference, so the outflow top matches the wall
+    solver1 = make_solver(solver_cls, pulse=False)
+    solver2 = make_solver(solver_cls, top_bc='outflow', pulse=False)
+
+    dstatedt1 = solver1.solve(solver1.state)
+    dstatedt2 = solver2.solve(solver2.state)
+    assert np.allclose(dstatedt1, dstatedt2, rtol=0, atol=1e-12 * abs(dstatedt1).max())
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_outflow_only_changes_top_face(solver_cls):
+    solver1 = make_solver(solver_cls)
+    solver2 = make_solver(solver_cls, top_bc='outflow')
+    diff = solver2.unflatten(solver2.solve(solver2.state) - solver1.solve(solver1.state))
+
+    assert abs(diff[(slice(None),) + solver1.im_vert_ext]).max() > 0
+    diff[(slice(None),) + solver1.im_vert_ext] = 0.0
+    assert abs(diff).max() == 0.0
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_outflow_absorbs_acoustic_pulse(solver_cls):
+    # the pulse leaves through the top, as in a taller domain, where the wall reflects it back
+    wall = make_solver(solver_cls)
+    outflow = make_solver(solver_cls, top_bc='outflow')
+    tall = make_solver(solver_cls, zlim=15_000, nz=12)
+
+    e0 = kinetic_energy(wall)
+    dt = 0.5
+    for _ in range(32):
+        for solver in [wall, outflow, tall]:
+            solver.time_step(dt)
+
+    e_wall, e_outflow, e_tall = (kinetic_energy(solver) for solver in [wall, outflow, tall])
+    assert e_outflow <= 0.01 * e0 and abs(e_outflow - e_tall) <= 0.01 * e0
+    assert e_wall >= 0.9 * e0
+
+
+def test_outflow_not_compiled():
+    solver = make_solver(FortranThreePhaseEuler2D, top_bc='outflow', pulse=False)
+    assert not fortran_advance.can_advance_compiled(solver)
+
+
+def test_unknown_top_bc():
+    with pytest.raises(ValueError):
+        make_solver(ThreePhaseEuler2D, top_bc='periodic')
+
+    # the dry solver has no outflow boundary, it fails at construction rather than in the first solve
+    with pytest.raises(NotImplementedError):
+        Euler2D(lambda x, z: 10_000 * (x - 0.5), lambda x, z: 10_000 * z, 3, 4, g=9.81, nz=4, top_bc='outflow')
+
+
+def test_rayleigh_damping_tendency():
+    sponge = RayleighDamping([top_sponge(10_000, 2_500.0, 0.1), lateral_sponge(-5_000, 5_000, 1_250.0, 0.05)])
+    solver = make_solver(ThreePhaseEuler2D, forcing=sponge, pulse=False)
+    solver.setup_forcing()
+    add_acoustic_pulse(solver)
+
+    coeff = top_sponge(10_000, 2_500.0, 0.1)(solver) + lateral_sponge(-5_000, 5_000, 1_250.0, 0.05)(solver)
+    # only the top two levels and the outer columns are stored
+    assert sponge.coeff_.shape[0] == 2 * 8 + 2 * 6
+    assert sponge.max_dt(solver) == pytest.approx(2.0 / coeff.max())
+    assert sponge.max_dt(solver, radius=5.0) == pytest.approx(5.0 / coeff.max())
+
+    # relaxed towards the resting initial state
+    dstatedt = np.zeros_like(solver.state)
+    sponge.apply(solver, solver.state, dstatedt)
+    u, w, *_ = solver.get_vars(solver.state)
+    dudt, dwdt, dhdt, *_ = solver.get_vars(dstatedt)
+    assert np.allclose(dwdt, -coeff * w, rtol=1e-12, atol=0)
+    assert np.allclose(dudt, -coeff * u, rtol=1e-12, atol=0) and np.all(dhdt == 0.0)
+
+
+def test_split_rayleigh_damping():
+    sponge = RayleighDamping(top_sponge(10_000, 2_500.0, 0.1), variables=('w', 's'), split=True)
+    solver = make_solver(ThreePhaseEuler2D, forcing=sponge, pulse=False)
+    solver.setup_forcing()
+    add_acoustic_pulse(solver)
+    assert sponge.max_dt(solver) == np.inf
+
+    coeff = top_sponge(10_000, 2_500.0, 0.1)(solver)
+    s_ref = np.copy(solver.s)
+    w0 = np.copy(solver.get_vars(solver.state)[1])
+    solver.s[:] += 1.0
+
+    # exact relaxation, so steps beyond the explicit limit are stable
+    dt = 100.0
+    sponge.split_step(solver, solver.state, dt)
+    assert np.allclose(solver.get_vars(solver.state)[1], w0 * np.exp(-coeff * dt), rtol=1e-12, atol=0)
+    assert np.allclose(solver.s, s_ref + np.exp(-coeff * dt), rtol=1e-12, atol=0)
+
+
+def test_rayleigh_damping_reference_from_initial_condition():
+    sponge = RayleighDamping(top_sponge(10_000, 2_500.0, 0.1), variables=('w', 's'), split=True)
+    solver = make_solver(ThreePhaseEuler2D, forcing=sponge, pulse=False)
+    s0 = np.copy(solver.s)
+
+    # a state loaded before the first step, as from a restart, is not the reference
+    solver.s[:] += 1.0
+    solver.time_step()
+    assert np.array_equal(sponge.reference_[1], s0[sponge.cells])
+
+
+def test_rayleigh_damping_options():
+    with pytest.raises(ValueError):
+        RayleighDamping(0.1, variables=('T',))
+    assert RayleighDamping(0.1, split=True).split and not RayleighDamping(0.1).split
@@ -0,0 +1,110 @@
+import pytest
+import numpy as np
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+
+
+def make_solver(solver_cls):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: (z + 0.5 * z ** 2) * zlim / 1.5
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 8
+    nx = 16
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+def troubled_state(solver_):
+    np.random.seed(1)
+    state = np.copy(solver_.state)
+    h, qw = solver_.get_vars(state)[2], solver_.get_vars(state)[4]
+    # a few cells with negative and tiny water nodes but positive means
+    qw[3, 2, 0, :] = -1e-6
+    qw[7, 5, :, 1] = 1e-15
+    qw[11, 0] *= 1 + 0.5 * (np.random.random(qw[11, 0].shape) - 0.5)
+    qw[11, 0, 2, 2] = -1e-5
+    return state
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_limit_water(solver_cls):
+    solver = make_solver(solver_cls)
+    state = troubled_state(solver)
+    h, qw = solver.get_vars(state)[2], solver.get_vars(state)[4]
+    qw_in = np.copy(qw)
+
+    hqw_limited, hqw_means = solver.positivity_preserving_limiter(h * qw)
+    nonpositive, nlimited, status = solver.limit_water(h, qw)
+
+    assert nonpositive and nlimited == 3 and status == 0
+    assert (qw > 0).all()
+    assert np.allclose(qw * h, hqw_limited, rtol=1e-12, atol=1e-18)
+
+    # cells without troubled nodes are not touched and cell means are conserved
+    troubled = np.zeros(qw.shape[:2], dtype=bool)
+    troubled[3, 2] = troubled[7, 5] = troubled[11, 0] = True
+    assert np.array_equal(qw[~troubled], qw_in[~troubled])
+    assert np.allclose((h * qw * solver.cell_mass).sum(axis=(2, 3)) * solver.inv_cell_mass, hqw_means)
+
+
+def test_fortran_limit_water_matches_numpy():
+    solver1 = make_solver(ThreePhaseEuler2D)
+    solver2 = make_solver(FortranThreePhaseEuler2D)
+    state1 = troubled_state(solver1)
+    state2 = troubled_state(solver2)
+
+    solver1.check_positivity(state1)
+    solver2.check_positivity(state2)
+
+    # the thermodynamic variables differ between backends at round-off, only compare the water
+    assert np.allclose(solver1.get_vars(state1)[4], solver2.get_vars(state2)[4], rtol=1e-10, atol=1e-16)
+    assert solver1.limited_cells == solver2.limited_cells == 3
+    assert solver1.first_water_limit_time == solver2.first_water_limit_time == 0.0
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_negative_cell_mean_raises(solver_cls):
+    solver = make_solver(solver_cls)
+    state = np.copy(solver.state)
+    solver.get_vars(state)[4][5, 3] = -1e-6
+
+    with pytest.raises(RuntimeError):
+        solver.check_positivity(state)
@@ -0,0 +1,128 @@
+import json
+import csv
+import pytest
+import numpy as np
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.profiling import Profiler
+
+
+def make_solver(solver_cls, profile):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical and horizontal direction
+    nz = 4
+    nx = 4
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 2  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, profile=profile
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+def test_nested_regions():
+    profiler = Profiler(enabled=True)
+
+    with profiler.region('outer'):
+        for _ in range(3):
+            with profiler.region('inner'):
+                pass
+    profiler.count('events', 2)
+    profiler.count('events', 3)
+
+    rows = {row['name']: row for row in profiler.summary()}
+    assert rows['outer']['calls'] == 1
+    assert rows['outer/inner']['calls'] == 3
+    assert rows['outer']['max'] >= rows['outer/inner']['max']
+    assert rows['events']['kind'] == 'counter'
+    assert rows['events']['total'] == 5
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler(enabled=False)
+
+    with profiler.region('outer'):
+        profiler.count('events')
+
+    assert profiler.summary() == []
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_solver_profile(solver_cls, tmp_path):
+    solver = make_solver(solver_cls, profile=True)
+    solver.profiler.reset()
+
+    solver.time_step()
+    solver.energy()
+
+    rows = {row['name']: row for row in solver.profiler.summary()}
+    assert rows['time_step']['calls'] == 1
+    assert rows['time_step/solve']['calls'] == 4
+    assert rows['time_step/solve/volume']['calls'] == 4
+    assert rows['time_step/positivity']['calls'] == 4
+    assert rows['time_step/thermodynamics']['calls'] == 4
+    assert rows['diagnostics']['calls'] == 1
+    assert rows['newton_iterations']['total'] >= 0
+    assert rows['limited_cells']['total'] == 0
+
+    # supersaturated air needs Newton iterations for the condensate fractions
+    n0 = solver.profiler.counters['newton_iterations']
+    solver.get_thermodynamic_quantities(solver.h, solver.s, 1.2 * solver.q)
+    assert solver.profiler.counters['newton_iterations'] > n0
+
+    solver.save_profile(str(tmp_path / 'profile.json'))
+    with open(tmp_path / 'profile.json') as f:
+        report = json.load(f)
+    assert report['metadata']['solver'] == solver_cls.__name__
+    assert {row['name'] for row in report['regions']} == set(rows.keys())
+
+    solver.save_profile(str(tmp_path / 'profile.csv'))
+    with open(tmp_path / 'profile.csv') as f:
+        assert len(list(csv.DictReader(f))) == len(rows)
+
+
+def test_profile_does_not_change_solution():
+    solver1 = make_solver(FortranThreePhaseEuler2D, profile=False)
+    solver2 = make_solver(FortranThreePhaseEuler2D, profile=True)
+
+    for _ in range(2):
+        solver1.time_step()
+        solver2.time_step()
+
+    assert np.array_equal(solver1.state, solver2.state)
+    assert solver1.profiler.summary() == []
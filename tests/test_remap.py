@@ -0,0 +1,135 @@
+import pytest
+import numpy as np
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.remap import remap, load_remapped
+
+xlim = 10_000
+zlim = 10_000
+# maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+zmap = lambda x, z: z * zlim
+xmap = lambda x, z: xlim * (x - 0.5)
+
+
+def make_solver(solver_cls, nx, nz, poly_order, set_state=True, z_edges=None):
+    g = 9.81  # gravitational acceleration
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, z_edges=z_edges
+    )
+
+    if set_state:
+        solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # shear flow over a hydrostatically balanced pressure and density profile
+    u = 5.0 * np.sin(2 * np.pi * solver_.xs / xlim) * solver_.zs / zlim
+    v = np.cos(2 * np.pi * solver_.xs / xlim) * np.sin(np.pi * solver_.zs / zlim)
+
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm, moist bubble
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    bubble = np.exp(-(r / 1_000.0) ** 2)
+    qw = qw * (1 + 0.2 * bubble)
+    s = s + 2.0 * bubble
+
+    return u, v, density, s, qw
+
+
+def totals(solver):
+    return solver.integrate(solver.h), solver.integrate(solver.h * solver.q)
+
+
+def assert_states_close(solver1, solver2, rtol):
+    for i, (arr1, arr2) in enumerate(zip(solver1.get_vars(solver1.state), solver2.get_vars(solver2.state))):
+        assert abs(arr1 - arr2).max() <= rtol * abs(arr1).max(), i
+
+
+def test_remap_identity():
+    source = make_solver(ThreePhaseEuler2D, 8, 8, 3)
+    target = make_solver(ThreePhaseEuler2D, 8, 8, 3, set_state=False)
+    remap(source, target)
+    assert_states_close(source, target, 1e-12)
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_remap_refine_and_back(solver_cls):
+    # the refined state holds the source polynomials exactly, so remapping back recovers the source
+    coarse = make_solver(solver_cls, 4, 6, 2)
+    fine = make_solver(solver_cls, 8, 12, 4, set_state=False)
+    remap(coarse, fine)
+    assert np.allclose(totals(fine), totals(coarse), rtol=1e-12, atol=0)
+
+    back = make_solver(solver_cls, 4, 6, 2, set_state=False)
+    remap(fine, back)
+    assert_states_close(coarse, back, 1e-10)
+
+
+def test_remap_coarsen_conserves():
+    fine = make_solver(ThreePhaseEuler2D, 12, 12, 4)
+    coarse = make_solver(ThreePhaseEuler2D, 5, 7, 2, set_state=False)
+    remap(fine, coarse)
+
+    assert np.allclose(totals(coarse), totals(fine), rtol=1e-12, atol=0)
+    # close to the state set directly on the coarse grid
+    direct = make_solver(ThreePhaseEuler2D, 5, 7, 2)
+    assert abs(coarse.h - direct.h).max() <= 1e-2 * direct.h.max()
+    assert abs(coarse.q - direct.q).max() <= 0.1 * direct.q.max()
+
+
+def stretched_edges(nz):
+    # levels closer together near the surface, the stretch map depends on nz
+    return zlim * np.linspace(0, 1, nz + 1) ** 1.5
+
+
+@pytest.mark.parametrize("source_stretched, target_stretched", [(True, True), (False, True), (True, False)])
+def test_remap_stretched(source_stretched, target_stretched):
+    # the target nodes are located at the same heights in the source, not at the same reference coordinates
+    edges = lambda nz, stretched: stretched_edges(nz) if stretched else None
+    source = make_solver(ThreePhaseEuler2D, 8, 6, 3, z_edges=edges(6, source_stretched))
+    target = make_solver(ThreePhaseEuler2D, 8, 12, 3, set_state=False, z_edges=edges(12, target_stretched))
+    remap(source, target)
+
+    assert np.allclose(totals(target), totals(source), rtol=1e-12, atol=0)
+    direct = make_solver(ThreePhaseEuler2D, 8, 12, 3, z_edges=edges(12, target_stretched))
+    assert abs(target.h - direct.h).max() <= 1e-4 * direct.h.max()
+
+    back = make_solver(ThreePhaseEuler2D, 8, 6, 3, set_state=False, z_edges=edges(6, source_stretched))
+    remap(source, back)
+    assert_states_close(source, back, 1e-12)
+
+
+def test_load_remapped(tmp_path):
+    source = make_solver(FortranThreePhaseEuler2D, 8, 6, 3)
+    source.time_step()
+
+    # a decomposed run writes one file per part
+    fps = []
+    for part in range(2):
+        fp = str(tmp_path / f'state_{part}.npy')
+        state = source.unflatten(source.state)[:, 4 * part:4 * (part + 1)]
+        np.save(fp, np.ascontiguousarray(state))
+        fps.append(fp)
+
+    target = make_solver(FortranThreePhaseEuler2D, 16, 12, 3, set_state=False)
+    loaded = load_remapped(target, fps, 8, 6, 3, xmap, zmap)
+    assert_states_close(source, loaded, 0.0)
+    assert np.allclose(totals(target), totals(source), rtol=1e-12, atol=0)
@@ -0,0 +1,126 @@
+import pytest
+import numpy as np
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg.fortran_two_phase_euler_2D import FortranTwoPhaseEuler2D
+from moist_euler_dg.forcing import RayleighDamping, top_sponge
+
+
+def make_solver(solver_cls, nx=8, set_state=True, **kwargs):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the vertical direction
+    nz = 8
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, **kwargs
+    )
+
+    if set_state:
+        solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm, saturated bubble so the condensate paths are exercised
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    bubble = np.exp(-(r / 1_000.0) ** 2)
+    qw = qw * (1 + 0.2 * bubble)
+    s = s + 2.0 * bubble
+
+    return u, v, density, s, qw
+
+
+def make_sponge(sponge):
+    # relaxed towards the initial condition, which the restarted run has to take from the restart file
+    if not sponge:
+        return None
+    return RayleighDamping(top_sponge(10_000, 2_500.0, 0.1), variables=('u', 'w', 's'), split=sponge == 'split')
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranTwoPhaseEuler2D, FortranThreePhaseEuler2D])
+@pytest.mark.parametrize("top_bc, sponge", [
+    ('wall', None), ('outflow', None), ('wall', 'split'), ('outflow', 'explicit'),
+])
+def test_restart_bit_identical(solver_cls, top_bc, sponge, tmp_path):
+    continuous = make_solver(solver_cls, top_bc=top_bc, forcing=make_sponge(sponge))
+    stopped = make_solver(solver_cls, top_bc=top_bc, forcing=make_sponge(sponge))
+    dt = 0.7 * continuous.get_dt()
+
+    for _ in range(3):
+        continuous.time_step(dt)
+        stopped.time_step(dt)
+
+    fp = str(tmp_path / 'restart.npz')
+    stopped.save_restart(fp)
+    restarted = make_solver(solver_cls, top_bc=top_bc, set_state=False, forcing=make_sponge(sponge))
+    restarted.load_restart(fp)
+    assert restarted.time == continuous.time
+
+    for _ in range(3):
+        continuous.time_step(dt)
+        restarted.time_step(dt)
+
+    assert np.array_equal(restarted.state, continuous.state)
+    assert np.array_equal(restarted.qv, continuous.qv)
+    assert restarted.time == continuous.time
+
+
+def test_restart_metadata(tmp_path):
+    solver = make_solver(ThreePhaseEuler2D, profile=True)
+    solver.time_step()
+    solver.limited_cells = 3
+    solver.profiler.count('steps', 2)
+
+    fp = str(tmp_path / 'restart.npz')
+    solver.save_restart(fp, time_list=[0.0, solver.time], energy_list=[1.0, 2.0])
+
+    restarted = make_solver(ThreePhaseEuler2D, set_state=False, profile=True)
+    history = restarted.load_restart(fp)
+    assert np.array_equal(history['time_list'], [0.0, solver.time])
+    assert np.array_equal(history['energy_list'], [1.0, 2.0])
+    assert restarted.first_water_limit_time is None
+    assert restarted.limited_cells == 3
+    assert restarted.profiler.counters['steps'] == 2
+    assert np.array_equal(restarted.qi, solver.qi)
+
+    solver.first_water_limit_time = 12.5
+    solver.save_restart(fp)
+    restarted.load_restart(fp)
+    assert restarted.first_water_limit_time == 12.5
+
+
+def test_restart_mismatch(tmp_path):
+    fp = str(tmp_path / 'restart.npz')
+    make_solver(ThreePhaseEuler2D).save_restart(fp)
+    with pytest.raises(ValueError):
+        make_solver(ThreePhaseEuler2D, nx=16, set_state=False).load_restart(fp)
@@ -0,0 +1,51 @@
+import os
+import sys
+import subprocess
+import numpy as np
+from moist_euler_dg.parallel import SerialComm, SerialMPI, get_mpi
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+
+
+def run_python(code):
+    # fresh interpreter with this process' import path
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+
+
+def make_solver(solver_cls):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    return solver_cls(xmap, zmap, 3, 4, g=9.81, cfl=0.5, a=0.5, nz=4, upwind=True, nprocx=1)
+
+
+def test_serial_run_skips_mpi_and_matplotlib():
+    out = run_python(
+        "import sys\n"
+        "import numpy as np\n"
+        "from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D\n"
+        "solver = FortranThreePhaseEuler2D(lambda x, z: x, lambda x, z: z, 3, 4, g=9.81, nz=4, nprocx=1)\n"
+        "solver.integrate(solver.h)\n"
+        "print(sorted(name for name in ['mpi4py', 'matplotlib'] if name in sys.modules))\n"
+    )
+    assert out.strip() == '[]'
+
+
+def test_serial_comm():
+    solver = make_solver(ThreePhaseEuler2D)
+    assert isinstance(solver.comm, SerialComm) and solver.mpi is SerialMPI
+    assert get_mpi(serial=True) is SerialMPI
+
+    comm = SerialComm()
+    assert comm.Get_rank() == 0 and comm.Get_size() == 1
+    assert comm.allreduce(2.0, op=SerialMPI.MIN) == 2.0
+    assert comm.reduce(np.array([3.0]), op=SerialMPI.SUM)[0] == 3.0
+    assert comm.allgather({'a': 1}) == [{'a': 1}]
+    comm.Barrier()
+
+    # collectives of the solver go through the serial communicator
+    assert solver.integrate(np.ones_like(solver.xs)) == np.sum(solver.J * solver.weights2D[None, None])
+    assert solver.profiler.summary() is not None
@@ -0,0 +1,125 @@
+import pytest
+import numpy as np
+from moist_euler_dg.three_phase_euler_2D import ThreePhaseEuler2D
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+from moist_euler_dg import stability
+
+
+def make_solver(solver_cls, nx=6, nz=5, poly_order=3, a=0.5):
+    xlim = 10_000
+    zlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    g = 9.81  # gravitational acceleration
+    upwind = True
+
+    solver_ = solver_cls(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, nz=nz, upwind=upwind, nprocx=1, profile=True
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.95, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    # warm bubble so the dynamics are not at rest
+    r = np.sqrt(solver_.xs ** 2 + (solver_.zs - 2_000.0) ** 2)
+    s = s + 2.0 * np.exp(-(r / 1_000.0) ** 2)
+
+    return u, v, density, s, qw
+
+
+def test_amplification_factor():
+    # third order, the z ** 4 term of exp(z) is halved
+    z = 1e-2 * np.exp(1j * np.linspace(0, 2 * np.pi, 7))
+    assert np.allclose((stability.amplification_factor(z) - np.exp(z)) / z ** 4, -1 / 48, rtol=1e-2)
+
+    # the edge of the stability region
+    for angle in [0.5 * np.pi, 0.75 * np.pi, np.pi]:
+        r = stability.stability_radius(angle)
+        assert abs(stability.amplification_factor(r * np.exp(1j * angle))) == pytest.approx(1.0, abs=1e-9)
+        assert abs(stability.amplification_factor(0.9 * r * np.exp(1j * angle))) <= 1.0
+    assert stability.stability_radius(np.pi) == pytest.approx(5.1494861, rel=1e-6)
+
+
+def test_estimate_matches_dense_spectrum():
+    solver = make_solver(FortranThreePhaseEuler2D, nx=4, nz=3, poly_order=2)
+    estimate = solver.estimate_dt(safety=1.0)
+
+    # the eigenvalues of the jacobian from matvec on every unit vector
+    N = solver.nprognostic * solver.h.size
+    J = np.zeros((N, N))
+    for k in range(N):
+        e = np.zeros(N)
+        e[k] = 1.0
+        J[:, k] = stability.scaled_vector(solver, solver.matvec(stability.unscaled_state(solver, e)))
+    eigenvalues = np.linalg.eigvals(J)
+    eigenvalues = eigenvalues[abs(eigenvalues) > 0]
+    angles = np.clip(abs(np.angle(eigenvalues)), 0.5 * np.pi, np.pi)
+    exact = min(stability.stability_radius(angle) / abs(value) for angle, value in zip(angles, eigenvalues))
+
+    # the jacobian is not normal, so the Ritz values can lie either side of the eigenvalues
+    assert 0.95 * exact <= estimate <= 1.1 * exact
+    assert solver.profiler.counters['stability_arnoldi_iterations'] == 30
+
+
+def advance_stable(solver, dt, nsteps):
+    try:
+        for _ in range(nsteps):
+            solver.time_step(dt)
+            if not np.isfinite(solver.state).all() or abs(solver.w).max() > 100.0:
+                return False
+    except Exception:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("solver_cls", [ThreePhaseEuler2D, FortranThreePhaseEuler2D])
+def test_estimate_dt_is_stable(solver_cls):
+    solver = make_solver(solver_cls)
+    dt = solver.estimate_dt()
+    # the hand tuned cfl of the fixture is conservative
+    assert dt > solver.get_dt()
+
+    assert advance_stable(solver, dt, 200)
+    assert not advance_stable(make_solver(solver_cls), 1.5 * dt, 200)
+
+
+def test_estimate_dt_dissipation():
+    # the upwind dissipation a damps the fastest modes, which moves them into the wider part of the stability
+    # region
+    dissipative = make_solver(FortranThreePhaseEuler2D, a=0.5)
+    assert dissipative.estimate_dt() > make_solver(FortranThreePhaseEuler2D, a=0.0).estimate_dt()
+
+
+def test_calibrate_cfl():
+    solver = make_solver(FortranThreePhaseEuler2D)
+    cell_dt = solver.get_cell_dt()
+    dt = solver.estimate_dt()
+
+    cfl = solver.calibrate_cfl()
+    assert cfl == solver.cfl
+    assert solver.get_dt() == pytest.approx(dt, rel=1e-12)
+    assert np.allclose(solver.get_cell_dt() / cell_dt, dt / cell_dt.min(), rtol=1e-12)
@@ -0,0 +1,91 @@
+import pytest
+import numpy as np
+from moist_euler_dg.fortran_three_phase_euler_2D import FortranThreePhaseEuler2D
+
+
+zlim = 10_000
+nz = 12
+
+
+def stretched_edges():
+    # 25 m surface layer growing geometrically with height
+    dz = 25.0 * 1.4 ** np.arange(nz)
+    return np.concatenate([[0.0], np.cumsum(dz)])
+
+
+@pytest.fixture()
+def solver():
+    xlim = 10_000
+    # maps to define geometry these can be arbitrary - maps [0, 1]^2 to domain
+    zmap = lambda x, z: z * zlim
+    xmap = lambda x, z: xlim * (x - 0.5)
+
+    # number of cells in the horizontal direction
+    nx = 8
+
+    g = 9.81  # gravitational acceleration
+    poly_order = 3  # spatial order of accuracy
+    a = 0.5  # kinetic energy dissipation parameter
+    upwind = True
+
+    solver_ = FortranThreePhaseEuler2D(
+        xmap, zmap, poly_order, nx, g=g, cfl=0.5, a=a, upwind=upwind, nprocx=1, z_edges=stretched_edges()
+    )
+
+    solver_.set_initial_condition(*initial_condition(solver_))
+
+    return solver_
+
+
+def initial_condition(solver_):
+    # initial velocity is zero
+    u = np.zeros_like(solver_.zs)
+    v = np.zeros_like(solver_.zs)
+
+    # create a hydrostatically balanced pressure and density profile
+    dry_theta = 300
+    dexdy = -solver_.g / (solver_.cpd * dry_theta)
+    ex = 1 + dexdy * solver_.zs
+    p = 1_00_000.0 * ex ** (solver_.cpd / solver_.Rd)
+    density = p / (solver_.Rd * ex * dry_theta)
+
+    qw = solver_.rh_to_qw(0.5, p, density)
+    qd = 1 - qw
+
+    R = solver_.Rd * qd + solver_.Rv * qw
+    T = p / (R * density)
+    s = qd * solver_.entropy_air(T, qd, density)
+    s += qw * solver_.entropy_vapour(T, qw, density)
+
+    return u, v, density, s, qw
+
+
+def test_level_edges(solver):
+    edges = stretched_edges()
+    edges = zlim * edges / edges[-1]
+
+    assert solver.nz == nz
+    assert np.allclose(solver.zs[:, :, :, 0], edges[None, :-1, None])
+    assert np.allclose(solver.zs[:, :, :, -1], edges[None, 1:, None])
+
+
+def test_level_dt(solver):
+    level_dt = solver.get_level_dt()
+
+    assert level_dt.shape == (nz,)
+    # levels above the thin surface layer admit much larger steps
+    assert (np.diff(level_dt) >= 0).all()
+    assert level_dt[-1] > 10 * level_dt[0]
+    assert np.isclose(solver.get_dt(), level_dt.min())
+    assert np.allclose(solver.get_column_dt(), level_dt.min())
+
+
+def test_stretched_rest_state(solver):
+    E0 = solver.energy()
+
+    for _ in range(5):
+        solver.time_step()
+
+    # hydrostatic rest state stays close to rest and conserves energy
+    assert abs(solver.w).max() < 1e-2
+    assert abs((solver.energy() - E0) / E0) < 1e-12